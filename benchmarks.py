@@ -0,0 +1,229 @@
+"""
+Benchmarks for memory use and throughput of the simulator components
+"""
+import sys
+import hashlib
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+import numpy as np
+from blockchain import Block, Blockchain, search_nonces
+from compact import SlottedProsumer, SlottedTrade
+from population import ProsumerPopulation
+from prosumer import Prosumer
+from regulator import Regulator
+import config
+
+
+def run_bookkeeping(num_timesteps: int, long_horizon: bool, trades_per_step: int = 10,
+                    num_prosumers: int = 20, spill_dir: str = None) -> dict:
+    """
+    Drive the structures that grow with the horizon (summary log, chain,
+    pending transactions, ban history) through a synthetic run
+
+    Mining uses difficulty 0 so that the measurement is dominated by
+    bookkeeping, not hashing.
+
+    Args:
+        num_timesteps: Number of timesteps to simulate
+        long_horizon: Use the bounded long-horizon settings from config
+        trades_per_step: Synthetic trades recorded per timestep
+        num_prosumers: Prosumers checked by the regulator each timestep
+        spill_dir: Directory for spilled data (temporary directory if None)
+
+    Returns:
+        Dictionary with peak traced memory, final chain length and runtime
+    """
+    own_dir = spill_dir is None
+    spill_dir = spill_dir or tempfile.mkdtemp(prefix="smartgrids_spill_")
+    rng = np.random.default_rng(0)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    blockchain = Blockchain(
+        difficulty=0,
+        num_miners=config.NUM_MINERS,
+        block_reward=config.BLOCK_REWARD,
+        # fewer slots than trades per step, so the pending queue keeps growing
+        max_transactions_per_block=trades_per_step // 2,
+        rng=rng,
+        chain_window=config.CHAIN_WINDOW if long_horizon else None,
+        max_pending_in_memory=config.MAX_PENDING_IN_MEMORY if long_horizon else None,
+        spill_dir=spill_dir
+    )
+    regulator = Regulator(config.REGULATOR_OBJECTIVE,
+                          ban_history_window=config.BAN_HISTORY_WINDOW if long_horizon else None)
+    simulation_log = deque(maxlen=config.LOG_WINDOW) if long_horizon else []
+    population = ProsumerPopulation.generate(num_prosumers, rng)
+    prosumers = population.views()
+
+    for timestep in range(num_timesteps):
+        for _ in range(trades_per_step):
+            blockchain.add_transaction({
+                'buyer_id': int(rng.integers(num_prosumers)),
+                'seller_id': int(rng.integers(num_prosumers)),
+                'quantity': float(rng.uniform(0.1, 3.0)),
+                'price': float(rng.uniform(0.10, 0.20)),
+                'trade_type': 'p2p',
+                'timestep': timestep
+            })
+        blockchain.mine_pending_transactions()
+
+        population.penalties[:] = rng.uniform(0.0, 4.0, num_prosumers)  # force a steady stream of bans
+        regulator.update_prosumer_bans(prosumers)
+        regulator.enforce_rules(prosumers, timestep)
+
+        simulation_log.append({'timestep': timestep, 'blockchain_blocks': blockchain.num_blocks})
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'timesteps': num_timesteps,
+        'long_horizon': long_horizon,
+        'peak_mb': peak / 2**20,
+        'blocks': blockchain.num_blocks,
+        'pending': blockchain.num_pending(),
+        'bans': regulator.total_bans,
+        'seconds': elapsed
+    }
+    if own_dir:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    return result
+
+
+def benchmark_long_horizon_memory(horizons=(24, 8760, 87600), baseline_horizons=(24, 1000)) -> list:
+    """
+    Compare peak memory of default and long-horizon runs across horizons
+
+    The default run keeps the full ban history, which the regulator scans
+    for every candidate ban, so its runtime grows quadratically; it is only
+    run on the shorter baseline horizons.
+
+    Args:
+        horizons: Numbers of timesteps of the long-horizon runs
+        baseline_horizons: Numbers of timesteps of the default (unbounded) runs
+
+    Returns:
+        List of result dictionaries (see run_bookkeeping)
+    """
+    results = []
+    for long_horizon, run_horizons in ((False, baseline_horizons), (True, horizons)):
+        for num_timesteps in run_horizons:
+            result = run_bookkeeping(num_timesteps, long_horizon)
+            results.append(result)
+            print(f"  {'long-horizon' if long_horizon else 'default':<13}"
+                  f"{num_timesteps:>7} steps: peak {result['peak_mb']:8.2f} MB, "
+                  f"{result['blocks']} blocks, {result['pending']} pending, {result['seconds']:.1f} s")
+    return results
+
+
+def _bytes_per_item(build, count: int) -> float:
+    """Traced memory held by the result of build(count), per item"""
+    tracemalloc.start()
+    items = build(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return current / count
+
+
+def benchmark_record_memory(sizes=(1_000, 100_000, 1_000_000)) -> list:
+    """
+    Compare bytes per prosumer and per trade of the record layouts
+
+    Prosumers: Prosumer (__dict__), SlottedProsumer (__slots__) and
+    ProsumerPopulation (one array per attribute). Trades: the transaction
+    dict given to the blockchain and SlottedTrade.
+
+    Args:
+        sizes: Numbers of prosumers / trades to allocate
+
+    Returns:
+        List of result dictionaries (layout, count, bytes per item)
+    """
+    rng = np.random.default_rng(0)
+    layouts = {
+        'Prosumer': lambda n: [Prosumer(i, 5.0, 1.0, 10.0 if i % 5 else 0.0) for i in range(n)],
+        'SlottedProsumer': lambda n: [SlottedProsumer(i, 5.0, 1.0, 10.0 if i % 5 else 0.0) for i in range(n)],
+        'ProsumerPopulation': lambda n: ProsumerPopulation.generate(n, rng),
+        'trade dict': lambda n: [{'buyer_id': i, 'seller_id': i + 1, 'quantity': 1.5 + i, 'price': 0.15 + i,
+                                  'trade_type': 'p2p', 'timestep': 0} for i in range(n)],
+        'SlottedTrade': lambda n: [SlottedTrade(i, i + 1, 1.5 + i, 0.15 + i, 'p2p', 0) for i in range(n)],
+    }
+    results = []
+    for count in sizes:
+        for layout, build in layouts.items():
+            per_item = _bytes_per_item(build, count)
+            results.append({'layout': layout, 'count': count, 'bytes_per_item': per_item})
+            print(f"  {layout:<20}{count:>9}: {per_item:8.1f} bytes each")
+    return results
+
+
+def _full_block_hash(block: Block) -> str:
+    """Hash of the whole block as serialized before the header/Merkle split (reference for the benchmark)"""
+    block_data = {'index': block.index, 'timestamp': block.timestamp, 'transactions': block.transactions,
+                  'previous_hash': block.previous_hash, 'nonce': block.nonce}
+    return hashlib.sha256(json.dumps(block_data, sort_keys=True).encode()).hexdigest()
+
+
+def benchmark_mining_hash_rate(num_transactions: int = 50, attempts: int = 20_000) -> list:
+    """
+    Compare PoW hashes per second of the nonce search variants
+
+    Every variant tries the same nonces of one block against an unreachable
+    difficulty, so the full range is hashed:
+    - full block JSON: every attempt serializes all transactions;
+    - header JSON: every attempt serializes the header (Block.calculate_hash);
+    - midstate: the header prefix is hashed once (search_nonces, used by Miner.mine_block).
+
+    Args:
+        num_transactions: Transactions in the block
+        attempts: Nonces tried per variant
+
+    Returns:
+        List of result dictionaries (variant, hashes per second)
+    """
+    transactions = [{'buyer_id': i, 'seller_id': i + 1, 'quantity': 1.5, 'price': 0.15,
+                     'trade_type': 'p2p', 'timestep': 0} for i in range(num_transactions)]
+    block = Block(1, time.time(), transactions, '0' * 64)
+    unreachable = 65  # more leading zeros than a SHA-256 hex digest has
+
+    def per_attempt(hash_block):
+        for nonce in range(attempts):
+            block.nonce = nonce
+            hash_block(block)
+
+    variants = {
+        'full block JSON': lambda: per_attempt(_full_block_hash),
+        'header JSON': lambda: per_attempt(Block.calculate_hash),
+        'midstate': lambda: search_nonces(block, unreachable, 0, attempts),
+    }
+    results = []
+    for variant, run in variants.items():
+        start = time.perf_counter()
+        run()
+        rate = attempts / (time.perf_counter() - start)
+        results.append({'variant': variant, 'hashes_per_second': rate})
+        print(f"  {variant:<20}{rate:>12,.0f} hashes/s")
+    return results
+
+
+def main():
+    """Run all benchmarks"""
+    print("LONG-HORIZON MEMORY (peak traced memory)")
+    benchmark_long_horizon_memory()
+    print("\nRECORD MEMORY (bytes per prosumer / trade)")
+    benchmark_record_memory()
+    print("\nMINING HASH RATE (50-transaction block)")
+    benchmark_mining_hash_rate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
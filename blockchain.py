@@ -1,15 +1,73 @@
 """
 Blockchain implementation with Proof-of-Work consensus
 """
+import bisect
 import hashlib
+import hmac
 import json
+import math
+import multiprocessing
+import os
 import time
 import random
-from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+import config
+from random_streams import RNGRegistry
+
+
+def transaction_hash(transaction: dict) -> str:
+    """SHA-256 hash of one transaction (leaf of the Merkle tree)"""
+    return hashlib.sha256(json.dumps(transaction, sort_keys=True).encode()).hexdigest()
+
+
+def _merkle_levels(transactions: List[dict]) -> List[List[str]]:
+    """All levels of the Merkle tree, from the leaves up to the root (odd levels repeat their last hash)"""
+    level = [transaction_hash(transaction) for transaction in transactions]
+    if not level:
+        return [[hashlib.sha256(b'').hexdigest()]]
+    levels = [level]
+    while len(level) > 1:
+        if len(level) % 2:
+            level = level + [level[-1]]
+            levels[-1] = level
+        level = [hashlib.sha256((level[i] + level[i + 1]).encode()).hexdigest() for i in range(0, len(level), 2)]
+        levels.append(level)
+    return levels
+
+
+def merkle_root(transactions: List[dict]) -> str:
+    """Merkle root of a list of transactions (hash of the empty string if there are none)"""
+    return _merkle_levels(transactions)[-1][0]
+
+
+def verify_merkle_proof(transaction: dict, proof: List[Tuple[str, str]], root: str) -> bool:
+    """
+    Check that a transaction is included in a block
+    
+    Args:
+        transaction: Transaction dictionary
+        proof: Inclusion proof from Block.inclusion_proof
+        root: Merkle root of the block
+    
+    Returns:
+        True if the proof leads from the transaction to the root
+    """
+    current = transaction_hash(transaction)
+    for sibling, side in proof:
+        pair = sibling + current if side == 'left' else current + sibling
+        current = hashlib.sha256(pair.encode()).hexdigest()
+    return current == root
 
 
 class Block:
-    """Represents a single block in the blockchain"""
+    """
+    Represents a single block in the blockchain
+    
+    The block hash covers only the fixed-size header (index, timestamp,
+    previous hash, Merkle root of the transactions and nonce), so every PoW
+    attempt costs the same whatever the number of transactions.
+    """
     
     def __init__(self, index: int, timestamp: float, transactions: List[dict],
                  previous_hash: str, nonce: int = 0):
@@ -17,20 +75,57 @@ class Block:
         self.timestamp = timestamp  # time of block creation
         self.transactions = transactions    # list of transactions in the block
         self.previous_hash = previous_hash  # hash of the previous block in the chain
+        self.merkle_root = merkle_root(transactions)  # Merkle root of the transactions
         self.nonce = nonce  # nonce used for Proof-of-Work
         self.hash = self.calculate_hash()   # hash of the current block
+        self.seal = None    # keyed seal standing in for PoW on statistically mined blocks (None = real PoW)
     
-    def calculate_hash(self) -> str:
-        """Calculate SHA-256 hash of the block"""
-        block_data = {
+    def header(self) -> dict:
+        """Block header (the data covered by the block hash)"""
+        return {
             'index': self.index,
             'timestamp': self.timestamp,
-            'transactions': self.transactions,
             'previous_hash': self.previous_hash,
+            'merkle_root': self.merkle_root,
             'nonce': self.nonce
-        }   # create a structure containing the data to be hashed
-        block_string = json.dumps(block_data, sort_keys=True)   # convert the structure to a JSON string, sorting keys for consistency
-        return hashlib.sha256(block_string.encode()).hexdigest()    # compute the SHA-256 hash of the JSON string
+        }
+    
+    def calculate_hash(self) -> str:
+        """Calculate SHA-256 hash of the block header"""
+        header_string = json.dumps(self.header(), sort_keys=True)   # convert the header to a JSON string, sorting keys for consistency
+        return hashlib.sha256(header_string.encode()).hexdigest()    # compute the SHA-256 hash of the JSON string
+    
+    def header_parts(self) -> Tuple[bytes, bytes]:
+        """
+        Serialized header before and after the nonce
+        
+        calculate_hash() equals sha256(prefix + str(nonce) + suffix), so the
+        miner can hash the constant prefix once and only feed the nonce.
+        
+        Returns:
+            Tuple (prefix, suffix) of the JSON header
+        """
+        marker = '"nonce": '
+        header_string = json.dumps(dict(self.header(), nonce=0), sort_keys=True)
+        start = header_string.index(marker) + len(marker)
+        return header_string[:start].encode(), header_string[start + 1:].encode()  # skip the placeholder '0'
+    
+    def inclusion_proof(self, position: int) -> List[Tuple[str, str]]:
+        """
+        Merkle proof that a transaction is included in this block
+        
+        Args:
+            position: Position of the transaction in the block
+        
+        Returns:
+            List of (sibling hash, side) pairs from the leaf up to the root, side being 'left' or 'right'
+        """
+        proof = []
+        for level in _merkle_levels(self.transactions)[:-1]:
+            sibling = position ^ 1
+            proof.append((level[sibling], 'left' if sibling < position else 'right'))
+            position //= 2
+        return proof
     
     def to_dict(self) -> dict:
         """Convert block to dictionary"""
@@ -39,66 +134,435 @@ class Block:
             'timestamp': self.timestamp,
             'transactions': self.transactions,
             'previous_hash': self.previous_hash,
+            'merkle_root': self.merkle_root,
             'nonce': self.nonce,
-            'hash': self.hash
+            'hash': self.hash,
+            'seal': self.seal
         }
     
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Block':
+        """Rebuild a block from its dictionary (the stored hash and Merkle root are kept, not recomputed)"""
+        block = cls.__new__(cls)
+        block.index = data['index']
+        block.timestamp = data['timestamp']
+        block.transactions = data['transactions']
+        block.previous_hash = data['previous_hash']
+        block.merkle_root = data['merkle_root']
+        block.nonce = data['nonce']
+        block.hash = data['hash']
+        block.seal = data['seal']
+        return block
+    
     def __repr__(self):
         return (f"Block(index={self.index}, hash={self.hash[:10]}..., "
                 f"transactions={len(self.transactions)}, nonce={self.nonce})")
 
 
+def search_nonces(block: Block, difficulty: int, start: int, stop: int, stop_event=None,
+                  check_every: int = 1000) -> Tuple[Optional[int], Optional[str], int]:
+    """
+    Search the nonces start..stop-1 of a block with a cached SHA-256 midstate
+    
+    The constant header prefix is hashed once; every attempt copies that
+    state and feeds only the nonce and the short header suffix.
+    
+    Args:
+        block: Block to mine (left unchanged)
+        difficulty: Number of leading zeros required
+        start: First nonce to try
+        stop: End of the nonce range (exclusive)
+        stop_event: Event checked every check_every attempts to abandon the search (None = never)
+        check_every: Attempts between two checks of stop_event
+    
+    Returns:
+        Tuple (nonce, hash, attempts); nonce and hash are None if not found or stopped
+    """
+    prefix, suffix = block.header_parts()
+    midstate = hashlib.sha256(prefix)
+    target = '0' * difficulty
+    for nonce in range(start, stop):
+        if stop_event is not None and (nonce - start) % check_every == 0 and stop_event.is_set():
+            return None, None, nonce - start
+        attempt = midstate.copy()
+        attempt.update(b'%d' % nonce)
+        attempt.update(suffix)
+        block_hash = attempt.hexdigest()
+        if block_hash.startswith(target):
+            return nonce, block_hash, nonce - start + 1
+    return None, None, stop - start
+
+
 class Miner:
     """Represents a miner in the blockchain network"""
     
-    def __init__(self, miner_id: int):
+    def __init__(self, miner_id: int, hash_rate: float = 1.0, nonce_offset: int = 0):
         self.id = miner_id  # ID of the miner
+        self.hash_rate = hash_rate  # relative hash rate (share of the network's hashing power)
+        self.nonce_offset = nonce_offset  # first nonce tried by this miner in a race
         self.blocks_mined = 0  # number of blocks mined by this miner
+        self.wasted_hashes = 0  # hashes spent on races the miner did not win
         self.total_reward = 0.0  # total rewards earned by this miner
     
-    def mine_block(self, block: Block, difficulty: int) -> Optional[Block]:
+    def mine_block(self, block: Block, difficulty: int, pool: Optional['ParallelPoW'] = None) -> Optional[Block]:
         """
         Mine a block using Proof-of-Work
         
         Args:
             block: Block to mine
             difficulty: Number of leading zeros required
+            pool: Worker pool splitting the nonce search (None = search serially)
         
         Returns:
             Mined block if successful, None otherwise
         """
-        target = '0' * difficulty   # create the target string with required leading zeros
+        if pool is not None:    # nonce range split across worker processes
+            if pool.search(block, difficulty) is None:
+                return None
+            self.blocks_mined += 1
+            return block
         
         # Try to find a valid nonce
         max_attempts = 1000000  # Prevent infinite loops
-        for nonce in range(max_attempts):   # iterate max_attempts times to find a valid nonce
-            block.nonce = nonce # set the nonce of the block
-            block.hash = block.calculate_hash()  # calculate the hash with the current nonce
-            
-            if block.hash.startswith(target):   # check if the hash meets the difficulty target
-                self.blocks_mined += 1  # increment the count of blocks mined by this miner
-                return block
+        nonce, block_hash, _ = search_nonces(block, difficulty, 0, max_attempts)  # midstate-cached hashing of the header
+        if nonce is None:
+            return None
         
-        return None
+        block.nonce, block.hash = nonce, block_hash  # same hash as block.calculate_hash() for this nonce
+        self.blocks_mined += 1  # increment the count of blocks mined by this miner
+        return block
     
     def __repr__(self):
         return f"Miner(id={self.id}, blocks_mined={self.blocks_mined})"
 
 
+_stop_mining = None    # event shared with the mining workers, set once any worker finds a valid nonce
+_race_best_time = None  # shared value: earliest virtual time at which a racing miner found a nonce
+
+
+def _init_mining_worker(stop_event, best_time):
+    """Process pool initializer: keep the shared stop event and race time"""
+    global _stop_mining, _race_best_time
+    _stop_mining = stop_event
+    _race_best_time = best_time
+
+
+def _mine_nonce_range(block_data: dict, difficulty: int, start: int, stop: int,
+                      worker: int, check_every: int = 1000) -> Tuple[int, Optional[int], Optional[str], int]:
+    """
+    Search the nonces start..stop-1 of a block (runs in the mining workers)
+    
+    Returns:
+        Tuple (worker, nonce, hash, attempts); nonce and hash are None if not found or stopped
+    """
+    nonce, block_hash, attempts = search_nonces(Block.from_dict(block_data), difficulty, start, stop,
+                                                stop_event=_stop_mining, check_every=check_every)  # stops once another worker won
+    return worker, nonce, block_hash, attempts
+
+
+def _race_attempts_by(virtual_time: float, hash_rate: float) -> float:
+    """Attempts a miner with the given relative hash rate has made by a virtual time (inf = unbounded)"""
+    if math.isinf(virtual_time):
+        return math.inf
+    return math.floor(virtual_time * hash_rate + 1e-9)  # tolerance for the float round trip of attempts / rate
+
+
+def _race_miner(block_data: dict, difficulty: int, miner: int, hash_rate: float, nonce_offset: int,
+                max_attempts: int, check_every: int = 1000) -> Tuple[int, Optional[int], Optional[str], int]:
+    """
+    Mine a block as one miner of a race (runs in the mining workers)
+    
+    The miner hashes its own nonce range from nonce_offset on. With a
+    relative hash rate r, a miner that made a attempts is at virtual time
+    a / r. It never hashes past the earliest time at which any miner found
+    a nonce (each chunk is truncated at best_time * r), because it can no
+    longer win.
+    
+    Returns:
+        Tuple (miner, nonce, hash, attempts); nonce and hash are None if not found or cancelled
+    """
+    block = Block.from_dict(block_data)
+    attempts = 0
+    while True:
+        limit = min(max_attempts, _race_attempts_by(_race_best_time.value, hash_rate))  # no hash past the best time
+        if attempts >= limit:
+            return miner, None, None, attempts
+        chunk = min(check_every, limit - attempts)
+        nonce, block_hash, tried = search_nonces(block, difficulty, nonce_offset + attempts,
+                                                 nonce_offset + attempts + chunk)
+        attempts += tried
+        if nonce is not None:
+            with _race_best_time.get_lock():
+                _race_best_time.value = min(_race_best_time.value, attempts / hash_rate)
+            return miner, nonce, block_hash, attempts
+
+
+class ParallelPoW:
+    """
+    Proof-of-Work nonce search split across a process pool
+    
+    The nonce range 0..max_attempts-1 is partitioned into one contiguous
+    slice per worker. All workers stop as soon as one of them finds a hash
+    meeting the difficulty. Which valid nonce wins depends on worker timing.
+    """
+    
+    def __init__(self, processes: Optional[int] = None, max_attempts: int = 1000000):
+        """
+        Initialize the pool (worker processes are started on first use)
+        
+        Args:
+            processes: Worker processes (None = one per CPU)
+            max_attempts: Size of the nonce range searched per block
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.max_attempts = max_attempts
+        self.last_worker = None  # worker that found the nonce of the last block (None if not found)
+        self.last_attempts = 0  # hashes computed for the last block, summed over all workers
+        self._executor = None
+        self._stop = None
+        self._best_time = None
+    
+    def _start(self):
+        """Start the worker processes on first use"""
+        if self._executor is None:
+            self._stop = multiprocessing.Event()
+            self._best_time = multiprocessing.Value('d', math.inf)
+            self._executor = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_mining_worker,
+                                                 initargs=(self._stop, self._best_time))
+    
+    def search(self, block: Block, difficulty: int) -> Optional[Block]:
+        """
+        Find a nonce for a block in parallel
+        
+        Args:
+            block: Block to mine (nonce and hash are set in place)
+            difficulty: Number of leading zeros required
+        
+        Returns:
+            Mined block if a nonce was found, None otherwise
+        """
+        self._start()
+        self._stop.clear()
+        block_data = block.to_dict()
+        bounds = [worker * self.max_attempts // self.processes for worker in range(self.processes + 1)]
+        futures = [self._executor.submit(_mine_nonce_range, block_data, difficulty,
+                                         bounds[worker], bounds[worker + 1], worker)
+                   for worker in range(self.processes)]
+        
+        self.last_worker, self.last_attempts = None, 0
+        for future in as_completed(futures):
+            worker, nonce, block_hash, attempts = future.result()
+            self.last_attempts += attempts
+            if nonce is not None and self.last_worker is None:  # first valid nonce wins
+                self._stop.set()
+                self.last_worker = worker
+                block.nonce, block.hash = nonce, block_hash
+        return block if self.last_worker is not None else None
+    
+    def race(self, block: Block, difficulty: int, miners: List['Miner']) -> Tuple[Optional[int], List[int]]:
+        """
+        Let all miners mine the same block concurrently
+        
+        Every miner searches its own nonce range (Miner.nonce_offset) at its
+        relative hash rate (see _race_miner). The miner reaching a valid
+        nonce at the earliest virtual time wins (ties go to the lower index),
+        so the winner does not depend on process scheduling; the others are
+        stopped, and their attempts counted, at the winning virtual time.
+        
+        Args:
+            block: Block to mine (nonce and hash are set in place if won)
+            difficulty: Number of leading zeros required
+            miners: Competing miners
+        
+        Returns:
+            Tuple (index of the winning miner or None, attempts per miner)
+        """
+        self._start()
+        self._best_time.value = math.inf
+        block_data = block.to_dict()
+        futures = [self._executor.submit(_race_miner, block_data, difficulty, index, miner.hash_rate,
+                                         miner.nonce_offset, self.max_attempts)
+                   for index, miner in enumerate(miners)]
+        
+        attempts = [0] * len(miners)
+        winner, winning_time = None, math.inf
+        for future in futures:
+            index, nonce, block_hash, tried = future.result()
+            attempts[index] = tried
+            found_time = tried / miners[index].hash_rate
+            if nonce is not None and found_time < winning_time:
+                winner, winning_time = index, found_time
+                block.nonce, block.hash = nonce, block_hash
+        if winner is not None:  # a loser may have started its last chunk before the winning time was known
+            for index, miner in enumerate(miners):
+                attempts[index] = min(attempts[index], _race_attempts_by(winning_time, miner.hash_rate))
+        self.last_worker, self.last_attempts = winner, sum(attempts)
+        return winner, attempts
+    
+    def close(self):
+        """Shut down the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+    
+    def __repr__(self):
+        return f"ParallelPoW(processes={self.processes}, last_worker={self.last_worker})"
+
+
+class TransactionSpill:
+    """
+    FIFO queue of transactions stored on disk as JSON lines
+
+    Used to bound the in-memory pending list during long runs: overflow is
+    appended at the end of the file and read back in order when space frees up.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path    # JSON-lines file holding the queued transactions
+        self.size = 0   # number of queued transactions
+        self._read_offset = 0   # file position of the oldest queued transaction
+        self._file = open(path, "w+")
+    
+    def append(self, transaction: dict):
+        """Queue a transaction at the end"""
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(json.dumps(transaction) + "\n")
+        self.size += 1
+    
+    def pop(self, count: int) -> List[dict]:
+        """Remove and return up to count transactions from the front"""
+        if self.size == 0:
+            return []
+        self._file.flush()
+        self._file.seek(self._read_offset)
+        transactions = [json.loads(self._file.readline()) for _ in range(min(count, self.size))]
+        self._read_offset = self._file.tell()
+        self.size -= len(transactions)
+        if self.size == 0:  # reclaim disk space once drained
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_offset = 0
+        return transactions
+    
+    def __len__(self) -> int:
+        return self.size
+
+
+class ChainArchive:
+    """
+    Append-only JSON-lines archive of blocks evicted from the in-memory chain window
+
+    The first line is a header recording the seal key, so that statistically
+    mined blocks can still be verified after the archive is reloaded (see load).
+    """
+    
+    def __init__(self, path: str, seal_key: Optional[bytes] = None):
+        self.path = path    # JSON-lines file holding the archived blocks
+        self.seal_key = seal_key  # key of the statistical-mining seals of the archived blocks
+        self.num_blocks = 0  # number of archived blocks
+        with open(path, "w") as f:
+            f.write(json.dumps({'seal_key': seal_key.hex() if seal_key is not None else None}) + "\n")
+    
+    @classmethod
+    def load(cls, path: str) -> 'ChainArchive':
+        """
+        Reopen an existing archive (e.g. written by another process)
+        
+        Args:
+            path: JSON-lines file holding the archived blocks
+            
+        Returns:
+            Archive with the recorded seal key, appending after the existing blocks
+        """
+        archive = cls.__new__(cls)
+        archive.path = path
+        with open(path) as f:
+            seal_key = json.loads(f.readline())['seal_key']
+            archive.num_blocks = sum(1 for _ in f)
+        archive.seal_key = bytes.fromhex(seal_key) if seal_key is not None else None
+        return archive
+    
+    def append(self, block: Block):
+        """Archive a block"""
+        with open(self.path, "a") as f:
+            f.write(json.dumps(block.to_dict()) + "\n")
+        self.num_blocks += 1
+    
+    def __iter__(self) -> Iterator[Block]:
+        """Stream archived blocks in chain order without loading the whole file"""
+        with open(self.path) as f:
+            f.readline()  # skip the header
+            for line in f:
+                yield Block.from_dict(json.loads(line))
+
+
 class Blockchain:
     """
     Blockchain to record all energy trading transactions
     """
     
     def __init__(self, difficulty: int = 3, num_miners: int = 10, 
-                 block_reward: float = 0.1, max_transactions_per_block: int = 50):
-        self.chain = [] # list of blocks
-        self.pending_transactions = [] # list of pending transactions
+                 block_reward: float = 0.1, max_transactions_per_block: int = 50, rng=None,
+                 chain_window: Optional[int] = None, max_pending_in_memory: Optional[int] = None,
+                 spill_dir: Optional[str] = None, mining_processes: int = 0, mining_mode: str = "pow",
+                 hash_rates: Optional[List[float]] = None, pow_sample_rate: float = 0.0,
+                 nonce_offsets: Optional[List[int]] = None, seal_key: Optional[bytes] = None):
+        """
+        Initialize the blockchain
+        
+        Args:
+            difficulty: Number of leading zeros required in block hashes
+            num_miners: Number of miners
+            block_reward: Reward given to the miner of a block
+            max_transactions_per_block: Maximum transactions per block
+            rng: Random source for miner selection (random module if None)
+            chain_window: Blocks kept in memory; older blocks are archived to disk (None = keep all)
+            max_pending_in_memory: Pending transactions kept in memory; overflow is spilled to disk (None = no limit)
+            spill_dir: Directory of the chain archive and pending spill files
+            mining_processes: Worker processes splitting each nonce search (0 or 1 = mine serially)
+            mining_mode: 'pow' (one random miner hashes), 'statistical' (sample the PoW outcome,
+                see _sample_mining) or 'race' (all miners hash concurrently, see ParallelPoW.race)
+            hash_rates: Relative hash rate per miner (None = equal)
+            pow_sample_rate: Fraction of blocks still mined with real PoW in statistical mode
+            nonce_offsets: First nonce of every miner in race mode (None = disjoint ranges of 1,000,000 nonces)
+            seal_key: Secret key sealing statistically mined blocks (None = derived from config.RANDOM_SEED,
+                see RNGRegistry.secret; recorded in the chain archive)
+        """
+        if mining_mode not in ("pow", "statistical", "race"):
+            raise ValueError(f"Unknown mining mode: {mining_mode}")
+        self.chain = [] # list of blocks (the most recent chain_window blocks in long-horizon mode)
+        self.pending_transactions = [] # list of pending transactions (head of the queue in long-horizon mode)
+        self.num_blocks = 0  # total number of blocks, including archived ones
+        self.num_transactions = 0  # total number of transactions in the chain
+        self.chain_window = chain_window
+        self.max_pending_in_memory = max_pending_in_memory
+        
+        if chain_window is not None or max_pending_in_memory is not None:
+            spill_dir = spill_dir or "results/spill"
+            os.makedirs(spill_dir, exist_ok=True)
+        self.seal_key = seal_key if seal_key is not None else RNGRegistry(config.RANDOM_SEED).secret('chain')  # key of the statistical-mining seals
+        self.archive = (ChainArchive(os.path.join(spill_dir, "chain.jsonl"), self.seal_key)
+                        if chain_window is not None else None)
+        self.pending_spill = (TransactionSpill(os.path.join(spill_dir, "pending.jsonl"))
+                              if max_pending_in_memory is not None else None)
         self.difficulty = difficulty    # number of leading zeros required in hash
         self.block_reward = block_reward  # reward given to miner for mining a block
         self.max_transactions_per_block = max_transactions_per_block  # max transactions per block
+        self.rng = rng if rng is not None else random  # random source for miner selection
         
-        self.miners = [Miner(i) for i in range(num_miners)]  # list of miners
+        self.mining_mode = mining_mode
+        self.pow_sample_rate = pow_sample_rate
+        hash_rates = hash_rates if hash_rates is not None else [1.0] * num_miners
+        nonce_offsets = nonce_offsets if nonce_offsets is not None else [i * 1000000 for i in range(num_miners)]
+        self.miners = [Miner(i, hash_rates[i], nonce_offsets[i]) for i in range(num_miners)]  # list of miners
+        self.last_attempts = 0  # hash attempts (real or sampled) of the last mined block
+        self.total_attempts = 0  # hash attempts (real or sampled) of all mined blocks
+        self.last_wasted = 0  # hashes of the miners not winning the last race
+        self.total_wasted = 0  # hashes of the miners not winning any race (sum of Miner.wasted_hashes)
+        if mining_mode == "race":  # all miners race in the worker pool
+            self.pow_pool = ParallelPoW(mining_processes or None)
+        else:
+            self.pow_pool = ParallelPoW(mining_processes) if mining_processes > 1 else None  # parallel nonce search
         
         self._create_genesis_block()    # create the first block in the chain (genesis block)
     
@@ -106,7 +570,21 @@ class Blockchain:
         """Create the first block in the chain (genesis block)"""
         genesis_block = Block(0, time.time(), [], "0")  # generate genesis block
         genesis_block.hash = genesis_block.calculate_hash() # calculate its hash
-        self.chain.append(genesis_block)    # add genesis block to the chain
+        self._append_block(genesis_block)    # add genesis block to the chain
+    
+    def _append_block(self, block: Block):
+        """Append a block to the chain, archiving the oldest in-memory block if the window is full"""
+        self.chain.append(block)
+        self.num_blocks += 1
+        self.num_transactions += len(block.transactions)
+        if self.chain_window is not None and len(self.chain) > self.chain_window:
+            self.archive.append(self.chain.pop(0))
+    
+    def iter_blocks(self) -> Iterator[Block]:
+        """Iterate over the whole chain, streaming archived blocks from disk first"""
+        if self.archive is not None:
+            yield from self.archive
+        yield from self.chain
     
     def get_latest_block(self) -> Block:
         """Get the most recent block in the chain"""
@@ -119,8 +597,30 @@ class Blockchain:
         Args:
             transaction: Transaction dictionary
         """
+        if self.pending_spill is not None and (len(self.pending_spill) or
+                                               len(self.pending_transactions) >= self.max_pending_in_memory):
+            self.pending_spill.append(transaction)  # memory window full - queue the transaction on disk
+            return
         self.pending_transactions.append(transaction)   # add transaction to pending transaction list
     
+    def add_trade_batch(self, batch):
+        """
+        Add every trade of a TradeBatch to pending transactions
+        
+        Args:
+            batch: TradeBatch of executed trades
+        """
+        transactions = batch.to_transactions()  # one dictionary per trade, built column-wise
+        if self.pending_spill is None:
+            self.pending_transactions.extend(transactions)
+            return
+        for transaction in transactions:
+            self.add_transaction(transaction)
+    
+    def num_pending(self) -> int:
+        """Number of pending transactions, including those spilled to disk"""
+        return len(self.pending_transactions) + (len(self.pending_spill) if self.pending_spill is not None else 0)
+    
     def mine_pending_transactions(self) -> Optional[Block]:
         """
         Mine pending transactions into a new block
@@ -136,24 +636,33 @@ class Blockchain:
         
         # Create new block
         new_block = Block(
-            index=len(self.chain),  # index of the new block is the current chain length
+            index=self.num_blocks,  # index of the new block is the current chain length
             timestamp=time.time(),  # current timestamp for the new block
             transactions=transactions_to_mine,  # set of transactions to include in the new block
             previous_hash=self.get_latest_block().hash  # hash of the previous block in the chain
         )
         
-        # Select a random miner to mine (simulating competition)
-        selected_miner = random.choice(self.miners)  # randomly select a miner from the list
-        
-        # Mine the block
-        mined_block = selected_miner.mine_block(new_block, self.difficulty)
+        if self.mining_mode == "statistical":  # draw winner and attempts instead of hashing
+            selected_miner, mined_block = self._sample_mining(new_block)
+        elif self.mining_mode == "race":  # all miners compete for the block
+            selected_miner, mined_block = self._race(new_block)
+        else:
+            # Select a random miner to mine (simulating competition)
+            selected_miner = self.miners[int(self.rng.random() * len(self.miners))]  # randomly select a miner from the list
+            
+            # Mine the block
+            mined_block = self._mine_with_pow(selected_miner, new_block)
         
         if mined_block:  # if mining was successful
+            self.total_attempts += self.last_attempts
             # Add block to chain
-            self.chain.append(mined_block)  # append the newly mined block to the blockchain
+            self._append_block(mined_block)  # append the newly mined block to the blockchain
             
             # Remove mined transactions from pending
             self.pending_transactions = self.pending_transactions[self.max_transactions_per_block:]  # remove the mined transactions from the pending list
+            if self.pending_spill is not None:  # refill the memory window from the disk queue
+                self.pending_transactions.extend(
+                    self.pending_spill.pop(self.max_pending_in_memory - len(self.pending_transactions)))
             
             # Reward the miner
             selected_miner.total_reward += self.block_reward    # add the block reward to the miner's total rewards
@@ -162,43 +671,140 @@ class Blockchain:
         
         return None  # return None if mining failed
     
-    def is_chain_valid(self) -> bool:
+    def _mine_with_pow(self, miner: Miner, block: Block) -> Optional[Block]:
+        """Let one miner hash the block, recording the attempts it took"""
+        mined_block = miner.mine_block(block, self.difficulty, pool=self.pow_pool)
+        if mined_block is not None:
+            self.last_attempts = self.pow_pool.last_attempts if self.pow_pool is not None else mined_block.nonce + 1
+        return mined_block
+    
+    def _race(self, block: Block):
+        """
+        Race mode: all miners mine the block concurrently, the first valid block wins
+        
+        Args:
+            block: Block to mine
+        
+        Returns:
+            Tuple (winning miner, mined block), (None, None) if nobody found a nonce
+        """
+        winner, attempts = self.pow_pool.race(block, self.difficulty, self.miners)
+        self.last_attempts = sum(attempts)
+        self.last_wasted = 0  # every hash not behind the appended block, so a failed race wastes all of them
+        for index, miner in enumerate(self.miners):
+            if index != winner:
+                miner.wasted_hashes += attempts[index]
+                self.last_wasted += attempts[index]
+        self.total_wasted += self.last_wasted
+        if winner is None:
+            return None, None
+        self.miners[winner].blocks_mined += 1
+        return self.miners[winner], block
+    
+    def _sample_mining(self, block: Block):
+        """
+        Statistical mining: sample the outcome of the PoW race instead of hashing
+        
+        The winner is drawn in proportion to the miners' hash rates and the
+        number of attempts from the geometric distribution with success
+        probability 16^-difficulty (one hex digit per leading zero). The
+        block gets the placeholder nonce -attempts and its hash is computed
+        as usual. In place of PoW the block is sealed with an HMAC of its hash
+        under seal_key, so a block edited afterwards (even with a recomputed
+        Merkle root and hash) fails is_chain_valid without the key. A fraction
+        pow_sample_rate of the blocks is still mined with real PoW by the
+        drawn winner.
+        
+        Args:
+            block: Block to mine
+        
+        Returns:
+            Tuple (winning miner, mined block or None)
+        """
+        cumulative_rates = []
+        total = 0.0
+        for miner in self.miners:
+            total += miner.hash_rate
+            cumulative_rates.append(total)
+        winner = self.miners[min(bisect.bisect_right(cumulative_rates, self.rng.random() * total), len(self.miners) - 1)]
+        
+        if self.pow_sample_rate > 0 and self.rng.random() < self.pow_sample_rate:  # real PoW on a sampled subset
+            return winner, self._mine_with_pow(winner, block)
+        
+        success = 16.0 ** -self.difficulty  # probability that one hash meets the difficulty
+        attempts = 1 if success >= 1 else int(math.log1p(-self.rng.random()) / math.log1p(-success)) + 1
+        block.nonce = -attempts  # placeholder nonce: sampled attempt count, no PoW
+        block.hash = block.calculate_hash()
+        block.seal = self._seal(block)
+        winner.blocks_mined += 1
+        self.last_attempts = attempts
+        return winner, block
+    
+    def _seal(self, block: Block) -> str:
+        """Keyed seal of a statistically mined block (HMAC-SHA256 of its hash)"""
+        return hmac.new(self.seal_key, block.hash.encode(), hashlib.sha256).hexdigest()
+    
+    def close(self):
+        """Stop the mining worker processes"""
+        if self.pow_pool is not None:
+            self.pow_pool.close()
+    
+    def is_chain_valid(self, blocks: Optional[Iterable[Block]] = None) -> bool:
         """
         Validate the entire blockchain
         
+        Args:
+            blocks: Blocks to validate in chain order, e.g. a reloaded ChainArchive
+                (None = this chain, archived blocks included)
+        
         Returns:
             True if chain is valid, False otherwise
         """
-        for i in range(1, len(self.chain)):  # iterate over each block starting from the second block
-            current_block = self.chain[i]   # current block in the iteration
-            previous_block = self.chain[i - 1]  # previous block in the iteration
+        previous_block = None
+        blocks = self.iter_blocks() if blocks is None else blocks
+        for current_block in blocks:  # stream over each block (archived blocks are read from disk)
+            if previous_block is None:  # genesis block has no predecessor
+                previous_block = current_block
+                continue
             
             # Check hash
             if current_block.hash != current_block.calculate_hash():    # check if the stored hash matches the calculated hash of the current block
                 return False
             
+            # Check that the header commits to the transactions
+            if current_block.merkle_root != merkle_root(current_block.transactions):
+                return False
+            
             # Check previous hash link
             if current_block.previous_hash != previous_block.hash:  # check if the previous hash link is consistent
                 return False
             
-            # Check difficulty
-            if not current_block.hash.startswith('0' * self.difficulty):  # check if the hash meets the difficulty target
+            # Check proof of work (statistically mined blocks carry a keyed seal instead)
+            if current_block.seal is not None:
+                if self.mining_mode != "statistical" or not hmac.compare_digest(current_block.seal, self._seal(current_block)):
+                    return False
+            elif not current_block.hash.startswith('0' * self.difficulty):  # check if the hash meets the difficulty target
                 return False
+            
+            previous_block = current_block
         
         return True
     
     def get_chain_summary(self) -> dict:
         """Get summary statistics of the blockchain"""
-        total_transactions = sum(len(block.transactions) for block in self.chain)
-        total_pending = len(self.pending_transactions)
+        total_transactions = self.num_transactions
+        total_pending = self.num_pending()
         
         return {
-            'total_blocks': len(self.chain),    # total number of blocks in the chain
+            'total_blocks': self.num_blocks,    # total number of blocks in the chain
             'total_transactions': total_transactions,   # total number of transactions in the chain
             'pending_transactions': total_pending, # number of pending transactions
             'is_valid': self.is_chain_valid(),  # validity status of the chain
             'miners': len(self.miners), # number of miners
-            'difficulty': self.difficulty   # mining difficulty target
+            'difficulty': self.difficulty,   # mining difficulty target
+            'mining_mode': self.mining_mode,    # real (pow) or sampled (statistical) mining
+            'total_attempts': self.total_attempts,   # hash attempts (real or sampled) of all mined blocks
+            'wasted_hashes': self.total_wasted  # hashes of the miners not winning a race in race mode
         }   # return summary dictionary of the blockchain
     
     def get_miner_stats(self) -> List[dict]:
@@ -206,6 +812,8 @@ class Blockchain:
         return [
             {
                 'miner_id': miner.id,   # unique identifier of the miner
+                'hash_rate': miner.hash_rate,   # relative hash rate of the miner
+                'wasted_hashes': miner.wasted_hashes,   # hashes spent on races the miner did not win
                 'blocks_mined': miner.blocks_mined,   # number of blocks mined by the miner
                 'total_reward': round(miner.total_reward, 2)   # total rewards earned by the miner, rounded to 2 decimals
             }   # dictionary of miner statistics
@@ -215,12 +823,12 @@ class Blockchain:
     def to_dict(self) -> dict:
         """Convert blockchain to dictionary for export"""
         return {
-            'chain': [block.to_dict() for block in self.chain],
+            'chain': [block.to_dict() for block in self.iter_blocks()],
             'summary': self.get_chain_summary(),
             'miners': self.get_miner_stats()
         }
     
     def __repr__(self):
-        return (f"Blockchain(blocks={len(self.chain)}, "
-                f"pending={len(self.pending_transactions)}, "
+        return (f"Blockchain(blocks={self.num_blocks}, "
+                f"pending={self.num_pending()}, "
                 f"valid={self.is_chain_valid()})")
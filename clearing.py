@@ -0,0 +1,282 @@
+"""
+Uniform-price double-auction clearing of the P2P offers
+"""
+import numpy as np
+from typing import List, NamedTuple, Tuple
+from prosumer import Prosumer
+from population import population_of
+from trade_batch import TradeBatch
+
+
+class ClearingResult(NamedTuple):
+    """Outcome of a uniform-price clearing (fills aligned with the input orders)"""
+    price: float   # €/kWh - clearing price (nan if nothing clears)
+    quantity: float   # kWh - cleared volume
+    buyer_fill: np.ndarray   # kWh - quantity filled per bid
+    seller_fill: np.ndarray   # kWh - quantity filled per ask
+
+
+def clear_uniform_price(bid_price: np.ndarray, bid_quantity: np.ndarray,
+                        ask_price: np.ndarray, ask_quantity: np.ndarray) -> ClearingResult:
+    """
+    Clear bids and asks at a single price
+
+    Bids and asks are sorted once into cumulative demand and supply curves;
+    demand and supply at every candidate price (all bid and ask prices) are
+    read with searchsorted, and the clearing price is the middle of the
+    price range maximizing the traded volume. The long side is rationed
+    pro-rata, the short side is filled completely.
+
+    Args:
+        bid_price: Bid prices in €/kWh
+        bid_quantity: Bid quantities in kWh
+        ask_price: Ask prices in €/kWh
+        ask_quantity: Ask quantities in kWh
+
+    Returns:
+        ClearingResult with price, volume and per-order fills
+    """
+    bid_price = np.asarray(bid_price, dtype=np.float64)
+    bid_quantity = np.asarray(bid_quantity, dtype=np.float64)
+    ask_price = np.asarray(ask_price, dtype=np.float64)
+    ask_quantity = np.asarray(ask_quantity, dtype=np.float64)
+    no_trade = ClearingResult(float('nan'), 0.0, np.zeros(len(bid_price)), np.zeros(len(ask_price)))
+    if len(bid_price) == 0 or len(ask_price) == 0:
+        return no_trade
+
+    # Demand curve: bids by descending price; supply curve: asks by ascending price
+    bid_order = np.argsort(-bid_price, kind='stable')
+    ask_order = np.argsort(ask_price, kind='stable')
+    neg_bids = -bid_price[bid_order]
+    asks = ask_price[ask_order]
+    cum_demand = np.concatenate(([0.0], np.cumsum(bid_quantity[bid_order])))
+    cum_supply = np.concatenate(([0.0], np.cumsum(ask_quantity[ask_order])))
+
+    candidates = np.unique(np.concatenate((bid_price, ask_price)))
+    demand = cum_demand[np.searchsorted(neg_bids, -candidates, side='right')]  # bids with price >= p
+    supply = cum_supply[np.searchsorted(asks, candidates, side='right')]  # asks with price <= p
+    volume = np.minimum(demand, supply)
+
+    cleared = volume.max()
+    if cleared <= 0:
+        return no_trade
+    best = candidates[volume == cleared]
+    price = (best[0] + best[-1]) / 2  # volume is unimodal in price, so every price in between clears the same
+
+    buyer_fill = np.where(bid_price >= price, bid_quantity, 0.0)
+    seller_fill = np.where(ask_price <= price, ask_quantity, 0.0)
+    buyer_fill *= min(1.0, cleared / buyer_fill.sum())  # pro-rata rationing of the long side
+    seller_fill *= min(1.0, cleared / seller_fill.sum())
+    return ClearingResult(float(price), float(cleared), buyer_fill, seller_fill)
+
+
+def clear_tick_buckets(bid_price: np.ndarray, bid_quantity: np.ndarray,
+                       ask_price: np.ndarray, ask_quantity: np.ndarray, tick: float = 0.0001) -> ClearingResult:
+    """
+    Clear bids and asks at a single price, locating the crossing on a tick grid
+
+    Orders are bucketed per price tick with bincount (a counting sort, no
+    comparison sort), and cumulative sums over the bucket arrays bound the
+    traded volume at any price inside every tick. Only the ticks whose bound
+    can reach the best guaranteed volume can hold the clearing price; the
+    orders in those ticks - a handful in a dense book, since all offers lie
+    in a narrow band around the price forecast - are resolved with their
+    exact limits. The result equals clear_uniform_price (same candidate
+    prices, same midpoint rule) at O(N + ticks) plus a sort of the orders
+    in the crossing ticks.
+
+    Args:
+        bid_price: Bid prices in €/kWh
+        bid_quantity: Bid quantities in kWh
+        ask_price: Ask prices in €/kWh
+        ask_quantity: Ask quantities in kWh
+        tick: Price tick in €/kWh (bucket width)
+
+    Returns:
+        ClearingResult with price, volume and per-order fills
+    """
+    bid_price = np.asarray(bid_price, dtype=np.float64)
+    bid_quantity = np.asarray(bid_quantity, dtype=np.float64)
+    ask_price = np.asarray(ask_price, dtype=np.float64)
+    ask_quantity = np.asarray(ask_quantity, dtype=np.float64)
+    no_trade = ClearingResult(float('nan'), 0.0, np.zeros(len(bid_price)), np.zeros(len(ask_price)))
+    if len(bid_price) == 0 or len(ask_price) == 0:
+        return no_trade
+
+    bid_tick = np.floor(bid_price / tick).astype(np.int64)
+    ask_tick = np.floor(ask_price / tick).astype(np.int64)
+    low = min(bid_tick.min(), ask_tick.min())
+    bid_tick -= low
+    ask_tick -= low
+    num_ticks = int(max(bid_tick.max(), ask_tick.max())) + 1
+
+    # Tick level: demand[k] = bids in ticks >= k, supply[k + 1] = asks in ticks <= k
+    demand = np.concatenate((np.cumsum(np.bincount(bid_tick, bid_quantity, num_ticks)[::-1])[::-1], [0.0]))
+    supply = np.concatenate(([0.0], np.cumsum(np.bincount(ask_tick, ask_quantity, num_ticks))))
+    upper = np.minimum(demand[:-1], supply[1:])  # bound on the volume at any price inside the tick
+    lower = np.minimum(demand[1:], supply[:-1])  # volume at least reached at any order price inside the tick
+    occupied = (np.bincount(bid_tick, minlength=num_ticks) + np.bincount(ask_tick, minlength=num_ticks)) > 0
+    crossing = occupied & (upper >= lower[occupied].max() - 1e-9)  # ticks that can hold the best price
+
+    # Exact demand and supply at the order prices of the crossing ticks
+    bids = crossing[bid_tick]
+    asks = crossing[ask_tick]
+    bid_order = np.argsort(bid_price[bids], kind='stable')
+    ask_order = np.argsort(ask_price[asks], kind='stable')
+    crossing_bids, crossing_bid_ticks = bid_price[bids][bid_order], bid_tick[bids][bid_order]
+    crossing_asks, crossing_ask_ticks = ask_price[asks][ask_order], ask_tick[asks][ask_order]
+    bid_suffix = np.concatenate((np.cumsum(bid_quantity[bids][bid_order][::-1])[::-1], [0.0]))
+    ask_prefix = np.concatenate(([0.0], np.cumsum(ask_quantity[asks][ask_order])))
+
+    candidates = np.unique(np.concatenate((crossing_bids, crossing_asks)))
+    candidate_tick = np.floor(candidates / tick).astype(np.int64) - low
+    demand_at = (demand[candidate_tick + 1]   # bids in higher ticks, plus those in the same tick priced >= p
+                 + bid_suffix[np.searchsorted(crossing_bids, candidates, side='left')]
+                 - bid_suffix[np.searchsorted(crossing_bid_ticks, candidate_tick + 1, side='left')])
+    supply_at = (supply[candidate_tick]   # asks in lower ticks, plus those in the same tick priced <= p
+                 + ask_prefix[np.searchsorted(crossing_asks, candidates, side='right')]
+                 - ask_prefix[np.searchsorted(crossing_ask_ticks, candidate_tick, side='left')])
+    volume = np.minimum(demand_at, supply_at)
+
+    cleared = volume.max()
+    if cleared <= 0:
+        return no_trade
+    best = candidates[volume >= cleared - 1e-9]  # tick sums and partial sums round differently
+    price = (best[0] + best[-1]) / 2
+
+    buyer_fill = np.where(bid_price >= price, bid_quantity, 0.0)
+    seller_fill = np.where(ask_price <= price, ask_quantity, 0.0)
+    buyer_fill *= min(1.0, cleared / buyer_fill.sum())  # pro-rata rationing of the long side
+    seller_fill *= min(1.0, cleared / seller_fill.sum())
+    return ClearingResult(float(price), float(cleared), buyer_fill, seller_fill)
+
+
+def pair_fills(buyer_ids: np.ndarray, buyer_fill: np.ndarray,
+               seller_ids: np.ndarray, seller_fill: np.ndarray,
+               min_quantity: float = 1e-9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Split per-order fills into bilateral buyer/seller trades
+
+    Both sides are laid end to end on one quantity axis; every segment
+    between consecutive breakpoints of the two cumulative sums belongs to
+    exactly one buyer and one seller (merged with searchsorted), giving at
+    most B + S - 1 trades.
+
+    Args:
+        buyer_ids: Buyer ID per bid
+        buyer_fill: Filled quantity per bid in kWh
+        seller_ids: Seller ID per ask
+        seller_fill: Filled quantity per ask in kWh
+        min_quantity: Segments smaller than this (rounding residue) are dropped
+
+    Returns:
+        Tuple (buyer_ids, seller_ids, quantity) with one entry per trade
+    """
+    cum_bought = np.cumsum(buyer_fill)
+    cum_sold = np.cumsum(seller_fill)
+    if len(cum_bought) == 0 or len(cum_sold) == 0:
+        empty = np.zeros(0)
+        return empty.astype(np.int64), empty.astype(np.int64), empty
+
+    total = min(cum_bought[-1], cum_sold[-1])
+    breakpoints = np.unique(np.concatenate(([0.0], cum_bought, cum_sold)))
+    breakpoints = breakpoints[breakpoints <= total]
+    quantity = np.diff(breakpoints)
+    middle = breakpoints[:-1] + quantity / 2
+
+    buyers = np.searchsorted(cum_bought, middle, side='right')
+    sellers = np.searchsorted(cum_sold, middle, side='right')
+    keep = quantity >= min_quantity
+    return (np.asarray(buyer_ids)[buyers[keep]], np.asarray(seller_ids)[sellers[keep]], quantity[keep])
+
+
+class UniformPriceAuction:
+    """
+    P2P clearing engine running one uniform-price double auction per timestep
+    (drop-in for P2PTradingMechanism.execute_p2p_trading)
+    """
+
+    def __init__(self, min_quantity: float = 0.001):
+        """
+        Initialize the auction
+
+        Args:
+            min_quantity: Smallest order quantity in kWh taking part in the auction
+        """
+        self.min_quantity = min_quantity
+        self.last_price = None  # €/kWh - clearing price of the last timestep (None if nothing cleared)
+
+    def _clear(self, bid_price, bid_quantity, ask_price, ask_quantity) -> ClearingResult:
+        """Clear the active offers (exact prices)"""
+        return clear_uniform_price(bid_price, bid_quantity, ask_price, ask_quantity)
+
+    def execute_p2p_trading(self, prosumers: List[Prosumer], timestep: int) -> TradeBatch:
+        """
+        Clear all active buyers and sellers at one price
+
+        Args:
+            prosumers: List of prosumers (index = prosumer ID)
+            timestep: Current timestep
+
+        Returns:
+            TradeBatch of executed P2P trades, all at the clearing price
+        """
+        population = population_of(prosumers)
+        if population is not None:   # read the offers straight from the population arrays
+            ids, is_buyer, is_seller = population.id, population.active_buyers, population.active_sellers
+            desired, bid_price, ask_price = population.desired_quantity, population.bid_price, population.ask_price
+        else:
+            ids = np.array([p.id for p in prosumers], dtype=np.int64)
+            is_buyer = np.array([p.is_buyer and not p.is_banned for p in prosumers], dtype=bool)
+            is_seller = np.array([p.is_seller and not p.is_banned for p in prosumers], dtype=bool)
+            desired = np.array([p.desired_quantity for p in prosumers], dtype=np.float64)
+            bid_price = np.array([p.bid_price for p in prosumers], dtype=np.float64)
+            ask_price = np.array([p.ask_price for p in prosumers], dtype=np.float64)
+
+        bids = is_buyer & (desired >= self.min_quantity)
+        asks = is_seller & (desired >= self.min_quantity)
+        result = self._clear(bid_price[bids], desired[bids], ask_price[asks], desired[asks])
+        self.last_price = result.price if result.quantity > 0 else None
+        if result.quantity <= 0:
+            return TradeBatch()
+
+        buyer_ids, seller_ids, quantity = pair_fills(ids[bids], result.buyer_fill, ids[asks], result.seller_fill)
+        if population is not None:
+            population.accept_trades(buyer_ids, seller_ids, quantity, result.price, is_p2p=True)
+        else:
+            for buyer_id, seller_id, amount in zip(buyer_ids.tolist(), seller_ids.tolist(), quantity.tolist()):
+                prosumers[buyer_id].accept_trade(amount, result.price, is_buyer_role=True, is_p2p=True)
+                prosumers[seller_id].accept_trade(amount, result.price, is_buyer_role=False, is_p2p=True)
+
+        return TradeBatch.from_arrays(buyer_ids, seller_ids, quantity, result.price, 'p2p', timestep)
+
+    def __repr__(self):
+        return f"UniformPriceAuction(min_quantity={self.min_quantity}, last_price={self.last_price})"
+
+
+class TickBucketAuction(UniformPriceAuction):
+    """
+    Uniform-price auction on a discrete price grid (see clear_tick_buckets),
+    the fastest clearing option for very large books
+
+    Deterministic, and equal to UniformPriceAuction; the tick only sets
+    the bucket width of the search.
+    """
+
+    def __init__(self, tick: float = 0.0001, min_quantity: float = 0.001):
+        """
+        Initialize the auction
+
+        Args:
+            tick: Price tick in €/kWh
+            min_quantity: Smallest order quantity in kWh taking part in the auction
+        """
+        super().__init__(min_quantity)
+        self.tick = tick
+
+    def _clear(self, bid_price, bid_quantity, ask_price, ask_quantity) -> ClearingResult:
+        """Clear the active offers on the tick grid"""
+        return clear_tick_buckets(bid_price, bid_quantity, ask_price, ask_quantity, self.tick)
+
+    def __repr__(self):
+        return f"TickBucketAuction(tick={self.tick}, last_price={self.last_price})"
@@ -0,0 +1,75 @@
+"""
+Compact __slots__-based Prosumer and Trade records for the object API
+"""
+import types
+from prosumer import Prosumer
+from population import FIELD_DTYPES
+
+
+class SlottedProsumer:
+    """
+    Prosumer with its attributes stored in __slots__ instead of a per-instance __dict__
+
+    Same constructor, attributes and methods as Prosumer (the methods are
+    shared, not copied), at a fraction of the memory per instance and with
+    faster attribute access in the per-timestep loops. New attributes cannot
+    be added to instances.
+    """
+
+    __slots__ = tuple(FIELD_DTYPES) + ('rng',)
+
+    def __repr__(self):
+        return Prosumer.__repr__(self)
+
+
+for _name, _attr in vars(Prosumer).items():   # reuse every Prosumer method on the slotted layout
+    if isinstance(_attr, types.FunctionType) and _name != '__repr__':
+        setattr(SlottedProsumer, _name, _attr)
+
+
+class SlottedTrade:
+    """
+    Compact trade record (same fields and to_dict() as the trading module's Trade)
+    """
+
+    __slots__ = ('trade_type', 'buyer_id', 'seller_id', 'quantity', 'price', 'timestep')
+
+    def __init__(self, buyer_id: int, seller_id: int, quantity: float, price: float,
+                 trade_type: str, timestep: int):
+        """
+        Initialize a trade
+
+        Args:
+            buyer_id: ID of the buying prosumer (-1 for the aggregator)
+            seller_id: ID of the selling prosumer (-1 for the aggregator)
+            quantity: Traded energy in kWh
+            price: Trade price in €/kWh
+            trade_type: 'p2p' or 'local_market'
+            timestep: Timestep of the trade
+        """
+        self.buyer_id = buyer_id
+        self.seller_id = seller_id
+        self.quantity = quantity
+        self.price = price
+        self.trade_type = trade_type
+        self.timestep = timestep
+
+    def to_dict(self) -> dict:
+        """
+        Convert the trade to a blockchain transaction
+
+        Returns:
+            Dictionary of the trade fields
+        """
+        return {
+            'buyer_id': self.buyer_id,
+            'seller_id': self.seller_id,
+            'quantity': self.quantity,
+            'price': self.price,
+            'trade_type': self.trade_type,
+            'timestep': self.timestep
+        }
+
+    def __repr__(self):
+        return (f"SlottedTrade({self.trade_type}, buyer={self.buyer_id}, seller={self.seller_id}, "
+                f"{self.quantity:.2f}kWh @ {self.price:.4f}€/kWh)")
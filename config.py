@@ -1,11 +1,15 @@
 # Simulation parameters
 NUM_PROSUMERS = 100
 TIME_STEPS = 24  # 24 hours
-TIME_STEP_DURATION = 1  # hours
+TIME_STEP_DURATION = 1  # hours per time step (1, 0.25 for 15 min, 1/12 for 5 min)
+RANDOM_SEED = None  # root seed of all random streams (None = fresh seed, printed at start to reproduce the run)
+PROFILE_FILE = None  # JSON file with custom hourly consumption (shared or per home type)/solar/price profiles (None = built-in shapes)
+PV_TRACE_FILE = None  # .npy irradiance trace (timesteps x prosumers, see traces.py) replacing random weather
+LOAD_TRACE_FILE = None  # .npy load trace in kWh per timestep (timesteps x prosumers) replacing generated consumption
 
 # Prosumer parameters
 PV_CAPACITY = [ 2.5, 3.0, 3.5, 4.0, 4.5, 5.0, 5.5, 6.0, 6.5, 7.0 ]  # kW
-BASE_CONSUMPTION = [ 0.35, 0.45, 0.55, 0.65, 0.75, 0.90, 1.05, 1.20, 1.35, 1.50 ]  # kWh per time step
+BASE_CONSUMPTION = [ 0.35, 0.45, 0.55, 0.65, 0.75, 0.90, 1.05, 1.20, 1.35, 1.50 ]  # kWh per hour
 HAS_BATTERY = 0.8  # 80% of prosumers have a battery
 BATTERY_CAPACITY = [ 5.0, 7.0, 8.0, 10.0, 12.0, 13.0, 15.0, 17.0, 18.0, 20.0 ]  # kWh possible battery capacities
 BATTERY_EFFICIENCY = 0.95  # Round-trip efficiency (5% loss on charge/discharge cycle)
@@ -14,23 +18,52 @@ BATTERY_MAX_SOC = 0.95  # Maximum state of charge (95% to protect battery)
 
 # Grid parameters
 BASE_PRICE = 0.15  # €/kWh
-MAX_TRADE_CAP = 3.0  # kWh maximum trade quantity per prosumer per time step
+MAX_TRADE_CAP = 3.0  # kWh maximum trade quantity per prosumer per hour (scaled by TIME_STEP_DURATION)
 
 # Trading parameters
 LOCAL_MARKET_FEE = 0.03  # €/kWh fee for local market trading
-IMBALANCE_THRESHOLD = 0.05  # kWh threshold for balancing the amount of energy to trade
+IMBALANCE_THRESHOLD = 0.05  # kWh per hour threshold for balancing the amount of energy to trade
+P2P_MATCHING = "bilateral"  # P2P matching engine: bilateral (P2PTradingMechanism), order_book, uniform_price, continuous, sharded, optimal, network, tick_bucket
+NUM_SHARDS = 4  # neighbourhood shards matched in parallel (sharded matching)
+SHARD_BY = "feeder"  # shard partition: feeder (consecutive prosumer IDs), home_type (similar homes)
+SHARD_ENGINE = "uniform_price"  # matching engine inside each shard: uniform_price, order_book
+P2P_OBJECTIVE = "volume"  # optimal matching objective: volume (traded kWh), welfare (trade surplus)
+LP_EDGES_PER_BUYER = 8  # candidate sellers per buyer in the optimal matching LP
+PRICE_TICK = 0.0001  # €/kWh bucket width of tick_bucket matching
+CDA_PRICE_TOLERANCE = 0.01  # €/kWh price change keeping a resting order of continuous matching in place
+
+# Distribution network parameters (network matching)
+NETWORK_HOPS = 4  # largest number of feeder lines between P2P counterparties
+LATERAL_LENGTH = 25  # prosumers per feeder lateral
+LINE_LENGTH = (0.02, 0.08)  # km line length range between neighbouring prosumers
+LINE_CAPACITY = 10.0  # kWh per hour line capacity (scaled by TIME_STEP_DURATION)
+LINE_LOSS_PER_KM = 0.05  # fraction of the traded energy lost per km of line
+LOCAL_MARKET_SETTLEMENT = "per_prosumer"  # local market engine: per_prosumer (LocalMarketMechanism), batched
 
 # Blockchain parameters
 NUM_MINERS = 15
 DIFFICULTY_TARGET = 3  # Number of leading zeros required
 BLOCK_REWARD = 0.1  # € reward for mining a block
 MAX_TRANSACTIONS_PER_BLOCK = 50
+MINING_PROCESSES = 0  # worker processes splitting each nonce search (0 = serial Miner.mine_block)
+MINING_MODE = "pow"  # pow (one random miner hashes), statistical (sample winner and attempts), race (all miners hash concurrently)
+MINER_HASH_RATES = None  # relative hash rate per miner (None = equal)
+POW_SAMPLE_RATE = 0.0  # fraction of blocks still mined with real PoW in statistical mode
+MINER_NONCE_OFFSETS = None  # first nonce per miner in race mode (None = disjoint ranges of 1,000,000 nonces)
 
 # Regulator strategy
 REGULATOR_OBJECTIVE = "maximize_renewable"  # maximize_renewable, maximize_profit, maximize_p2p
-RENEWABLE_BONUS = 0.02  # €/kWh bonus for using renewable energy
+RENEWABLE_BONUS = 0.02  # €/kWh bonus for using renewable energy, per hour (scaled by TIME_STEP_DURATION)
 P2P_BONUS = 0.01  # €/kWh bonus for P2P trading
-PENALTY_FOR_MARKET = 0.02  # €/kWh penalty for using local market
+PENALTY_FOR_MARKET = 0.02  # €/kWh penalty for using local market, per hour (scaled by TIME_STEP_DURATION)
+
+# Long-horizon settings (bounded memory for runs of thousands of timesteps)
+LONG_HORIZON_MODE = False  # keep rolling windows in memory and spill the rest to disk
+LOG_WINDOW = 168  # timesteps of summary log kept in memory (one week at hourly resolution)
+CHAIN_WINDOW = 100  # blocks kept in memory, older blocks are archived to disk
+MAX_PENDING_IN_MEMORY = 1000  # pending transactions kept in memory, overflow is spilled to disk
+BAN_HISTORY_WINDOW = 5  # timesteps of ban history kept by the regulator (at least the 5-hour re-ban window)
+SPILL_DIR = "results/spill"  # directory of the chain archive and pending spill files
 
 # Output settings
 VERBOSE = True
\ No newline at end of file
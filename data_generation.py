@@ -1,94 +1,177 @@
 """
 Data generation for PV generation and price forecasting
 """
-import math
 import random
 from typing import List
+import numpy as np
+from profiles import DEFAULT_PROFILES, PV_SYSTEM_EFFICIENCY, ProfileLibrary
+from random_streams import RNGRegistry
 
-def generate_pv_generation(hour: int, pv_capacity: float) -> float:
+def generate_pv_generation(hour: int, pv_capacity: float, profiles: ProfileLibrary = DEFAULT_PROFILES,
+                           rng=None) -> float:
     """
     Generate realistic residential PV generation (kWh) per hour
     """
 
-    # Daylight hours: 6 AM to 6 PM
-    if hour < 6 or hour > 18:
+    # Sinusoidal solar curve over daylight hours (peak at noon), precomputed per hour of day
+    generation_factor = profiles.solar_shape()[hour]
+    if generation_factor <= 0.0:
         return 0.0
 
-    # Map hour to daylight index: 0 → 12
-    daylight_hour = hour - 6
-
-    # Sinusoidal solar curve (peak at noon)
-    angle = math.pi * daylight_hour / 12
-    generation_factor = math.sin(angle)
-
     # System losses & panel efficiency (inverter, temperature, dust)
-    system_efficiency = 0.88   # realistic residential average
+    system_efficiency = PV_SYSTEM_EFFICIENCY
 
     # Weather variability (clouds, haze)
-    weather_factor = random.uniform(0.5, 1.0)
+    weather_factor = (rng if rng is not None else random).uniform(0.5, 1.0)
 
     # kWh = kW * 1h * factors
     generation = (
         pv_capacity
-        * generation_factor
+        * float(generation_factor)
         * system_efficiency
         * weather_factor
     )
 
     return max(0.0, generation)
 
-def generate_consumption(hour: int, base_consumption: float) -> float:
+def generate_consumption(hour: int, base_consumption: float, profiles: ProfileLibrary = DEFAULT_PROFILES,
+                         rng=None, home_type: int = None) -> float:
     """
     Generate consumption based on hour and base consumption with typical daily pattern
     
     Args:
         hour: Hour of day (0-23)
         base_consumption: Base consumption level of the prosumer in kWh
+        profiles: Library providing the daily consumption shape
+        rng: Random source for the individual variation (random module if None)
+        home_type: Home type index selecting its consumption shape (None = average shape)
     
     Returns:
         Consumption of the prosumer in kWh for the hour
     """
-    # Typical consumption pattern with peaks in morning and evening
-    consumption_patterns = {
-        0: 0.4, 1: 0.35, 2: 0.35, 3: 0.35, 4: 0.4, 5: 0.6,
-        6: 1.1, 7: 1.4, 8: 1.2, 9: 0.9, 10: 0.8, 11: 0.9,
-        12: 1.0, 13: 0.9, 14: 0.8, 15: 0.8, 16: 0.9, 17: 1.1,
-        18: 1.6, 19: 1.9, 20: 1.7, 21: 1.4, 22: 1.0, 23: 0.6
-    }
-    
-    pattern_factor = consumption_patterns.get(hour, 1.0)    # get pattern factor for the hour of the day with default 1.0
+    pattern_factor = float(profiles.consumption_shape(home_type=home_type)[hour])    # get pattern factor for the hour of the day
     
     # Add some randomness for individual behavior
-    variation = random.uniform(0.85, 1.15)
+    variation = (rng if rng is not None else random).uniform(0.85, 1.15)
     
     consumption = base_consumption * pattern_factor * variation
     
     return max(0.25, consumption)    # return consumption ensuring a minimum consumption
 
 
-def forecast_price(hour: int, base_price: float = 0.15) -> float:
+def generate_pv_matrix(num_timesteps: int, pv_capacity: np.ndarray, streams: RNGRegistry = None,
+                       first_timestep: int = 0, ids=None, profiles: ProfileLibrary = DEFAULT_PROFILES,
+                       resolution: float = 1.0) -> np.ndarray:
+    """
+    Generate PV generation for the whole horizon and community in one call
+    (vectorized equivalent of generate_pv_generation)
+
+    Args:
+        num_timesteps: Number of timesteps
+        pv_capacity: PV capacities in kW (one per prosumer)
+        streams: Registry for the per-prosumer weather draws (unseeded registry if None)
+        first_timestep: Simulation timestep of the first row (sets the step of the day and keys the draws)
+        ids: Prosumer IDs (keys the registry draws, default 0..N-1)
+        profiles: Library providing the daily solar shape
+        resolution: Timestep duration in hours
+
+    Returns:
+        Array (timesteps x prosumers) of PV generation in kWh per timestep
+    """
+    pv_capacity = np.asarray(pv_capacity, dtype=np.float64)
+    streams = streams if streams is not None else RNGRegistry()
+    ids = np.arange(len(pv_capacity)) if ids is None else np.asarray(ids)
+    timesteps = first_timestep + np.arange(num_timesteps)
+    steps = timesteps % profiles.steps_per_day(resolution)   # step of the day of every row
+
+    generation_factor = profiles.solar_shape(resolution)[steps]   # solar curve per timestep
+
+    # Weather variability (clouds, haze), one factor per prosumer and timestep
+    weather_factor = streams.uniform('weather', timesteps[:, None], ids[None, :], 0.5, 1.0)
+
+    # kWh = kW * duration * factors
+    generation = (generation_factor[:, None] * pv_capacity[None, :]) * PV_SYSTEM_EFFICIENCY * weather_factor
+    if resolution != 1.0:
+        generation *= resolution
+    return np.maximum(0.0, generation)
+
+
+def generate_consumption_matrix(num_timesteps: int, base_consumption: np.ndarray, streams: RNGRegistry = None,
+                                first_timestep: int = 0, ids=None, profiles: ProfileLibrary = DEFAULT_PROFILES,
+                                resolution: float = 1.0, home_type_index=None) -> np.ndarray:
+    """
+    Generate consumption for the whole horizon and community in one call
+    (vectorized equivalent of generate_consumption)
+
+    Args:
+        num_timesteps: Number of timesteps
+        base_consumption: Base consumption levels in kWh per hour (one per prosumer)
+        streams: Registry for the per-prosumer variation draws (unseeded registry if None)
+        first_timestep: Simulation timestep of the first row (sets the step of the day and keys the draws)
+        ids: Prosumer IDs (keys the registry draws, default 0..N-1)
+        profiles: Library providing the daily consumption shapes
+        resolution: Timestep duration in hours
+        home_type_index: Home type index per prosumer, selecting its consumption shape
+            (None = average shape for everybody)
+
+    Returns:
+        Array (timesteps x prosumers) of consumption in kWh per timestep
+    """
+    base_consumption = np.asarray(base_consumption, dtype=np.float64)
+    streams = streams if streams is not None else RNGRegistry()
+    ids = np.arange(len(base_consumption)) if ids is None else np.asarray(ids)
+    timesteps = first_timestep + np.arange(num_timesteps)
+    steps = timesteps % profiles.steps_per_day(resolution)   # step of the day of every row
+
+    if home_type_index is not None and profiles.per_home_type:   # pattern per timestep and home type
+        pattern_factor = profiles.home_consumption_shapes(resolution)[np.asarray(home_type_index)[None, :], steps[:, None]]
+    else:   # one shape shared by all prosumers
+        pattern_factor = profiles.consumption_shape(resolution)[steps][:, None]
+
+    # Individual behavior variation, one factor per prosumer and timestep
+    variation = streams.uniform('load', timesteps[:, None], ids[None, :], 0.85, 1.15)
+
+    consumption = (pattern_factor * base_consumption[None, :]) * variation
+    consumption = np.maximum(0.25, consumption)    # ensure a minimum consumption (per hour)
+    if resolution != 1.0:
+        consumption *= resolution
+    return consumption
+
+
+def pv_from_irradiance(irradiance: np.ndarray, pv_capacity: np.ndarray) -> np.ndarray:
+    """
+    Convert a recorded irradiance trace into PV generation
+
+    Args:
+        irradiance: Plane-of-array irradiance normalised to 1 kW/m2 and integrated
+            over the timestep (kWh per kW of panel), shape (timesteps x prosumers)
+        pv_capacity: PV capacities in kW (one per prosumer)
+
+    Returns:
+        Array (timesteps x prosumers) of PV generation in kWh per timestep
+    """
+    generation = np.asarray(irradiance) * np.asarray(pv_capacity)[None, :] * PV_SYSTEM_EFFICIENCY
+    return np.maximum(0.0, generation)
+
+
+def forecast_price(hour: int, base_price: float = 0.15, profiles: ProfileLibrary = DEFAULT_PROFILES,
+                   rng=None) -> float:
     """
     Forecast electricity price based on hour with typical price patterns
     
     Args:
         hour: Hour of day (0-23)
         base_price: Base price in €/kWh
+        profiles: Library providing the daily price shape
+        rng: Random source for the forecast uncertainty (random module if None)
     
     Returns:
         Forecasted price in €/kWh
     """
-    # Price patterns following demand (higher during peak hours)
-    price_factors = {
-        0: 0.7, 1: 0.6, 2: 0.6, 3: 0.6, 4: 0.7, 5: 0.9,  # Night low prices
-        6: 1.3, 7: 1.5, 8: 1.4, 9: 1.2, 10: 1.1, 11: 1.2,  # Morning high
-        12: 1.3, 13: 1.1, 14: 1.0, 15: 1.0, 16: 1.1, 17: 1.2,  # Afternoon
-        18: 1.5, 19: 1.6, 20: 1.5, 21: 1.3, 22: 1.1, 23: 0.9   # Evening peak
-    }
-    
-    factor = price_factors.get(hour, 1.0)   # get price factor for the hour of the day with default 1.0
+    factor = float(profiles.price_shape()[hour])   # get price factor for the hour of the day
     
     # Add small random variation for forecast uncertainty
-    uncertainty = random.uniform(0.95, 1.05)
+    uncertainty = (rng if rng is not None else random).uniform(0.95, 1.05)
     
     price = base_price * factor * uncertainty
     
@@ -0,0 +1,197 @@
+"""
+Vectorized kernels for the per-timestep prosumer computations
+"""
+import numpy as np
+from typing import NamedTuple
+import config
+
+
+class DispatchResult(NamedTuple):
+    """Outcome of one battery dispatch step for the whole community (one entry per prosumer)"""
+    battery_level: np.ndarray   # kWh - battery level after dispatch
+    imbalance: np.ndarray   # kWh - imbalance after battery (positive = surplus, negative = deficit)
+    charged: np.ndarray   # kWh - energy charged into battery (input before efficiency loss)
+    discharged: np.ndarray   # kWh - energy discharged from battery (output after efficiency loss)
+    renewable_direct: np.ndarray   # kWh - PV used directly for consumption
+    renewable_from_battery: np.ndarray   # kWh - renewable energy consumed from battery
+
+
+def dispatch_batteries(pv_generation: np.ndarray, consumption: np.ndarray,
+                       battery_level: np.ndarray, battery_capacity: np.ndarray,
+                       has_battery: np.ndarray = None) -> DispatchResult:
+    """
+    Batched self-consumption and battery management step
+
+    Same surplus-charge / deficit-discharge rules, efficiency losses and
+    SoC clamps as Prosumer.update_energy_state, applied to all prosumers in
+    one call. The floating-point operations are performed in the same order,
+    so results match the scalar method exactly.
+
+    Args:
+        pv_generation: PV generation in kWh
+        consumption: Energy consumption in kWh
+        battery_level: Current battery levels in kWh
+        battery_capacity: Battery capacities in kWh
+        has_battery: Battery ownership mask (defaults to battery_capacity > 0)
+
+    Returns:
+        DispatchResult with new levels, imbalances, flows and renewable usage increments
+    """
+    pv_generation = np.asarray(pv_generation, dtype=np.float64)
+    consumption = np.asarray(consumption, dtype=np.float64)
+    battery_level = np.asarray(battery_level, dtype=np.float64)
+    battery_capacity = np.asarray(battery_capacity, dtype=np.float64)
+    if has_battery is None:
+        has_battery = battery_capacity > 0.0
+
+    initial_imbalance = pv_generation - consumption   # positive = surplus, negative = deficit
+    renewable_direct = np.minimum(pv_generation, consumption)   # direct PV to consumption
+
+    surplus = has_battery & (initial_imbalance > 0)   # try to store in battery
+    deficit = has_battery & (initial_imbalance < 0)   # try to discharge from battery
+
+    # SURPLUS - store as much as the space below max SoC allows (input is X/efficiency for X space)
+    max_level = battery_capacity * config.BATTERY_MAX_SOC
+    available_space = np.maximum(0, max_level - battery_level)
+    max_input_energy = available_space / config.BATTERY_EFFICIENCY
+    charged = np.where(surplus, np.minimum(initial_imbalance, max_input_energy), 0.0)
+    actual_stored = charged * config.BATTERY_EFFICIENCY
+
+    # DEFICIT - discharge down to min SoC (output is input*efficiency)
+    min_level = battery_capacity * config.BATTERY_MIN_SOC
+    available_energy = np.maximum(0, battery_level - min_level)
+    energy_needed = np.abs(initial_imbalance)
+    energy_to_discharge = np.where(deficit, np.minimum(energy_needed / config.BATTERY_EFFICIENCY, available_energy), 0.0)
+    discharged = energy_to_discharge * config.BATTERY_EFFICIENCY
+
+    new_level = np.where(surplus, battery_level + actual_stored,
+                         np.where(deficit, battery_level - energy_to_discharge, battery_level))
+    imbalance = np.where(surplus, initial_imbalance - charged,
+                         np.where(deficit, initial_imbalance + discharged, initial_imbalance))
+
+    return DispatchResult(
+        battery_level=new_level,
+        imbalance=imbalance,
+        charged=charged,
+        discharged=discharged,
+        renewable_direct=renewable_direct,
+        renewable_from_battery=discharged
+    )
+
+
+class OfferBook(NamedTuple):
+    """Trading offers of the whole community for one timestep (one entry per prosumer)"""
+    is_buyer: np.ndarray   # prosumer buys this timestep
+    is_seller: np.ndarray   # prosumer sells this timestep
+    desired_quantity: np.ndarray   # kWh - desired trading quantity (0 if not trading)
+    bid_price: np.ndarray   # €/kWh - bid price (meaningful for buyers only)
+    ask_price: np.ndarray   # €/kWh - ask price (meaningful for sellers only)
+
+
+def _draw_noise(rng: np.random.Generator, size: int) -> np.ndarray:
+    """Uniform [0, 1) price noise from the caller's generator (there is no unseeded fallback)"""
+    if rng is None:
+        raise ValueError("Pass either rng or noise (e.g. RNGRegistry.uniform) to the pricing kernels")
+    return rng.random(size)
+
+
+def price_offers(imbalance: np.ndarray, is_banned: np.ndarray, price_forecast: float,
+                 local_market_fee: float, max_trade_cap: float,
+                 rng: np.random.Generator = None, noise: np.ndarray = None) -> OfferBook:
+    """
+    Batched offer pricing for every prosumer (see Prosumer.prepare_trading_offer)
+
+    Surplus prosumers become sellers and deficit prosumers become buyers; the
+    ask/bid prices follow the same spread, urgency and clamp rules as the
+    scalar method, with the strategic noise drawn in bulk (one uniform draw
+    per prosumer, scaled to the seller or buyer noise range).
+
+    Args:
+        imbalance: Imbalances after self-consumption in kWh
+        is_banned: Ban mask (banned prosumers cannot trade)
+        price_forecast: Forecasted market price in €/kWh
+        local_market_fee: Fee for local market trading in €/kWh
+        max_trade_cap: Maximum trade quantity per prosumer per time step in kWh
+        rng: NumPy random generator for the price noise (required if noise is None)
+        noise: Uniform [0, 1) draws, one per prosumer (e.g. from RNGRegistry.uniform)
+
+    Returns:
+        OfferBook with roles, quantities and prices
+    """
+    imbalance = np.asarray(imbalance, dtype=np.float64)
+    is_banned = np.asarray(is_banned, dtype=bool)
+    if noise is None:
+        noise = _draw_noise(rng, len(imbalance))
+
+    is_seller = ~is_banned & (imbalance > 0.01)   # surplus - prosumer becomes seller
+    is_buyer = ~is_banned & (imbalance < -0.01)   # deficit - prosumer becomes buyer
+
+    desired_quantity = np.zeros(len(imbalance))
+    desired_quantity[is_seller] = np.minimum(imbalance[is_seller], max_trade_cap)
+    desired_quantity[is_buyer] = np.minimum(-imbalance[is_buyer], max_trade_cap)
+
+    grid_buy_price = price_forecast + local_market_fee  # grid buy price including fee
+    grid_sell_price = price_forecast - local_market_fee   # grid sell price including fee
+    spread = grid_buy_price - grid_sell_price  # spread between grid buy and sell prices
+    urgency = desired_quantity / max_trade_cap  # urgency based on desired quantity
+
+    # Sellers: start from grid_sell_price, increasing with urgency
+    ask_price = np.zeros(len(imbalance))
+    seller_noise = 0.98 + (1.05 - 0.98) * noise[is_seller]   # strategic factor in [0.98, 1.05)
+    calculated_ask = (grid_sell_price + (urgency[is_seller] * spread)) * seller_noise
+    calculated_ask = np.maximum(calculated_ask, grid_sell_price * 1.01)  # above grid sell price
+    ask_price[is_seller] = np.minimum(calculated_ask, grid_buy_price * 0.95)  # leave room for P2P matching
+
+    # Buyers: start from midpoint, moving toward grid_buy_price with urgency
+    bid_price = np.zeros(len(imbalance))
+    buyer_noise = 0.97 + (1.01 - 0.97) * noise[is_buyer]   # strategic factor in [0.97, 1.01)
+    midpoint = (grid_sell_price + grid_buy_price) / 2
+    calculated_bid = (midpoint + (urgency[is_buyer] * spread * 0.5)) * buyer_noise
+    calculated_bid = np.minimum(calculated_bid, grid_buy_price * 0.97)  # below grid buy price
+    bid_price[is_buyer] = np.maximum(calculated_bid, grid_sell_price * 1.08)  # leave room for P2P matching
+
+    return OfferBook(
+        is_buyer=is_buyer,
+        is_seller=is_seller,
+        desired_quantity=desired_quantity,
+        bid_price=bid_price,
+        ask_price=ask_price
+    )
+
+
+def price_battery_offers(desired_quantity: np.ndarray, offered_quantity: np.ndarray,
+                         price_forecast: float, local_market_fee: float, max_trade_cap: float,
+                         rng: np.random.Generator = None, noise: np.ndarray = None):
+    """
+    Batched pricing for prosumers selling from their battery (see Prosumer.becomes_seller)
+
+    Args:
+        desired_quantity: Current desired quantities of the recruited prosumers in kWh
+        offered_quantity: Quantities offered from battery in kWh
+        price_forecast: Forecasted market price in €/kWh
+        local_market_fee: Fee for local market trading in €/kWh
+        max_trade_cap: Maximum trade quantity per prosumer per time step in kWh
+        rng: NumPy random generator for the price noise (required if noise is None)
+        noise: Uniform [0, 1) draws, one per recruited prosumer
+
+    Returns:
+        Tuple (desired_quantity, ask_price) of the recruited battery sellers
+    """
+    desired_quantity = np.asarray(desired_quantity, dtype=np.float64) + offered_quantity
+    if noise is None:
+        noise = _draw_noise(rng, len(desired_quantity))
+    desired_quantity = np.minimum(desired_quantity, max_trade_cap)  # capped by max trade cap
+
+    grid_buy_price = price_forecast + local_market_fee  # grid buy price including fee
+    grid_sell_price = price_forecast - local_market_fee   # grid sell price including fee
+    spread = grid_buy_price - grid_sell_price  # spread between grid buy and sell prices
+    urgency = desired_quantity / max_trade_cap  # urgency based on desired quantity
+
+    # Battery sellers price more competitively: lower noise range and 0.3x urgency premium
+    battery_noise = 0.95 + (1.00 - 0.95) * noise   # strategic factor in [0.95, 1.00)
+    base_battery_price = (grid_sell_price + price_forecast) / 2  # midpoint between grid_sell and forecast
+    calculated_ask = (base_battery_price + (urgency * spread * 0.3)) * battery_noise
+
+    ask_price = np.maximum(calculated_ask, grid_sell_price * 1.03)  # min 3% above grid sell
+    ask_price = np.minimum(ask_price, grid_buy_price * 0.85)  # max 85% of grid buy
+    return desired_quantity, ask_price
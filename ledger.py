@@ -0,0 +1,141 @@
+"""
+Incrementally maintained supply/demand ledger of the community offers
+"""
+import numpy as np
+
+
+class CommunityLedger:
+    """
+    Running totals of the current trading offers
+
+    The ledger is updated with the change of every prosumer whose offer is
+    made, modified or (partially) filled, so totals, counts and the
+    unsatisfied sets can be read in O(1) instead of rescanning the whole
+    community. Only active offers count (buyers/sellers that are not banned).
+    """
+
+    def __init__(self, satisfied_below: float = 0.01):
+        """
+        Initialize an empty ledger
+
+        Args:
+            satisfied_below: Remaining quantity in kWh below which an offer counts as satisfied
+        """
+        self.satisfied_below = satisfied_below
+        self.clear()
+
+    def clear(self):
+        """Drop all offers (start of a new timestep)"""
+        self.buyer_quantity = 0.0  # kWh - desired quantity of all active buyers
+        self.seller_quantity = 0.0  # kWh - desired quantity of all active sellers
+        self.num_buyers = 0  # number of active buyers
+        self.num_sellers = 0  # number of active sellers
+        self.num_pending = 0  # active buyers and sellers with any quantity left
+        self.unsatisfied_buyers = set()  # IDs of active buyers with at least satisfied_below left
+        self.unsatisfied_sellers = set()  # IDs of active sellers with at least satisfied_below left
+
+    def _update(self, ids, is_buyer, is_seller, desired, sign: int):
+        """Add (sign=1) or remove (sign=-1) the offers of the given prosumers"""
+        ids = np.atleast_1d(ids)
+        is_buyer = np.atleast_1d(is_buyer)
+        is_seller = np.atleast_1d(is_seller)
+        desired = np.atleast_1d(desired)
+
+        self.buyer_quantity += sign * float(desired[is_buyer].sum())
+        self.seller_quantity += sign * float(desired[is_seller].sum())
+        self.num_buyers += sign * int(is_buyer.sum())
+        self.num_sellers += sign * int(is_seller.sum())
+        self.num_pending += sign * int(((is_buyer | is_seller) & (desired > 0)).sum())
+
+        unsatisfied = desired >= self.satisfied_below
+        for side, mask in ((self.unsatisfied_buyers, is_buyer & unsatisfied),
+                           (self.unsatisfied_sellers, is_seller & unsatisfied)):
+            if sign > 0:
+                side.update(ids[mask].tolist())
+            else:
+                side.difference_update(ids[mask].tolist())
+
+    def add(self, ids, is_buyer, is_seller, desired):
+        """
+        Add the offers of some prosumers
+
+        Args:
+            ids: Prosumer IDs
+            is_buyer: Active buyer flags
+            is_seller: Active seller flags
+            desired: Desired quantities in kWh
+        """
+        self._update(ids, is_buyer, is_seller, desired, 1)
+
+    def remove(self, ids, is_buyer, is_seller, desired):
+        """
+        Remove the offers of some prosumers (before they change)
+
+        Args:
+            ids: Prosumer IDs
+            is_buyer: Active buyer flags
+            is_seller: Active seller flags
+            desired: Desired quantities in kWh
+        """
+        self._update(ids, is_buyer, is_seller, desired, -1)
+
+    def add_offer(self, prosumer_id: int, is_buyer: bool, is_seller: bool, desired: float):
+        """
+        Add the offer of one prosumer (scalar add, for per-object code paths)
+
+        Args:
+            prosumer_id: Prosumer ID
+            is_buyer: Active buyer flag
+            is_seller: Active seller flag
+            desired: Desired quantity in kWh
+        """
+        self._update_offer(prosumer_id, is_buyer, is_seller, desired, 1)
+
+    def remove_offer(self, prosumer_id: int, is_buyer: bool, is_seller: bool, desired: float):
+        """
+        Remove the offer of one prosumer (scalar remove, for per-object code paths)
+
+        Args:
+            prosumer_id: Prosumer ID
+            is_buyer: Active buyer flag
+            is_seller: Active seller flag
+            desired: Desired quantity in kWh
+        """
+        self._update_offer(prosumer_id, is_buyer, is_seller, desired, -1)
+
+    def _update_offer(self, prosumer_id: int, is_buyer: bool, is_seller: bool, desired: float, sign: int):
+        """Add (sign=1) or remove (sign=-1) the offer of one prosumer without NumPy overhead"""
+        unsatisfied = desired >= self.satisfied_below
+        for flag, side in ((is_buyer, self.unsatisfied_buyers), (is_seller, self.unsatisfied_sellers)):
+            if flag and unsatisfied:
+                if sign > 0:
+                    side.add(prosumer_id)
+                else:
+                    side.discard(prosumer_id)
+        if is_buyer:
+            self.buyer_quantity += sign * desired
+            self.num_buyers += sign
+        if is_seller:
+            self.seller_quantity += sign * desired
+            self.num_sellers += sign
+        if (is_buyer or is_seller) and desired > 0:
+            self.num_pending += sign
+
+    @property
+    def imbalance(self) -> float:
+        """Demand minus supply of the current offers in kWh"""
+        return self.buyer_quantity - self.seller_quantity
+
+    @property
+    def satisfied_buyers(self) -> int:
+        """Number of active buyers with less than satisfied_below left"""
+        return self.num_buyers - len(self.unsatisfied_buyers)
+
+    @property
+    def satisfied_sellers(self) -> int:
+        """Number of active sellers with less than satisfied_below left"""
+        return self.num_sellers - len(self.unsatisfied_sellers)
+
+    def __repr__(self):
+        return (f"CommunityLedger(buyers={self.num_buyers}: {self.buyer_quantity:.2f}kWh, "
+                f"sellers={self.num_sellers}: {self.seller_quantity:.2f}kWh)")
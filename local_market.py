@@ -0,0 +1,82 @@
+"""
+Batched settlement of the local market phase
+"""
+import numpy as np
+from typing import List
+from prosumer import Prosumer
+from population import population_of
+from trade_batch import TradeBatch
+
+
+class BatchedLocalMarket:
+    """
+    Local market settling every remaining imbalance against the aggregator
+    in one array operation (drop-in for LocalMarketMechanism.execute_local_market)
+
+    Buyers buy their remaining desired quantity from the aggregator at the
+    price forecast plus the fee, sellers sell theirs at the forecast minus
+    the fee.
+    """
+
+    def __init__(self, aggregator_id: int = -1, transaction_fee: float = 0.03, min_quantity: float = 0.001):
+        """
+        Initialize the local market
+
+        Args:
+            aggregator_id: ID of the aggregator (counterparty of every market trade)
+            transaction_fee: Fee for local market trading in €/kWh
+            min_quantity: Smallest remaining quantity in kWh settled on the market
+        """
+        self.aggregator_id = aggregator_id
+        self.transaction_fee = transaction_fee
+        self.min_quantity = min_quantity
+
+    def execute_local_market(self, prosumers: List[Prosumer], price_forecast: float, timestep: int) -> TradeBatch:
+        """
+        Settle all unsatisfied buyers and sellers with the aggregator
+
+        Args:
+            prosumers: List of prosumers (index = prosumer ID)
+            price_forecast: Forecasted market price in €/kWh
+            timestep: Current timestep
+
+        Returns:
+            TradeBatch of executed market trades (buyers first, then sellers, by prosumer ID)
+        """
+        population = population_of(prosumers)
+        if population is not None:
+            ids, is_buyer, is_seller = population.id, population.active_buyers, population.active_sellers
+            desired = population.desired_quantity
+        else:
+            ids = np.array([p.id for p in prosumers], dtype=np.int64)
+            is_buyer = np.array([p.is_buyer and not p.is_banned for p in prosumers], dtype=bool)
+            is_seller = np.array([p.is_seller and not p.is_banned for p in prosumers], dtype=bool)
+            desired = np.array([p.desired_quantity for p in prosumers], dtype=np.float64)
+
+        buying = is_buyer & (desired >= self.min_quantity)
+        selling = is_seller & (desired >= self.min_quantity)
+        num_buys = int(buying.sum())
+
+        buyer_ids = np.concatenate((ids[buying], np.full(int(selling.sum()), self.aggregator_id)))
+        seller_ids = np.concatenate((np.full(num_buys, self.aggregator_id), ids[selling]))
+        quantity = np.concatenate((desired[buying], desired[selling]))
+        price = np.where(np.arange(len(quantity)) < num_buys,
+                         price_forecast + self.transaction_fee,   # aggregator sells at forecast + fee
+                         price_forecast - self.transaction_fee)   # aggregator buys at forecast - fee
+
+        if population is not None:
+            traders = np.concatenate((ids[buying], ids[selling]))
+            population.accept_trades(buyer_ids, seller_ids, quantity, price, is_p2p=False)
+            population.market_quantity[traders] += quantity
+        else:
+            for buyer_id, seller_id, amount, trade_price in zip(buyer_ids.tolist(), seller_ids.tolist(),
+                                                                quantity.tolist(), price.tolist()):
+                is_buyer_role = seller_id == self.aggregator_id
+                prosumer = prosumers[buyer_id if is_buyer_role else seller_id]
+                prosumer.accept_trade(amount, trade_price, is_buyer_role=is_buyer_role, is_p2p=False)
+                prosumer.market_quantity += amount
+
+        return TradeBatch.from_arrays(buyer_ids, seller_ids, quantity, price, 'local_market', timestep)
+
+    def __repr__(self):
+        return f"BatchedLocalMarket(aggregator_id={self.aggregator_id}, fee={self.transaction_fee})"
@@ -0,0 +1,241 @@
+"""
+Radial distribution feeder and network-constrained P2P matching
+"""
+import numpy as np
+from scipy.sparse import csr_matrix, identity
+from typing import List, Tuple
+from prosumer import Prosumer
+from population import population_of
+from trade_batch import TradeBatch
+
+
+class RadialFeeder:
+    """
+    Radial low-voltage feeder with one prosumer per node
+
+    Prosumers are placed on laterals of consecutive IDs (every node hangs
+    off the previous one); the first node of every lateral hangs off the
+    first node of the previous lateral (the backbone). Node 0 is the feeder
+    head. Every node owns the line to its parent.
+
+    Distances and loss factors are only stored for node pairs at most
+    `hops` lines apart, as scipy.sparse matrices, so memory and candidate
+    generation stay linear in the number of nodes.
+    """
+
+    def __init__(self, num_nodes: int, hops: int = 4, lateral_length: int = 25,
+                 line_length: Tuple[float, float] = (0.02, 0.08), line_capacity: float = 10.0,
+                 loss_per_km: float = 0.05, rng: np.random.Generator = None):
+        """
+        Build the feeder
+
+        Args:
+            num_nodes: Number of nodes (prosumers)
+            hops: Largest number of lines between two trading counterparties
+            lateral_length: Nodes per lateral
+            line_length: (min, max) line length in km
+            line_capacity: Capacity of every line in kWh per timestep
+            loss_per_km: Fraction of the energy lost per km of line
+            rng: Random generator for the line lengths
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        self.num_nodes = num_nodes
+        self.hops = hops
+        self.loss_per_km = loss_per_km
+
+        nodes = np.arange(num_nodes)
+        position = nodes % lateral_length  # position on the lateral
+        self.parent = np.where(position > 0, nodes - 1, nodes - lateral_length)
+        self.parent[0] = -1  # feeder head
+        self.depth = nodes // lateral_length + position  # lines between node and feeder head
+        self.line_length = rng.uniform(line_length[0], line_length[1], num_nodes)  # km - line to the parent
+        self.line_length[0] = 0.0
+        self.line_capacity = np.full(num_nodes, float(line_capacity))  # kWh per timestep - line to the parent
+
+        children = nodes[self.parent >= 0]
+        self.adjacency = csr_matrix((np.ones(2 * len(children)),
+                                     (np.concatenate((children, self.parent[children])),
+                                      np.concatenate((self.parent[children], children)))),
+                                    shape=(num_nodes, num_nodes))
+        self.distance = self._neighbour_distances()  # km - path length of every pair within `hops`
+        self.loss_factor = self.distance.copy()  # fraction of the energy lost between every pair within `hops`
+        self.loss_factor.data = np.minimum(loss_per_km * self.loss_factor.data, 1.0)
+
+    def _neighbour_distances(self) -> csr_matrix:
+        """Sparse path lengths of all node pairs at most self.hops lines apart (self-pairs excluded)"""
+        reach = identity(self.num_nodes, format='csr')
+        for _ in range(self.hops):
+            reach = reach + reach @ self.adjacency
+            reach.data[:] = 1.0
+        reach = reach.tocoo()
+        off_diagonal = reach.row != reach.col
+        rows, cols = reach.row[off_diagonal], reach.col[off_diagonal]
+        lines, _ = self.paths(rows, cols)
+        distance = np.where(lines >= 0, self.line_length[np.maximum(lines, 0)], 0.0).sum(axis=1)
+        return csr_matrix((distance, (rows, cols)), shape=(self.num_nodes, self.num_nodes))
+
+    def paths(self, sources: np.ndarray, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Lines on the paths of node pairs at most self.hops lines apart
+
+        Args:
+            sources: Source node per pair (energy flows from here)
+            targets: Target node per pair
+
+        Returns:
+            Tuple (lines, direction) of shape (pairs, hops): the node owning each
+            line on the path (-1 = padding) and the flow direction on it
+            (+1 towards the feeder head, -1 away from it)
+        """
+        a, b = np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+        lines = np.full((len(a), self.hops), -1, dtype=np.int64)
+        direction = np.zeros((len(a), self.hops), dtype=np.int8)
+        for step in range(self.hops):  # climb from the deeper end until both ends meet
+            up_source = (a != b) & (self.depth[a] >= self.depth[b])
+            up_target = (a != b) & ~up_source
+            lines[up_source, step], direction[up_source, step] = a[up_source], 1
+            lines[up_target, step], direction[up_target, step] = b[up_target], -1
+            a[up_source] = self.parent[a[up_source]]
+            b[up_target] = self.parent[b[up_target]]
+        return lines, direction
+
+    def __repr__(self):
+        return f"RadialFeeder(nodes={self.num_nodes}, hops={self.hops}, pairs={self.distance.nnz})"
+
+
+class NetworkMatcher:
+    """
+    P2P matching on a radial feeder (drop-in for P2PTradingMechanism.execute_p2p_trading)
+
+    Only sellers within feeder.hops lines of a buyer are candidate
+    counterparties. A seller sends q kWh, the buyer receives q * (1 - loss);
+    a pair is feasible if the bid covers the ask grossed up by the losses.
+    Pairs are matched greedily by surplus per kWh sent, keeping the net flow
+    of every line within its capacity. The buyer pays the midpoint of its
+    bid and the grossed-up ask per kWh received, the seller gets the same
+    amount for the kWh it sent.
+    """
+
+    def __init__(self, feeder: RadialFeeder, min_quantity: float = 0.001):
+        """
+        Initialize the matcher
+
+        Args:
+            feeder: Feeder the prosumers are placed on (node = prosumer ID)
+            min_quantity: Smallest quantity in kWh worth trading
+        """
+        self.feeder = feeder
+        self.min_quantity = min_quantity
+        self.line_flow = np.zeros(feeder.num_nodes)  # kWh - net flow towards the feeder head per line (last timestep)
+        self.losses = 0.0  # kWh - energy lost on the lines so far
+
+    def candidate_pairs(self, is_buyer: np.ndarray, is_seller: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Seller/buyer pairs within feeder.hops lines of each other
+
+        Args:
+            is_buyer: Buyer flag per node
+            is_seller: Seller flag per node
+
+        Returns:
+            Tuple (seller nodes, buyer nodes, loss factor), one entry per pair
+        """
+        sellers = np.flatnonzero(is_seller)
+        neighbours = self.feeder.loss_factor[sellers].tocoo()
+        pairs = is_buyer[neighbours.col]
+        return sellers[neighbours.row[pairs]], neighbours.col[pairs], neighbours.data[pairs]
+
+    def match(self, desired: np.ndarray, bid_price: np.ndarray, ask_price: np.ndarray,
+              seller_nodes: np.ndarray, buyer_nodes: np.ndarray, loss: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """
+        Greedy capacity- and loss-aware matching of candidate pairs
+
+        Args:
+            desired: Desired quantity per node in kWh
+            bid_price: Bid price per node in €/kWh
+            ask_price: Ask price per node in €/kWh
+            seller_nodes: Seller per candidate pair
+            buyer_nodes: Buyer per candidate pair
+            loss: Loss factor per candidate pair
+
+        Returns:
+            Tuple of fill arrays (buyer nodes, seller nodes, kWh sent, kWh received, loss factor)
+        """
+        surplus = bid_price[buyer_nodes] * (1 - loss) - ask_price[seller_nodes]  # € per kWh sent
+        feasible = np.flatnonzero(surplus >= 0)
+        feasible = feasible[np.argsort(-surplus[feasible], kind='stable')]
+        lines, direction = self.feeder.paths(seller_nodes[feasible], buyer_nodes[feasible])
+
+        remaining = desired.tolist()
+        flow = [0.0] * self.feeder.num_nodes
+        capacity = self.feeder.line_capacity.tolist()
+        fills = []
+        for pair, path, signs in zip(feasible.tolist(), lines.tolist(), direction.tolist()):
+            seller, buyer, delivery = int(seller_nodes[pair]), int(buyer_nodes[pair]), 1.0 - float(loss[pair])
+            quantity = min(remaining[seller], remaining[buyer] / delivery)
+            for line, sign in zip(path, signs):
+                if line >= 0:  # headroom of the line in the flow direction
+                    quantity = min(quantity, capacity[line] - sign * flow[line])
+            if quantity < self.min_quantity:
+                continue
+            for line, sign in zip(path, signs):
+                if line >= 0:
+                    flow[line] += sign * quantity
+            remaining[seller] -= quantity
+            remaining[buyer] = max(0.0, remaining[buyer] - quantity * delivery)
+            fills.append((buyer, seller, quantity, quantity * delivery, 1.0 - delivery))
+
+        self.line_flow = np.array(flow)
+        if not fills:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), np.zeros(0)
+        buyers, sellers, sent, received, loss = (np.array(column) for column in zip(*fills))
+        return buyers.astype(np.int64), sellers.astype(np.int64), sent, received, loss
+
+    def execute_p2p_trading(self, prosumers: List[Prosumer], timestep: int) -> TradeBatch:
+        """
+        Match buyers and sellers within reach on the feeder
+
+        Args:
+            prosumers: List of prosumers (index = prosumer ID = feeder node)
+            timestep: Current timestep
+
+        Returns:
+            TradeBatch of executed P2P trades (quantity = kWh received by the buyer,
+            price = € per kWh received)
+        """
+        population = population_of(prosumers)
+        if population is not None:
+            is_buyer, is_seller = population.active_buyers, population.active_sellers
+            desired, bid_price, ask_price = population.desired_quantity, population.bid_price, population.ask_price
+        else:
+            is_buyer = np.array([p.is_buyer and not p.is_banned for p in prosumers], dtype=bool)
+            is_seller = np.array([p.is_seller and not p.is_banned for p in prosumers], dtype=bool)
+            desired = np.array([p.desired_quantity for p in prosumers], dtype=np.float64)
+            bid_price = np.array([p.bid_price for p in prosumers], dtype=np.float64)
+            ask_price = np.array([p.ask_price for p in prosumers], dtype=np.float64)
+
+        seller_nodes, buyer_nodes, loss = self.candidate_pairs(is_buyer & (desired >= self.min_quantity),
+                                                               is_seller & (desired >= self.min_quantity))
+        buyer_ids, seller_ids, sent, received, loss = self.match(desired, bid_price, ask_price,
+                                                                seller_nodes, buyer_nodes, loss)
+        self.losses += float((sent - received).sum())
+        if len(sent) == 0:
+            return TradeBatch()
+
+        price = (bid_price[buyer_ids] + ask_price[seller_ids] / (1 - loss)) / 2  # € per kWh received
+        seller_price = price * (1 - loss)  # € per kWh sent (same amount of money)
+        if population is not None:
+            nobody = np.full(len(sent), -1)
+            population.accept_trades(buyer_ids, nobody, received, price, is_p2p=True)
+            population.accept_trades(nobody, seller_ids, sent, seller_price, is_p2p=True)
+        else:
+            for buyer_id, seller_id, amount_sent, amount_received, buyer_price, sell_price in zip(
+                    buyer_ids.tolist(), seller_ids.tolist(), sent.tolist(), received.tolist(),
+                    price.tolist(), seller_price.tolist()):
+                prosumers[buyer_id].accept_trade(amount_received, buyer_price, is_buyer_role=True, is_p2p=True)
+                prosumers[seller_id].accept_trade(amount_sent, sell_price, is_buyer_role=False, is_p2p=True)
+
+        return TradeBatch.from_arrays(buyer_ids, seller_ids, received, price, 'p2p', timestep)
+
+    def __repr__(self):
+        return f"NetworkMatcher(feeder={self.feeder}, losses={self.losses:.2f}kWh)"
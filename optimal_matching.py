@@ -0,0 +1,181 @@
+"""
+Optimal P2P allocation as a sparse linear program
+"""
+import numpy as np
+from scipy.optimize import linprog
+from scipy.sparse import csr_matrix
+from typing import List, Tuple
+from prosumer import Prosumer
+from population import population_of
+from trade_batch import TradeBatch
+
+
+def candidate_edges(bid_price: np.ndarray, ask_price: np.ndarray, edges_per_buyer: int,
+                    seed_edges: Tuple[np.ndarray, np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Buyer/seller pairs that may trade (bid price at least the ask price)
+
+    All feasible pairs are used while there are at most edges_per_buyer
+    per buyer on average. Above that, every buyer is connected to
+    edges_per_buyer sellers spread evenly over its feasible sellers (sorted
+    by ask price), so the LP size stays linear in the number of offers. Seed edges (e.g. the previous
+    solution) are always included if still feasible.
+
+    Args:
+        bid_price: Bid price per buyer in €/kWh
+        ask_price: Ask price per seller in €/kWh
+        edges_per_buyer: Edge budget of the LP per buyer
+        seed_edges: Tuple (buyer indices, seller indices) of extra edges
+
+    Returns:
+        Tuple (buyer indices, seller indices), one entry per edge
+    """
+    ask_order = np.argsort(ask_price, kind='stable')
+    feasible = np.searchsorted(ask_price[ask_order], bid_price, side='right')  # feasible sellers per buyer (a prefix)
+    total = int(feasible.sum())
+
+    if total <= edges_per_buyer * len(bid_price):
+        buyers = np.repeat(np.arange(len(bid_price)), feasible)
+        ranks = np.arange(total) - np.repeat(np.cumsum(feasible) - feasible, feasible)
+    else:
+        counts = np.minimum(feasible, edges_per_buyer)
+        buyers = np.repeat(np.arange(len(bid_price)), counts)
+        step = np.arange(len(buyers)) - np.repeat(np.cumsum(counts) - counts, counts)
+        ranks = (step * feasible[buyers]) // np.maximum(counts[buyers], 1)  # evenly spread over the prefix
+    sellers = ask_order[ranks]
+
+    if seed_edges is not None and len(seed_edges[0]):
+        seed_buyers, seed_sellers = seed_edges
+        still_feasible = bid_price[seed_buyers] >= ask_price[seed_sellers]
+        buyers = np.concatenate((buyers, seed_buyers[still_feasible]))
+        sellers = np.concatenate((sellers, seed_sellers[still_feasible]))
+        pairs = np.unique(np.stack((buyers, sellers)), axis=1)
+        buyers, sellers = pairs[0], pairs[1]
+    return buyers, sellers
+
+
+class OptimalAllocator:
+    """
+    P2P matching engine solving the allocation as a linear program
+    (drop-in for P2PTradingMechanism.execute_p2p_trading)
+
+    Variables are the quantities traded on candidate buyer/seller edges,
+    constrained by every offer's desired quantity (already capped by
+    MAX_TRADE_CAP). The objective maximizes either the P2P volume (ties
+    broken by welfare) or the welfare sum of (bid - ask) * quantity.
+    Trades are priced at the bid/ask midpoint.
+
+    Consecutive timesteps have similar books, so the edges of the previous
+    solution are carried over into the next candidate set (warm start).
+    """
+
+    def __init__(self, objective: str = "volume", edges_per_buyer: int = 8, min_quantity: float = 0.001):
+        """
+        Initialize the allocator
+
+        Args:
+            objective: 'volume' (maximize traded kWh) or 'welfare' (maximize trade surplus)
+            edges_per_buyer: Candidate sellers per buyer (bounds the solve time for large communities)
+            min_quantity: Smallest quantity in kWh worth trading
+        """
+        if objective not in ("volume", "welfare"):
+            raise ValueError(f"Unknown P2P objective: {objective}")
+        self.objective = objective
+        self.edges_per_buyer = edges_per_buyer
+        self.min_quantity = min_quantity
+        self.previous_pairs = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))  # prosumer IDs of the last solution
+        self.last_status = None  # linprog status of the last solve
+
+    def solve(self, bid_price: np.ndarray, bid_quantity: np.ndarray, ask_price: np.ndarray,
+              ask_quantity: np.ndarray, seed_edges=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Solve the allocation LP
+
+        Args:
+            bid_price: Bid price per buyer in €/kWh
+            bid_quantity: Desired quantity per buyer in kWh
+            ask_price: Ask price per seller in €/kWh
+            ask_quantity: Desired quantity per seller in kWh
+            seed_edges: Tuple (buyer indices, seller indices) of edges to include
+
+        Returns:
+            Tuple (buyer indices, seller indices, quantity) of the edges carrying energy
+        """
+        buyers, sellers = candidate_edges(bid_price, ask_price, self.edges_per_buyer, seed_edges)
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+        if len(buyers) == 0:
+            return empty
+
+        surplus = bid_price[buyers] - ask_price[sellers]
+        if self.objective == "volume":  # every kWh counts the same, welfare only breaks ties
+            cost = -(1.0 + 1e-3 * surplus / max(float(surplus.max()), 1e-12))
+        else:
+            cost = -surplus
+
+        num_bids, num_edges = len(bid_price), len(buyers)
+        constraints = csr_matrix(
+            (np.ones(2 * num_edges), (np.concatenate((buyers, num_bids + sellers)), np.tile(np.arange(num_edges), 2))),
+            shape=(num_bids + len(ask_price), num_edges))
+        result = linprog(cost, A_ub=constraints, b_ub=np.concatenate((bid_quantity, ask_quantity)),
+                         bounds=(0, None), method="highs")
+        self.last_status = result.status
+        if result.status != 0:
+            return empty
+
+        used = result.x >= self.min_quantity
+        return buyers[used], sellers[used], result.x[used]
+
+    def execute_p2p_trading(self, prosumers: List[Prosumer], timestep: int) -> TradeBatch:
+        """
+        Allocate P2P trades optimally among active buyers and sellers
+
+        Args:
+            prosumers: List of prosumers (index = prosumer ID)
+            timestep: Current timestep
+
+        Returns:
+            TradeBatch of executed P2P trades
+        """
+        population = population_of(prosumers)
+        if population is not None:
+            ids, is_buyer, is_seller = population.id, population.active_buyers, population.active_sellers
+            desired, bid_price, ask_price = population.desired_quantity, population.bid_price, population.ask_price
+        else:
+            ids = np.array([p.id for p in prosumers], dtype=np.int64)
+            is_buyer = np.array([p.is_buyer and not p.is_banned for p in prosumers], dtype=bool)
+            is_seller = np.array([p.is_seller and not p.is_banned for p in prosumers], dtype=bool)
+            desired = np.array([p.desired_quantity for p in prosumers], dtype=np.float64)
+            bid_price = np.array([p.bid_price for p in prosumers], dtype=np.float64)
+            ask_price = np.array([p.ask_price for p in prosumers], dtype=np.float64)
+
+        bid_ids = ids[is_buyer & (desired >= self.min_quantity)]
+        ask_ids = ids[is_seller & (desired >= self.min_quantity)]
+
+        # Warm start: previous trading pairs whose prosumers are on the same sides again
+        bid_position = np.full(len(ids), -1)
+        ask_position = np.full(len(ids), -1)
+        bid_position[bid_ids] = np.arange(len(bid_ids))
+        ask_position[ask_ids] = np.arange(len(ask_ids))
+        seed_buyers, seed_sellers = bid_position[self.previous_pairs[0]], ask_position[self.previous_pairs[1]]
+        keep = (seed_buyers >= 0) & (seed_sellers >= 0)
+
+        buyers, sellers, quantity = self.solve(bid_price[bid_ids], desired[bid_ids], ask_price[ask_ids],
+                                               desired[ask_ids], (seed_buyers[keep], seed_sellers[keep]))
+        buyer_ids, seller_ids = bid_ids[buyers], ask_ids[sellers]
+        self.previous_pairs = (buyer_ids, seller_ids)
+        if len(quantity) == 0:
+            return TradeBatch()
+
+        price = (bid_price[buyer_ids] + ask_price[seller_ids]) / 2  # midpoint price per trade
+        if population is not None:
+            population.accept_trades(buyer_ids, seller_ids, quantity, price, is_p2p=True)
+        else:
+            for buyer_id, seller_id, amount, fill in zip(buyer_ids.tolist(), seller_ids.tolist(),
+                                                         quantity.tolist(), price.tolist()):
+                prosumers[buyer_id].accept_trade(amount, fill, is_buyer_role=True, is_p2p=True)
+                prosumers[seller_id].accept_trade(amount, fill, is_buyer_role=False, is_p2p=True)
+
+        return TradeBatch.from_arrays(buyer_ids, seller_ids, quantity, price, 'p2p', timestep)
+
+    def __repr__(self):
+        return f"OptimalAllocator(objective={self.objective}, edges_per_buyer={self.edges_per_buyer})"
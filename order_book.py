@@ -0,0 +1,509 @@
+"""
+Price-time priority order book for P2P matching
+"""
+import heapq
+import numpy as np
+from typing import List, Optional, Tuple
+from prosumer import Prosumer
+from population import population_of
+from trade_batch import TradeBatch
+
+
+class OrderBook:
+    """
+    Limit order book with heap-based bid and ask sides
+
+    Bids are ordered by highest price, asks by lowest price, ties broken by
+    arrival order. Orders are filled partially until their quantity is used
+    up. Each side holds at most one order per owner; cancelled and replaced
+    orders are removed lazily (stale heap entries are skipped when they
+    reach the top), so insert, modify and cancel all cost O(log n).
+
+    Two ways of matching are supported:
+    - match(): call auction over the whole book, each fill priced at the
+      midpoint of the bid and ask prices; clearing B bids against S asks
+      costs O((B + S) log n) instead of scanning buyer/seller pairs;
+    - submit(): continuous trading, the incoming order immediately trades
+      against resting orders at their prices and only the rest is booked.
+    """
+
+    SIDES = ('bid', 'ask')
+
+    def __init__(self, min_quantity: float = 0.001):
+        """
+        Initialize an empty book
+
+        Args:
+            min_quantity: Remaining quantity in kWh below which an order counts as filled
+        """
+        self.min_quantity = min_quantity
+        self.heaps = {'bid': [], 'ask': []}  # heaps of (-price, arrival, owner) for bids, (price, arrival, owner) for asks
+        self.orders = {}  # (side, owner) -> [price, remaining quantity, arrival] of live orders
+        self._arrival = 0  # arrival counter for time priority
+
+    def _push(self, side: str, owner: int, price: float, quantity: float):
+        """Book an order (replacing any live order of the owner on that side)"""
+        key = -price if side == 'bid' else price
+        heapq.heappush(self.heaps[side], (key, self._arrival, owner))
+        self.orders[(side, owner)] = [price, quantity, self._arrival]
+        self._arrival += 1
+        if len(self.heaps[side]) > 2 * len(self.orders) + 64:  # mostly stale entries, rebuild the heap
+            self._compact(side)
+
+    def _compact(self, side: str):
+        """Drop stale entries of one side"""
+        self.heaps[side] = [entry for entry in self.heaps[side]
+                            if self.orders.get((side, entry[2]), (None, None, None))[2] == entry[1]]
+        heapq.heapify(self.heaps[side])
+
+    def best(self, side: str) -> Optional[Tuple[int, float, float]]:
+        """
+        Get the best live order of one side
+
+        Args:
+            side: 'bid' or 'ask'
+
+        Returns:
+            Tuple (owner, price, remaining quantity), or None if the side is empty
+        """
+        heap = self.heaps[side]
+        while heap:
+            _, arrival, owner = heap[0]
+            order = self.orders.get((side, owner))
+            if order is not None and order[2] == arrival:
+                return owner, order[0], order[1]
+            heapq.heappop(heap)   # cancelled or replaced
+        return None
+
+    def _fill(self, side: str, owner: int, quantity: float):
+        """Reduce a live order, removing it once filled"""
+        order = self.orders[(side, owner)]
+        order[1] -= quantity
+        if order[1] < self.min_quantity:
+            del self.orders[(side, owner)]
+
+    def add_bid(self, order_id: int, price: float, quantity: float):
+        """
+        Add a buy order without matching
+
+        Args:
+            order_id: Order ID (the buying prosumer's ID)
+            price: Bid price in €/kWh
+            quantity: Quantity in kWh
+        """
+        self._push('bid', order_id, price, quantity)
+
+    def add_ask(self, order_id: int, price: float, quantity: float):
+        """
+        Add a sell order without matching
+
+        Args:
+            order_id: Order ID (the selling prosumer's ID)
+            price: Ask price in €/kWh
+            quantity: Quantity in kWh
+        """
+        self._push('ask', order_id, price, quantity)
+
+    def match(self) -> List[Tuple[int, int, float, float]]:
+        """
+        Match crossing orders in price-time priority (call auction)
+
+        Returns:
+            List of fills (buyer_id, seller_id, quantity, price)
+        """
+        fills = []
+        while True:
+            bid, ask = self.best('bid'), self.best('ask')
+            if bid is None or ask is None or bid[1] < ask[1]:
+                return fills
+            quantity = min(bid[2], ask[2])
+            fills.append((bid[0], ask[0], quantity, (bid[1] + ask[1]) / 2))  # midpoint price
+            self._fill('bid', bid[0], quantity)
+            self._fill('ask', ask[0], quantity)
+
+    def submit(self, side: str, order_id: int, price: float, quantity: float) -> List[Tuple[int, int, float, float]]:
+        """
+        Insert an order and match it immediately (continuous trading)
+
+        Any live order of the same owner on that side is replaced. The
+        incoming order trades against crossing resting orders at their
+        prices; the rest of it is booked.
+
+        Args:
+            side: 'bid' or 'ask'
+            order_id: Order ID (the prosumer's ID)
+            price: Limit price in €/kWh
+            quantity: Quantity in kWh
+
+        Returns:
+            List of fills (buyer_id, seller_id, quantity, price)
+        """
+        self.cancel(side, order_id)
+        other = 'ask' if side == 'bid' else 'bid'
+        fills = []
+        while quantity >= self.min_quantity:
+            resting = self.best(other)
+            if resting is None or (price < resting[1] if side == 'bid' else price > resting[1]):
+                break
+            traded = min(quantity, resting[2])
+            buyer_id, seller_id = (order_id, resting[0]) if side == 'bid' else (resting[0], order_id)
+            fills.append((buyer_id, seller_id, traded, resting[1]))  # resting order sets the price
+            self._fill(other, resting[0], traded)
+            quantity -= traded
+        if quantity >= self.min_quantity:
+            self._push(side, order_id, price, quantity)
+        return fills
+
+    def modify(self, side: str, order_id: int, price: float, quantity: float) -> List[Tuple[int, int, float, float]]:
+        """
+        Change the price or quantity of an order
+
+        Reducing the quantity at an unchanged price keeps time priority;
+        any other change re-submits the order (which may then trade).
+
+        Args:
+            side: 'bid' or 'ask'
+            order_id: Order ID (the prosumer's ID)
+            price: New limit price in €/kWh
+            quantity: New quantity in kWh
+
+        Returns:
+            List of fills (buyer_id, seller_id, quantity, price)
+        """
+        order = self.orders.get((side, order_id))
+        if order is not None and price == order[0] and quantity <= order[1]:
+            if quantity < self.min_quantity:
+                self.cancel(side, order_id)
+            else:
+                order[1] = quantity
+            return []
+        return self.submit(side, order_id, price, quantity)
+
+    def refresh(self, side: str, order_id: int, quantity: float) -> bool:
+        """
+        Set the remaining quantity of a live order in place, keeping its
+        price and time priority (a standing order topped up or trimmed)
+
+        Only the quantity changes, so the order still does not cross the
+        other side and nothing trades.
+
+        Args:
+            side: 'bid' or 'ask'
+            order_id: Order ID (the prosumer's ID)
+            quantity: New quantity in kWh (below min_quantity cancels the order)
+
+        Returns:
+            True if the order is still live
+        """
+        order = self.orders.get((side, order_id))
+        if order is None:
+            return False
+        if quantity < self.min_quantity:
+            self.cancel(side, order_id)
+            return False
+        order[1] = quantity
+        return True
+
+    def cancel(self, side: str, order_id: int) -> bool:
+        """
+        Cancel a live order
+
+        Args:
+            side: 'bid' or 'ask'
+            order_id: Order ID (the prosumer's ID)
+
+        Returns:
+            True if an order was cancelled
+        """
+        return self.orders.pop((side, order_id), None) is not None
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def __repr__(self):
+        bids = sum(1 for side, _ in self.orders if side == 'bid')
+        return f"OrderBook(bids={bids}, asks={len(self.orders) - bids})"
+
+
+class OrderBookMatcher:
+    """
+    P2P matching engine backed by an OrderBook (drop-in for
+    P2PTradingMechanism.execute_p2p_trading)
+    """
+
+    def __init__(self, min_quantity: float = 0.001):
+        """
+        Initialize the matcher
+
+        Args:
+            min_quantity: Smallest quantity in kWh worth trading
+        """
+        self.min_quantity = min_quantity
+
+    def execute_p2p_trading(self, prosumers: List[Prosumer], timestep: int) -> TradeBatch:
+        """
+        Match active buyers and sellers through a fresh order book
+
+        Orders arrive in prosumer order; every fill is settled on both
+        prosumers with accept_trade.
+
+        Args:
+            prosumers: List of prosumers (index = prosumer ID)
+            timestep: Current timestep
+
+        Returns:
+            TradeBatch of executed P2P trades
+        """
+        book = OrderBook(self.min_quantity)
+        for prosumer in prosumers:
+            if prosumer.is_banned or prosumer.desired_quantity < self.min_quantity:
+                continue
+            if prosumer.is_buyer:
+                book.add_bid(prosumer.id, prosumer.bid_price, prosumer.desired_quantity)
+            elif prosumer.is_seller:
+                book.add_ask(prosumer.id, prosumer.ask_price, prosumer.desired_quantity)
+
+        fills = book.match()
+        for buyer_id, seller_id, quantity, price in fills:
+            prosumers[buyer_id].accept_trade(quantity, price, is_buyer_role=True, is_p2p=True)
+            prosumers[seller_id].accept_trade(quantity, price, is_buyer_role=False, is_p2p=True)
+        if not fills:
+            return TradeBatch()
+        buyer_ids, seller_ids, quantity, price = zip(*fills)
+        return TradeBatch.from_arrays(buyer_ids, seller_ids, quantity, price, 'p2p', timestep)
+
+    def __repr__(self):
+        return f"OrderBookMatcher(min_quantity={self.min_quantity})"
+
+
+class ContinuousDoubleAuction:
+    """
+    Continuous P2P trading on an order book kept across timesteps (drop-in
+    for P2PTradingMechanism.execute_p2p_trading)
+
+    Each call compares the current offers with the orders resting in the
+    book (one vectorized pass) and only sends the differences to the book:
+    new offers are submitted and trade immediately, changed offers are
+    re-submitted and withdrawn offers are cancelled. Offers on the same side
+    whose price moved by at most price_tolerance keep resting at their price
+    and time priority, only their quantity is refreshed, so a market
+    re-priced by the step-to-step noise does not rebuild the book. Within a
+    timestep, single orders can be inserted, modified and cancelled with
+    insert_order, modify_order and cancel_order (intraday sub-steps).
+    """
+
+    NONE, BID, ASK = 0, 1, 2   # side codes of the posted orders
+
+    def __init__(self, min_quantity: float = 0.001, price_tolerance: float = 0.01):
+        """
+        Initialize the market
+
+        Args:
+            min_quantity: Smallest quantity in kWh worth trading
+            price_tolerance: Price changes in €/kWh up to this value keep the resting order price
+        """
+        self.min_quantity = min_quantity
+        self.price_tolerance = price_tolerance
+        self.book = OrderBook(min_quantity)
+        self.posted_side = np.zeros(0, dtype=np.int8)  # side of the resting order per prosumer
+        self.posted_price = np.zeros(0)  # €/kWh - price of the resting order per prosumer
+        self.posted_quantity = np.zeros(0)  # kWh - remaining quantity of the resting order per prosumer
+        self.book_updates = 0  # number of insert/modify/cancel operations sent to the book
+        self.orders_kept = 0  # number of resting orders carried into a new timestep in place
+
+    def _resize(self, size: int):
+        """Start from an empty book when the community size changed"""
+        if len(self.posted_side) != size:
+            self.book = OrderBook(self.min_quantity)
+            self.posted_side = np.zeros(size, dtype=np.int8)
+            self.posted_price = np.zeros(size)
+            self.posted_quantity = np.zeros(size)
+
+    def _read_back(self, indices):
+        """Refresh the posted quantities of some prosumers from the book (filled orders have left it)"""
+        for index in indices:
+            side = int(self.posted_side[index])
+            order = self.book.orders.get((OrderBook.SIDES[side - 1], index)) if side != self.NONE else None
+            self.posted_quantity[index] = order[1] if order is not None else 0.0
+            if order is None:
+                self.posted_side[index] = self.NONE
+
+    def _settle(self, prosumers: List[Prosumer], fills: list, timestep: int) -> TradeBatch:
+        """
+        Settle fills on both counterparties
+
+        Args:
+            prosumers: List of prosumers (index = prosumer ID)
+            fills: List of fills (buyer_id, seller_id, quantity, price)
+            timestep: Current timestep
+
+        Returns:
+            TradeBatch of the fills
+        """
+        if not fills:
+            return TradeBatch()
+        buyer_ids, seller_ids, quantity, fill_price = (np.array(column) for column in zip(*fills))
+        buyer_ids, seller_ids = buyer_ids.astype(np.int64), seller_ids.astype(np.int64)
+        self._read_back(np.unique(np.concatenate((buyer_ids, seller_ids))).tolist())
+
+        population = population_of(prosumers)
+        if population is not None:
+            population.accept_trades(buyer_ids, seller_ids, quantity, fill_price, is_p2p=True)
+        else:
+            for buyer_id, seller_id, amount, fill in zip(buyer_ids.tolist(), seller_ids.tolist(),
+                                                         quantity.tolist(), fill_price.tolist()):
+                prosumers[buyer_id].accept_trade(amount, fill, is_buyer_role=True, is_p2p=True)
+                prosumers[seller_id].accept_trade(amount, fill, is_buyer_role=False, is_p2p=True)
+        return TradeBatch.from_arrays(buyer_ids, seller_ids, quantity, fill_price, 'p2p', timestep)
+
+    def insert_order(self, prosumers: List[Prosumer], prosumer_id: int, side: str, price: float,
+                     quantity: float, timestep: int) -> TradeBatch:
+        """
+        Insert one order and match it immediately (intraday sub-step)
+
+        Any resting order of the prosumer is replaced. The next
+        execute_p2p_trading call reconciles the book with the offers again.
+
+        Args:
+            prosumers: List of prosumers (index = prosumer ID)
+            prosumer_id: ID of the prosumer placing the order
+            side: 'bid' or 'ask'
+            price: Limit price in €/kWh
+            quantity: Quantity in kWh
+            timestep: Current timestep
+
+        Returns:
+            TradeBatch of the trades the order made
+        """
+        self._resize(len(prosumers))
+        self.cancel_order(prosumer_id)
+        fills = self.book.submit(side, prosumer_id, price, quantity)
+        self.posted_side[prosumer_id] = self.BID if side == 'bid' else self.ASK
+        self.posted_price[prosumer_id] = price
+        self.posted_quantity[prosumer_id] = quantity
+        self.book_updates += 1
+        self._read_back([prosumer_id])
+        return self._settle(prosumers, fills, timestep)
+
+    def modify_order(self, prosumers: List[Prosumer], prosumer_id: int, price: float, quantity: float,
+                     timestep: int) -> TradeBatch:
+        """
+        Change the price or quantity of a resting order (intraday sub-step)
+
+        Reducing the quantity at an unchanged price keeps time priority; any
+        other change re-submits the order, which may then trade.
+
+        Args:
+            prosumers: List of prosumers (index = prosumer ID)
+            prosumer_id: ID of the prosumer owning the order
+            price: New limit price in €/kWh
+            quantity: New quantity in kWh
+            timestep: Current timestep
+
+        Returns:
+            TradeBatch of the trades the modified order made
+        """
+        self._resize(len(prosumers))
+        side = int(self.posted_side[prosumer_id])
+        if side == self.NONE:
+            raise KeyError(f"Prosumer {prosumer_id} has no resting order")
+        fills = self.book.modify(OrderBook.SIDES[side - 1], prosumer_id, price, quantity)
+        self.posted_price[prosumer_id] = price
+        self.posted_quantity[prosumer_id] = quantity
+        self.book_updates += 1
+        self._read_back([prosumer_id])
+        return self._settle(prosumers, fills, timestep)
+
+    def cancel_order(self, prosumer_id: int) -> bool:
+        """
+        Withdraw the resting order of a prosumer (intraday sub-step)
+
+        Args:
+            prosumer_id: ID of the prosumer owning the order
+
+        Returns:
+            True if an order was cancelled
+        """
+        if prosumer_id >= len(self.posted_side) or self.posted_side[prosumer_id] == self.NONE:
+            return False
+        self.book.cancel(OrderBook.SIDES[self.posted_side[prosumer_id] - 1], prosumer_id)
+        self.posted_side[prosumer_id] = self.NONE
+        self.posted_quantity[prosumer_id] = 0.0
+        self.book_updates += 1
+        return True
+
+    def execute_p2p_trading(self, prosumers: List[Prosumer], timestep: int) -> TradeBatch:
+        """
+        Update the book with the offers of this timestep, trading on every insert
+
+        All resting orders are first reconciled with their owners' current
+        offers (kept with the current quantity, or cancelled), so no order
+        settled since it was posted can trade; the new and changed offers are then
+        submitted in prosumer order.
+
+        Args:
+            prosumers: List of prosumers (index = prosumer ID)
+            timestep: Current timestep
+
+        Returns:
+            TradeBatch of executed P2P trades
+        """
+        population = population_of(prosumers)
+        if population is not None:
+            is_buyer, is_seller = population.active_buyers, population.active_sellers
+            desired, bid_price, ask_price = population.desired_quantity, population.bid_price, population.ask_price
+        else:
+            is_buyer = np.array([p.is_buyer and not p.is_banned for p in prosumers], dtype=bool)
+            is_seller = np.array([p.is_seller and not p.is_banned for p in prosumers], dtype=bool)
+            desired = np.array([p.desired_quantity for p in prosumers], dtype=np.float64)
+            bid_price = np.array([p.bid_price for p in prosumers], dtype=np.float64)
+            ask_price = np.array([p.ask_price for p in prosumers], dtype=np.float64)
+        self._resize(len(desired))
+
+        # Diff the offers against the resting orders
+        trading = desired >= self.min_quantity
+        side = np.where(trading & is_buyer, self.BID, np.where(trading & is_seller, self.ASK, self.NONE)).astype(np.int8)
+        price = np.where(side == self.BID, bid_price, ask_price)
+        same_price = np.abs(price - self.posted_price) <= self.price_tolerance
+        changed = ((side != self.posted_side)
+                   | ((side != self.NONE) & (~same_price | (desired != self.posted_quantity))))
+
+        # Pass 1: reconcile every resting order with its owner's current offer before anything trades
+        # (orders left from earlier timesteps may since have been settled, e.g. by the local market)
+        for index in np.flatnonzero(changed & (self.posted_side != self.NONE)).tolist():
+            old_side, new_side = int(self.posted_side[index]), int(side[index])
+            order_side = OrderBook.SIDES[old_side - 1]
+            if old_side == new_side and same_price[index]:
+                self.book.refresh(order_side, index, float(desired[index]))  # keeps price and time priority
+                self.posted_quantity[index] = desired[index]
+                self.orders_kept += 1
+            else:
+                self.book.cancel(order_side, index)  # re-submitted in pass 2 if still trading
+                self.posted_side[index] = self.NONE
+                self.posted_quantity[index] = 0.0
+                self.book_updates += 1
+
+        # Pass 2: submit the new and changed offers in prosumer order, trading on every insert
+        fills = []
+        filled = np.zeros(len(desired))  # kWh - traded this call per prosumer
+        for index in np.flatnonzero(changed).tolist():
+            if self.posted_side[index] != self.NONE:  # kept in pass 1 (already at the current quantity)
+                continue
+            new_side, quantity = int(side[index]), float(desired[index] - filled[index])
+            if new_side != self.NONE and quantity >= self.min_quantity:
+                order_price = float(price[index])
+                new_fills = self.book.submit(OrderBook.SIDES[new_side - 1], index, order_price, quantity)
+                for buyer_id, seller_id, amount, _ in new_fills:
+                    filled[buyer_id] += amount
+                    filled[seller_id] += amount
+                fills.extend(new_fills)
+                self.posted_side[index] = new_side
+                self.posted_price[index] = order_price
+                self.posted_quantity[index] = quantity
+                self.book_updates += 1
+
+        self._read_back(np.flatnonzero(changed).tolist())  # orders shrunk below min_quantity have left the book
+        return self._settle(prosumers, fills, timestep)
+
+    def __repr__(self):
+        return f"ContinuousDoubleAuction(book={self.book}, updates={self.book_updates}, kept={self.orders_kept})"
@@ -0,0 +1,463 @@
+"""
+Struct-of-arrays storage for the whole prosumer community
+"""
+import random
+import numpy as np
+from typing import Iterator, List, Optional
+from prosumer import Prosumer
+from kernels import dispatch_batteries, price_offers, price_battery_offers
+import config
+
+
+# Prosumer attributes stored as one NumPy array each (attribute name -> dtype)
+FIELD_DTYPES = {
+    'id': np.int64,   # unique prosumer ID (equal to the index in the population)
+    'home_type_index': np.int64,   # home configuration index
+    'pv_capacity': np.float64,   # kW - PV panel capacity
+    'base_consumption': np.float64,   # kWh - base consumption per time step
+    'has_battery': np.bool_,   # whether prosumer has a battery
+    'battery_capacity': np.float64,   # kWh - battery capacity (if any)
+    'pv_generation': np.float64,   # kWh - current PV generation
+    'consumption': np.float64,   # kWh - current energy consumption
+    'imbalance': np.float64,   # kWh (positive = surplus, negative = deficit)
+    'battery_level': np.float64,   # kWh - current battery level
+    'is_buyer': np.bool_,   # buyer in current timestep
+    'is_seller': np.bool_,   # seller in current timestep
+    'desired_quantity': np.float64,   # kWh - desired trading quantity
+    'bid_price': np.float64,   # €/kWh - bid price if buying
+    'ask_price': np.float64,   # €/kWh - ask price if selling
+    'selling_from_battery': np.bool_,   # whether selling energy is from battery
+    'balance': np.float64,   # € - current financial balance
+    'renewable_usage': np.float64,   # kWh - total renewable energy used
+    'p2p_trades': np.int64,   # number of P2P trades participated in
+    'market_trades': np.int64,   # number of local market trades participated in
+    'market_quantity': np.float64,   # kWh - total quantity traded on local market
+    'is_banned': np.bool_,   # whether prosumer is banned from trading
+    'ban_duration': np.int64,   # remaining ban duration in timesteps
+    'reason_for_ban': object,   # reason for current ban
+    'total_profit': np.float64,   # € - total profit accumulated
+    'penalties': np.float64,   # € - total penalties incurred
+    'bonus': np.float64,   # € - total bonuses received
+    'battery_charged_kwh': np.float64,   # energy charged into battery this timestep
+    'battery_discharged_kwh': np.float64,   # energy discharged from battery this timestep
+}
+
+
+class ProsumerPopulation:
+    """
+    Holds every prosumer attribute of the community as a NumPy array
+    (one entry per prosumer), so that simulation phases can operate on the
+    whole community at once instead of one Prosumer object at a time
+    """
+
+    def __init__(self, pv_capacity, base_consumption, battery_capacity, home_type_index=None):
+        """
+        Initialize the population
+
+        Args:
+            pv_capacity: PV panel capacities in kW (one per prosumer)
+            base_consumption: Base consumption levels in kWh per time step
+            battery_capacity: Battery capacities in kWh (0 means no battery)
+            home_type_index: Indices of the home configuration types
+        """
+        size = len(pv_capacity)
+        for name, dtype in FIELD_DTYPES.items():   # allocate one array per prosumer attribute
+            setattr(self, name, np.zeros(size, dtype=dtype))
+
+        self.id[:] = np.arange(size)
+        if home_type_index is not None:
+            self.home_type_index[:] = home_type_index
+        self.pv_capacity[:] = pv_capacity
+        self.base_consumption[:] = base_consumption
+        self.battery_capacity[:] = battery_capacity
+        self.has_battery[:] = self.battery_capacity > 0.0
+        self.battery_level[:] = np.where(self.has_battery, self.battery_capacity / 2, 0.0)  # half capacity if battery exists
+        self.reason_for_ban[:] = ""
+
+        self.streams = None  # RNGRegistry providing per-prosumer generators to the views (None = random module)
+        self.ledger = None  # CommunityLedger kept up to date with every offer change (None = not tracked)
+        self._views = None  # per-prosumer views, created on first use
+
+    @classmethod
+    def generate(cls, num_prosumers: int, rng: Optional[np.random.Generator] = None) -> 'ProsumerPopulation':
+        """
+        Create a population with random home types and battery ownership
+
+        Args:
+            num_prosumers: Number of prosumers in the community
+            rng: NumPy random generator (a fresh unseeded one if None)
+
+        Returns:
+            New ProsumerPopulation
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        home_index = rng.integers(0, len(config.PV_CAPACITY), size=num_prosumers)  # random home type per prosumer
+        has_battery = rng.random(num_prosumers) < config.HAS_BATTERY  # 80% chance of having battery
+        battery_capacity = np.where(has_battery, np.asarray(config.BATTERY_CAPACITY)[home_index], 0.0)  # consistent per home type
+
+        return cls(
+            pv_capacity=np.asarray(config.PV_CAPACITY)[home_index],
+            base_consumption=np.asarray(config.BASE_CONSUMPTION)[home_index],
+            battery_capacity=battery_capacity,
+            home_type_index=home_index
+        )
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def __getitem__(self, index: int) -> 'ProsumerView':
+        return self.views()[index]
+
+    def __iter__(self) -> Iterator['ProsumerView']:
+        return iter(self.views())
+
+    def views(self) -> List['ProsumerView']:
+        """
+        Get per-prosumer object views for code that still works with Prosumer objects
+
+        Returns:
+            List of ProsumerView, one per prosumer (index = prosumer ID)
+        """
+        if self._views is None:
+            self._views = [ProsumerView(self, i) for i in range(len(self))]
+        return self._views
+
+    @property
+    def active_buyers(self) -> np.ndarray:
+        """Mask of prosumers buying in the current timestep"""
+        return self.is_buyer & ~self.is_banned
+
+    @property
+    def active_sellers(self) -> np.ndarray:
+        """Mask of prosumers selling in the current timestep"""
+        return self.is_seller & ~self.is_banned
+
+    def get_battery_soc(self) -> np.ndarray:
+        """
+        Get battery state of charge for logging
+
+        Returns:
+            SoC in % (0 for prosumers without battery)
+        """
+        soc = np.zeros(len(self))
+        np.divide(self.battery_level, self.battery_capacity, out=soc, where=self.has_battery)
+        return soc * 100
+
+    def offer_state(self, indices):
+        """
+        Current offers of some prosumers, in the form taken by CommunityLedger.add/remove
+
+        Args:
+            indices: Prosumer IDs, mask or slice
+
+        Returns:
+            Tuple (ids, is_active_buyer, is_active_seller, desired_quantity)
+        """
+        banned = self.is_banned[indices]
+        return (self.id[indices], self.is_buyer[indices] & ~banned, self.is_seller[indices] & ~banned,
+                self.desired_quantity[indices].copy())
+
+    def _rebuild_ledger(self):
+        """Recompute the ledger from the arrays (after every offer changed at once)"""
+        if self.ledger is not None:
+            self.ledger.clear()
+            self.ledger.add(*self.offer_state(slice(None)))
+
+    def update_energy_state(self, pv_generation: np.ndarray, consumption: np.ndarray):
+        """
+        Update generation, consumption and battery state of every prosumer
+        (batched equivalent of Prosumer.update_energy_state)
+
+        Args:
+            pv_generation: PV generation in kWh (one per prosumer)
+            consumption: Energy consumption in kWh (one per prosumer)
+        """
+        result = dispatch_batteries(pv_generation, consumption, self.battery_level,
+                                    self.battery_capacity, self.has_battery)
+
+        self.pv_generation[:] = pv_generation
+        self.consumption[:] = consumption
+        self.battery_level[:] = result.battery_level
+        self.imbalance[:] = result.imbalance
+        self.battery_charged_kwh[:] = result.charged
+        self.battery_discharged_kwh[:] = result.discharged
+        self.renewable_usage += result.renewable_direct
+        self.renewable_usage += result.renewable_from_battery
+
+    def prepare_trading_offers(self, price_forecast: float, local_market_fee: float, max_trade_cap: float,
+                               rng: Optional[np.random.Generator] = None, noise: Optional[np.ndarray] = None):
+        """
+        Prepare trading offers of every prosumer in one pass
+        (batched equivalent of Prosumer.prepare_trading_offer)
+
+        Args:
+            price_forecast: Forecasted market price in €/kWh
+            local_market_fee: Fee for local market trading in €/kWh
+            max_trade_cap: Maximum trade quantity per prosumer per time step in kWh
+            rng: NumPy random generator for the price noise (required if noise is None)
+            noise: Uniform [0, 1) draws, one per prosumer
+        """
+        offers = price_offers(self.imbalance, self.is_banned, price_forecast,
+                              local_market_fee, max_trade_cap, rng, noise)
+
+        self.is_buyer[:] = offers.is_buyer
+        self.is_seller[:] = offers.is_seller
+        self.desired_quantity[:] = offers.desired_quantity
+        self.bid_price[offers.is_buyer] = offers.bid_price[offers.is_buyer]
+        self.ask_price[offers.is_seller] = offers.ask_price[offers.is_seller]
+        self._rebuild_ledger()
+
+    def becomes_seller(self, indices: np.ndarray, offered_quantity: np.ndarray, price_forecast: float,
+                       local_market_fee: float, max_trade_cap: float,
+                       rng: Optional[np.random.Generator] = None, noise: Optional[np.ndarray] = None):
+        """
+        Make the given prosumers sellers of energy from their battery
+        (batched equivalent of Prosumer.becomes_seller)
+
+        Args:
+            indices: Prosumer IDs recruited as battery sellers
+            offered_quantity: Quantities offered from battery in kWh
+            price_forecast: Forecasted market price in €/kWh
+            local_market_fee: Fee for local market trading in €/kWh
+            max_trade_cap: Maximum trade quantity per prosumer per time step in kWh
+            rng: NumPy random generator for the price noise (required if noise is None)
+            noise: Uniform [0, 1) draws, one per recruited prosumer
+        """
+        desired_quantity, ask_price = price_battery_offers(
+            self.desired_quantity[indices], offered_quantity, price_forecast,
+            local_market_fee, max_trade_cap, rng, noise)
+        if self.ledger is not None:
+            self.ledger.remove(*self.offer_state(indices))
+
+        self.selling_from_battery[indices] = True
+        self.is_seller[indices] = True
+        self.is_buyer[indices] = False
+        self.desired_quantity[indices] = desired_quantity
+        self.ask_price[indices] = ask_price
+        if self.ledger is not None:
+            self.ledger.add(*self.offer_state(indices))
+
+    def balance_trading_offers(self, imbalance_threshold: float, price_forecast: float, local_market_fee: float,
+                               max_trade_cap: float, timestep: int = 0,
+                               rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        Recruit battery owners as sellers when demand exceeds supply
+        (batched equivalent of P2PTradingMechanism.balance_trading_offers)
+
+        The gap is read from the ledger in O(1); only when it exceeds the
+        threshold are idle, unbanned prosumers with battery energy above the
+        minimum SoC recruited, fullest batteries first, until the gap is
+        covered.
+
+        Args:
+            imbalance_threshold: Demand minus supply in kWh tolerated without recruiting
+            price_forecast: Forecasted market price in €/kWh
+            local_market_fee: Fee for local market trading in €/kWh
+            max_trade_cap: Maximum trade quantity per prosumer per time step in kWh
+            timestep: Current timestep (keys the 'battery_market' price noise of the registry)
+            rng: NumPy random generator for the price noise (required if the population has no registry)
+
+        Returns:
+            IDs of the recruited battery sellers
+        """
+        if self.ledger is not None:
+            gap = self.ledger.imbalance
+        else:
+            gap = float(self.desired_quantity[self.active_buyers].sum() - self.desired_quantity[self.active_sellers].sum())
+        if gap <= imbalance_threshold:
+            return np.zeros(0, dtype=np.int64)
+
+        idle = self.has_battery & ~self.is_banned & ~self.is_buyer & ~self.is_seller
+        available = np.maximum(0, self.battery_level - self.battery_capacity * config.BATTERY_MIN_SOC)
+        candidates = np.flatnonzero(idle & (available > 0.01))
+        candidates = candidates[np.argsort(-available[candidates], kind='stable')]  # fullest batteries first
+        offered = np.minimum(available[candidates], max_trade_cap)
+        before = np.cumsum(offered) - offered  # gap already covered by the fuller batteries
+        recruited = before < gap
+        candidates = candidates[recruited]
+        offered = np.minimum(offered[recruited], gap - before[recruited])  # the last recruit only covers the rest
+
+        noise = self.streams.uniform('battery_market', timestep, self.id[candidates]) if self.streams is not None else None
+        self.becomes_seller(candidates, offered, price_forecast, local_market_fee, max_trade_cap, rng, noise)
+        return self.id[candidates]
+
+    def accept_trades(self, buyer_ids: np.ndarray, seller_ids: np.ndarray, quantity: np.ndarray,
+                      price, is_p2p: bool = True):
+        """
+        Settle a batch of trades on both counterparties
+        (batched equivalent of Prosumer.accept_trade, called for buyer and seller)
+
+        IDs outside the population (e.g. the aggregator, -1) are skipped.
+
+        Args:
+            buyer_ids: Buying prosumer ID per trade
+            seller_ids: Selling prosumer ID per trade
+            quantity: Traded energy per trade in kWh
+            price: Price per trade (or one price for all) in €/kWh
+            is_p2p: True for P2P trades, False for local market trades
+        """
+        size = len(self)
+        buyer_ids = np.asarray(buyer_ids, dtype=np.int64)
+        seller_ids = np.asarray(seller_ids, dtype=np.int64)
+        quantity = np.asarray(quantity, dtype=np.float64)
+        cost = np.broadcast_to(np.asarray(price, dtype=np.float64), quantity.shape) * quantity
+        counts = self.p2p_trades if is_p2p else self.market_trades
+
+        buying = (buyer_ids >= 0) & (buyer_ids < size)
+        selling = (seller_ids >= 0) & (seller_ids < size)
+        if self.ledger is not None:
+            traders = np.unique(np.concatenate((buyer_ids[buying], seller_ids[selling])))
+            self.ledger.remove(*self.offer_state(traders))
+
+        bought = np.bincount(buyer_ids[buying], quantity[buying], size)
+        self.imbalance += bought
+        self.balance -= np.bincount(buyer_ids[buying], cost[buying], size)
+        counts += np.bincount(buyer_ids[buying], minlength=size)
+
+        sold = np.bincount(seller_ids[selling], quantity[selling], size)
+        from_battery = self.selling_from_battery
+        self.imbalance[~from_battery] -= sold[~from_battery]
+        self.battery_level[from_battery] -= sold[from_battery]
+        self.battery_discharged_kwh[from_battery] += sold[from_battery]
+        self.balance += np.bincount(seller_ids[selling], cost[selling], size)
+        counts += np.bincount(seller_ids[selling], minlength=size)
+
+        self.desired_quantity[:] = np.maximum(0, self.desired_quantity - bought - sold)
+        if self.ledger is not None:
+            self.ledger.add(*self.offer_state(traders))
+
+    def update_ban_status(self):
+        """
+        Decrement ban durations and lift expired bans (see Prosumer.update_ban_status)
+        """
+        counting = self.is_banned & (self.ban_duration > 0)
+        self.ban_duration[counting] -= 1
+        lifted = counting & (self.ban_duration <= 0)
+        if self.ledger is not None:
+            self.ledger.remove(*self.offer_state(lifted))
+        self.is_banned[lifted] = False
+        self.ban_duration[lifted] = 0
+        self.reason_for_ban[lifted] = ""
+        if self.ledger is not None:
+            self.ledger.add(*self.offer_state(lifted))
+
+    def apply_ban(self, indices, duration: int, reason: str = ""):
+        """
+        Ban some prosumers from trading (batched equivalent of Prosumer.apply_ban)
+
+        Args:
+            indices: Prosumer IDs or mask
+            duration: Number of timesteps to ban
+            reason: Reason for the ban
+        """
+        if self.ledger is not None:
+            self.ledger.remove(*self.offer_state(indices))
+        self.is_banned[indices] = True
+        self.ban_duration[indices] = duration
+        self.reason_for_ban[indices] = reason
+        if self.ledger is not None:
+            self.ledger.add(*self.offer_state(indices))
+
+    def reset_trading_state(self):
+        """
+        Reset trading state of every prosumer for next time step
+        """
+        self.is_buyer[:] = False
+        self.is_seller[:] = False
+        self.selling_from_battery[:] = False
+        self.desired_quantity[:] = 0.0
+        self.bid_price[:] = 0.0
+        self.ask_price[:] = 0.0
+        if self.ledger is not None:
+            self.ledger.clear()
+
+    def __repr__(self):
+        return (f"ProsumerPopulation(size={len(self)}, batteries={int(self.has_battery.sum())}, "
+                f"banned={int(self.is_banned.sum())})")
+
+
+def population_of(prosumers) -> Optional[ProsumerPopulation]:
+    """
+    Find the population backing a list of prosumers, so batched code paths
+    can operate on its arrays
+
+    Args:
+        prosumers: ProsumerPopulation, its views() list, or a list of Prosumer objects
+
+    Returns:
+        The backing ProsumerPopulation (None for plain Prosumer objects)
+    """
+    if isinstance(prosumers, ProsumerPopulation):
+        return prosumers
+    if len(prosumers) and isinstance(prosumers[0], ProsumerView):
+        population = prosumers[0]._population
+        if population._views is prosumers:  # the complete view list, index = prosumer ID
+            return population
+    return None
+
+
+class ProsumerView(Prosumer):
+    """
+    Thin Prosumer facade over one row of a ProsumerPopulation
+
+    Every attribute reads and writes the population arrays, so the Prosumer
+    methods (update_energy_state, accept_trade, ...) keep working on views.
+    """
+
+    __slots__ = ('_population', '_index')
+
+    def __init__(self, population: ProsumerPopulation, index: int):
+        self._population = population   # backing population
+        self._index = index   # row of this prosumer in the population arrays
+
+    @property
+    def rng(self):
+        """Random source of this prosumer (its own stream when the population has a registry)"""
+        streams = self._population.streams
+        return streams.prosumer(self._population.id.item(self._index)) if streams is not None else random
+
+    def _offer(self):
+        """Current offer as plain Python values, in the form taken by CommunityLedger.add_offer/remove_offer"""
+        population, index = self._population, self._index
+        active = not population.is_banned.item(index)
+        return (population.id.item(index), active and population.is_buyer.item(index),
+                active and population.is_seller.item(index), population.desired_quantity.item(index))
+
+
+def _ledger_tracked(method):
+    """Wrap a Prosumer method so that the population ledger follows the offer change it makes"""
+    def tracked(self, *args, **kwargs):
+        ledger = self._population.ledger
+        if ledger is None:
+            return method(self, *args, **kwargs)
+        ledger.remove_offer(*self._offer())
+        result = method(self, *args, **kwargs)
+        ledger.add_offer(*self._offer())
+        return result
+
+    tracked.__name__ = method.__name__
+    tracked.__doc__ = method.__doc__
+    return tracked
+
+
+def _column_property(name: str) -> property:
+    """Create a property mapping a Prosumer attribute onto a population column"""
+    def fget(self):
+        return getattr(self._population, name).item(self._index)
+
+    def fset(self, value):
+        getattr(self._population, name)[self._index] = value
+
+    return property(fget, fset, doc=f"Population column '{name}'")
+
+
+for _name in FIELD_DTYPES:
+    setattr(ProsumerView, _name, _column_property(_name))
+
+# Prosumer methods changing the offer of a prosumer (per-object code paths; the simulator and
+# regulator use the batched population methods)
+for _name in ('prepare_trading_offer', 'becomes_seller', 'accept_trade', 'apply_ban',
+              'update_ban_status', 'reset_trading_state'):
+    setattr(ProsumerView, _name, _ledger_tracked(getattr(Prosumer, _name)))
@@ -0,0 +1,173 @@
+"""
+Precompiled daily profiles for consumption, solar generation and prices
+"""
+import json
+import math
+import numpy as np
+from typing import Dict, Optional
+import config
+
+
+# Typical consumption pattern with peaks in morning and evening (factor per hour of day)
+CONSUMPTION_PATTERNS = {
+    0: 0.4, 1: 0.35, 2: 0.35, 3: 0.35, 4: 0.4, 5: 0.6,
+    6: 1.1, 7: 1.4, 8: 1.2, 9: 0.9, 10: 0.8, 11: 0.9,
+    12: 1.0, 13: 0.9, 14: 0.8, 15: 0.8, 16: 0.9, 17: 1.1,
+    18: 1.6, 19: 1.9, 20: 1.7, 21: 1.4, 22: 1.0, 23: 0.6
+}
+
+# Price patterns following demand (higher during peak hours)
+PRICE_FACTORS = {
+    0: 0.7, 1: 0.6, 2: 0.6, 3: 0.6, 4: 0.7, 5: 0.9,  # Night low prices
+    6: 1.3, 7: 1.5, 8: 1.4, 9: 1.2, 10: 1.1, 11: 1.2,  # Morning high
+    12: 1.3, 13: 1.1, 14: 1.0, 15: 1.0, 16: 1.1, 17: 1.2,  # Afternoon
+    18: 1.5, 19: 1.6, 20: 1.5, 21: 1.3, 22: 1.1, 23: 0.9   # Evening peak
+}
+
+# PV system losses & panel efficiency (inverter, temperature, dust)
+PV_SYSTEM_EFFICIENCY = 0.88   # realistic residential average
+
+
+def solar_factor(hour: float) -> float:
+    """
+    Sinusoidal solar curve over daylight hours 6 AM to 6 PM (peak at noon)
+
+    Args:
+        hour: Hour of day, possibly fractional (0-24)
+
+    Returns:
+        Generation factor between 0 and 1
+    """
+    if hour < 6 or hour > 18:
+        return 0.0
+    return math.sin(math.pi * (hour - 6) / 12)
+
+
+class ProfileLibrary:
+    """
+    Daily shapes precomputed once as arrays and shared by all prosumers
+
+    Shapes are indexed by step of the day; each (shape, resolution) pair is
+    built on first use and cached. Consumption shapes are kept per home type
+    (rows indexed like config.BASE_CONSUMPTION), all sharing one shape unless
+    custom per-type factors are given. Hourly custom shapes can be loaded from
+    a JSON file with the keys "consumption", "solar" and "price" (24 factors
+    each, or one row of 24 factors per home type for "consumption", any of
+    them optional).
+    """
+
+    def __init__(self, consumption: Optional[list] = None, solar: Optional[list] = None,
+                 price: Optional[list] = None):
+        """
+        Initialize the library
+
+        Args:
+            consumption: 24 hourly consumption factors shared by all home types, or one
+                row of 24 factors per home type (default CONSUMPTION_PATTERNS for every type)
+            solar: 24 hourly solar generation factors (default sinusoidal curve)
+            price: 24 hourly price factors (default PRICE_FACTORS)
+        """
+        num_home_types = len(config.BASE_CONSUMPTION)
+        consumption = (self._validate('consumption', consumption, num_home_types) if consumption is not None
+                       else np.array([CONSUMPTION_PATTERNS[h] for h in range(24)]))
+        self.per_home_type = consumption.ndim == 2   # home types have their own consumption shapes
+        self.hourly = {
+            'consumption': np.broadcast_to(consumption, (num_home_types, 24)),   # home types x hours
+            'solar': self._validate('solar', solar) if solar is not None else None,   # None = analytic curve
+            'price': self._validate('price', price) if price is not None
+            else np.array([PRICE_FACTORS[h] for h in range(24)]),
+        }
+        self._cache: Dict[tuple, np.ndarray] = {}   # (name, resolution) -> shape array
+
+    @staticmethod
+    def _validate(name: str, values, num_home_types: Optional[int] = None) -> np.ndarray:
+        """Check that a custom hourly profile has one factor per hour of day (and per home type if allowed)"""
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != (24,) and (num_home_types is None or values.shape != (num_home_types, 24)):
+            expected = "24 hourly factors" if num_home_types is None else f"24 hourly factors (or {num_home_types} rows of them)"
+            raise ValueError(f"Profile '{name}' must have {expected}, got shape {values.shape}")
+        return values
+
+    @classmethod
+    def load(cls, path: str) -> 'ProfileLibrary':
+        """
+        Load custom hourly profiles from a JSON file
+
+        Args:
+            path: Path of the JSON file
+
+        Returns:
+            New ProfileLibrary
+        """
+        with open(path) as f:
+            data = json.load(f)
+        return cls(consumption=data.get('consumption'), solar=data.get('solar'), price=data.get('price'))
+
+    @staticmethod
+    def steps_per_day(resolution: float = 1.0) -> int:
+        """
+        Number of timesteps in a day
+
+        Args:
+            resolution: Timestep duration in hours
+
+        Returns:
+            Steps per day
+        """
+        steps = 24 / resolution
+        if abs(steps - round(steps)) > 1e-9:
+            raise ValueError(f"Timestep duration {resolution}h does not divide a day")
+        return int(round(steps))
+
+    def _shape(self, name: str, resolution: float) -> np.ndarray:
+        """Get a cached shape, building it on first use"""
+        key = (name, resolution)
+        if key not in self._cache:
+            steps = self.steps_per_day(resolution)
+            hourly = self.hourly[name]
+            if hourly is None:   # analytic solar curve, evaluated at the (possibly fractional) hour the step starts
+                shape = np.array([solar_factor(24 * k / steps) for k in range(steps)])
+            else:   # hourly factors held constant within the hour
+                shape = hourly[..., np.arange(steps) * 24 // steps]
+            shape.flags.writeable = False   # shared by all prosumers
+            self._cache[key] = shape
+        return self._cache[key]
+
+    def home_consumption_shapes(self, resolution: float = 1.0) -> np.ndarray:
+        """Consumption factor per home type and step of the day (home types x steps)"""
+        return self._shape('consumption', resolution)
+
+    def consumption_shape(self, resolution: float = 1.0, home_type: Optional[int] = None) -> np.ndarray:
+        """
+        Consumption factor per step of the day
+
+        Args:
+            resolution: Timestep duration in hours
+            home_type: Home type index (None = average over the home types)
+
+        Returns:
+            Shape array, one factor per step of the day
+        """
+        shapes = self.home_consumption_shapes(resolution)
+        if home_type is not None:
+            return shapes[home_type]
+        key = ('consumption_mean', resolution)
+        if key not in self._cache:
+            shape = shapes.mean(axis=0) if self.per_home_type else shapes[0]   # the shared shape otherwise
+            shape.flags.writeable = False
+            self._cache[key] = shape
+        return self._cache[key]
+
+    def solar_shape(self, resolution: float = 1.0) -> np.ndarray:
+        """Solar generation factor per step of the day"""
+        return self._shape('solar', resolution)
+
+    def price_shape(self, resolution: float = 1.0) -> np.ndarray:
+        """Price factor per step of the day"""
+        return self._shape('price', resolution)
+
+    def __repr__(self):
+        return f"ProfileLibrary(cached_shapes={len(self._cache)})"
+
+
+DEFAULT_PROFILES = ProfileLibrary()   # built-in shapes used when no library is given
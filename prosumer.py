@@ -11,7 +11,8 @@ class Prosumer:
     Represents a prosumer in the energy community
     """
     
-    def __init__(self, prosumer_id: int, pv_capacity: float, base_consumption: float, battery_capacity: float, home_type_index: int = 0):
+    def __init__(self, prosumer_id: int, pv_capacity: float, base_consumption: float, battery_capacity: float, home_type_index: int = 0,
+                 rng=None):
         """
         Initialize a prosumer
         
@@ -21,8 +22,10 @@ class Prosumer:
             base_consumption: Base consumption level in kWh per time step
             battery_capacity: Battery capacity in kWh
             home_type_index: Index of the home configuration type
+            rng: Random source for the price noise (e.g. RNGRegistry.prosumer(id)); random module if None
         """
         self.id = prosumer_id   # unique prosumer ID
+        self.rng = rng if rng is not None else random   # random source for the strategic price noise
         self.home_type_index = home_type_index  # home configuration index
         self.pv_capacity = pv_capacity   # PV panel capacity in kW
         self.base_consumption = base_consumption   # base consumption level in kWh per time step
@@ -153,7 +156,7 @@ class Prosumer:
             spread = grid_buy_price - grid_sell_price  # evaluate spread between grid buy and sell prices
             urgency = self.desired_quantity / max_trade_cap  # evaluate urgency based on desired quantity
 
-            noise = random.uniform(0.98, 1.05)   # strategic factor to adjust ask price
+            noise = self.rng.uniform(0.98, 1.05)   # strategic factor to adjust ask price
             
             calculated_ask = (grid_sell_price + (urgency * spread)) * noise  # set ask price starting from grid_sell_price, increasing with urgency
 
@@ -171,7 +174,7 @@ class Prosumer:
             spread = grid_buy_price - grid_sell_price  # evaluate spread between grid buy and sell prices
             urgency = self.desired_quantity / max_trade_cap  # evaluate urgency based on desired quantity
             
-            noise = random.uniform(0.97, 1.01)   # strategic factor to adjust bid price
+            noise = self.rng.uniform(0.97, 1.01)   # strategic factor to adjust bid price
 
             # Buyers bid closer to grid_buy_price as urgency increases (willing to pay more when desperate)
             # Start from midpoint and move toward grid_buy with urgency
@@ -212,7 +215,7 @@ class Prosumer:
 
         # Battery sellers price more competitively (lower noise, smaller urgency factor)
         # This makes them attractive to buyers who would otherwise go to local market
-        noise = random.uniform(0.95, 1.00)   # lower noise range than PV sellers (0.98-1.05)
+        noise = self.rng.uniform(0.95, 1.00)   # lower noise range than PV sellers (0.98-1.05)
         
         # midpoint between grid_sell and price_forecast, not grid_sell_price
         # This accounts for battery storage costs but remains competitive
@@ -0,0 +1,131 @@
+"""
+Seeded random number streams for reproducible (and shardable) simulations
+"""
+import numpy as np
+from typing import Dict, Optional
+
+
+# Stable keys of the subsystems drawing random numbers (never reorder, only append)
+SUBSYSTEMS = {
+    'population': 1,   # home types and battery ownership
+    'weather': 2,   # PV weather factors
+    'load': 3,   # consumption variation
+    'market': 4,   # strategic price noise of trading offers
+    'battery_market': 5,   # price noise of battery sellers
+    'chain': 6,   # miner selection
+    'forecaster': 7,   # price forecast uncertainty
+    'prosumer': 8,   # per-prosumer generators of the object API
+    'network': 9,   # feeder line lengths
+}
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)   # SplitMix64 increment
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: bijective avalanche mix of 64-bit integers"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class RNGRegistry:
+    """
+    Registry of independent random streams derived from one seed
+
+    Two kinds of streams are provided:
+    - counter-based draws (uniform): the value for a given (subsystem,
+      timestep, prosumer, draw) only depends on the seed and those keys, so
+      every prosumer has its own stream and results are bit-identical
+      whether the community is simulated serially or split across workers;
+    - sequential generators (stream, prosumer): numpy Generators for
+      subsystem-level decisions (miner selection, price forecasts) and for
+      the per-object Prosumer API.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        """
+        Initialize the registry
+
+        Args:
+            seed: Root seed (fresh OS entropy if None; see self.seed to reproduce the run)
+        """
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.seed = self.seed_sequence.entropy  # root seed, to reproduce this run
+        self._key = self.seed_sequence.generate_state(1, np.uint64)[0]  # 64-bit key for counter-based draws
+        self._streams: Dict[str, np.random.Generator] = {}  # sequential generators per subsystem
+        self._prosumer_streams: Dict[int, np.random.Generator] = {}  # sequential generators per prosumer
+
+    def _child(self, *keys: int) -> np.random.SeedSequence:
+        """Derive an independent seed sequence for the given spawn keys"""
+        return np.random.SeedSequence(self.seed, spawn_key=keys)
+
+    def stream(self, name: str) -> np.random.Generator:
+        """
+        Get the sequential generator of a subsystem
+
+        Args:
+            name: Subsystem name (see SUBSYSTEMS)
+
+        Returns:
+            NumPy Generator, the same object on every call
+        """
+        if name not in self._streams:
+            self._streams[name] = np.random.default_rng(self._child(SUBSYSTEMS[name]))
+        return self._streams[name]
+
+    def prosumer(self, prosumer_id: int) -> np.random.Generator:
+        """
+        Get the sequential generator of one prosumer (for the per-object API)
+
+        Args:
+            prosumer_id: Prosumer ID
+
+        Returns:
+            NumPy Generator, the same object on every call
+        """
+        if prosumer_id not in self._prosumer_streams:
+            self._prosumer_streams[prosumer_id] = np.random.default_rng(
+                self._child(SUBSYSTEMS['prosumer'], prosumer_id))
+        return self._prosumer_streams[prosumer_id]
+
+    def secret(self, name: str, num_bytes: int = 32) -> bytes:
+        """
+        Derive a secret key of a subsystem (e.g. the chain's seal key) from the root seed
+
+        Args:
+            name: Subsystem name (see SUBSYSTEMS)
+            num_bytes: Key length (multiple of 4)
+
+        Returns:
+            Key bytes, the same for every registry built from the same seed
+        """
+        return self._child(SUBSYSTEMS[name], 0).generate_state(num_bytes // 4, np.uint32).tobytes()
+
+    def uniform(self, name: str, timestep, ids, low: float = 0.0, high: float = 1.0,
+                draw: int = 0) -> np.ndarray:
+        """
+        Counter-based uniform draws keyed by subsystem, timestep and prosumer
+
+        Args:
+            name: Subsystem name (see SUBSYSTEMS)
+            timestep: Timestep (int) or array of timesteps, broadcast against ids
+            ids: Prosumer IDs (array)
+            low: Lower bound (inclusive)
+            high: Upper bound (exclusive)
+            draw: Index of the draw when a subsystem needs several per prosumer and timestep
+
+        Returns:
+            Array of draws with the broadcast shape of timestep and ids
+        """
+        timestep = np.asarray(timestep, dtype=np.int64).astype(np.uint64)
+        ids = np.asarray(ids, dtype=np.int64).astype(np.uint64)
+        with np.errstate(over='ignore'):
+            key = _mix64(self._key ^ (np.uint64(SUBSYSTEMS[name]) * _GOLDEN_GAMMA))
+            key = _mix64(key ^ np.uint64(draw))
+            bits = _mix64(key ^ _mix64(timestep * _GOLDEN_GAMMA + np.uint64(1)))
+            bits = _mix64(bits ^ (ids * _GOLDEN_GAMMA + np.uint64(1)))
+        unit = (bits >> np.uint64(11)).astype(np.float64) * (1.0 / 9007199254740992.0)  # 53-bit float in [0, 1)
+        return low + (high - low) * unit
+
+    def __repr__(self):
+        return f"RNGRegistry(seed={self.seed}, streams={sorted(self._streams)})"
@@ -1,8 +1,10 @@
 """
 Regulator to enforce community rules and achieve objectives
 """
-from typing import List
+import numpy as np
+from typing import List, Optional
 from prosumer import Prosumer
+from population import population_of
 import config
 
 
@@ -11,22 +13,55 @@ class Regulator:
     Community regulator that enforces rules and incentivizes desired behavior
     """
     
-    def __init__(self, objective: str = "maximize_renewable"):
+    def __init__(self, objective: str = "maximize_renewable", ban_history_window: Optional[int] = None,
+                 step_duration: float = 1.0):
         """
         Initialize regulator with objective
         
         Args:
             objective: Community objective (maximize_renewable, maximize_profit, maximize_p2p)
+            ban_history_window: Timesteps of ban history kept (None = keep all); at least the 5-hour re-ban check is kept
+            step_duration: Timestep duration in hours (bans, re-ban checks and incentives are defined per hour)
         """
         self.objective = objective  # community objective
+        self.step_duration = step_duration  # hours per timestep
+        self.ban_steps = {'excessive_market_usage': self._hours_to_steps(2),   # ban of 2 hours
+                          'negative_balance': self._hours_to_steps(3)}   # ban of 3 hours
+        self.reban_window = self._hours_to_steps(5)  # timesteps in which a prosumer is not banned again for the same reason
         self.total_incentives_paid = 0.0    # total incentives given to prosumers
         self.total_penalties_collected = 0.0    # total penalties collected from prosumers
-        self.banned_prosumers = []    # list of banned prosumers
+        self.banned_prosumers = []    # list of banned prosumers (recent ones only if ban_history_window is set)
+        self.ban_history_window = max(ban_history_window, self.reban_window) if ban_history_window is not None else None
+        self.total_bans = 0  # number of bans applied
+        self.bans_by_reason = {}  # number of bans applied per reason
+
+    def _hours_to_steps(self, hours: float) -> int:
+        """Number of timesteps covering a duration in hours (at least one)"""
+        return max(1, round(hours / self.step_duration))
 
     def incentivize_renewable_usage(self, prosumers: List[Prosumer]):
         """
         Reward prosumers for using renewable energy and penalize market usage
+
+        Bonus and penalty rates are per hour, so they are scaled by the
+        timestep duration: a day pays the same at any resolution.
         """
+        population = population_of(prosumers)
+        if population is not None:  # same rules on the population arrays
+            active = ~population.is_banned  # banned prosumers don't receive incentives or penalties
+            rewarded = active & (population.renewable_usage > 0)
+            renewable_bonus = population.renewable_usage[rewarded] * config.RENEWABLE_BONUS * self.step_duration
+            population.balance[rewarded] += renewable_bonus
+            population.bonus[rewarded] += renewable_bonus
+            self.total_incentives_paid += float(renewable_bonus.sum())
+
+            penalized = active & (population.market_trades > 0)
+            penalty = population.market_quantity[penalized] * config.PENALTY_FOR_MARKET * self.step_duration
+            population.balance[penalized] -= penalty
+            population.penalties[penalized] += penalty
+            self.total_penalties_collected += float(penalty.sum())
+            return
+
         for prosumer in prosumers:  # iterate over each prosumer
             # Skip banned prosumers - they don't receive incentives or penalties
             if prosumer.is_banned:
@@ -34,14 +69,14 @@ class Regulator:
             
             # Bonus for renewable self-consumption
             if prosumer.renewable_usage > 0:    # if prosumer has renewable energy usage
-                renewable_bonus = prosumer.renewable_usage * config.RENEWABLE_BONUS # calculate bonus based on usage of renewable energy
+                renewable_bonus = prosumer.renewable_usage * config.RENEWABLE_BONUS * self.step_duration # calculate bonus based on usage of renewable energy
                 prosumer.balance += renewable_bonus # add bonus to prosumer's balance
                 prosumer.bonus += renewable_bonus  # track total bonuses received
                 self.total_incentives_paid += renewable_bonus   # track total incentives paid
             
             # Penalty for using local market instead of P2P
             if prosumer.market_trades > 0:  # if prosumer has local market trades
-                penalty = prosumer.market_quantity * config.PENALTY_FOR_MARKET    # calculate penalty based on last market quantity
+                penalty = prosumer.market_quantity * config.PENALTY_FOR_MARKET * self.step_duration    # calculate penalty based on last market quantity
                 prosumer.balance -= penalty # deduct penalty from prosumer's balance
                 prosumer.penalties += penalty   # track total penalties incurred
                 self.total_penalties_collected += penalty   # track total penalties collected
@@ -54,42 +89,69 @@ class Regulator:
             prosumers: List of prosumers
             timestep: Current timestep
         """
-        for prosumer in prosumers:  # iterate over each prosumer
-            # Skip already banned prosumers (ban duration is managed by update_ban_status())
-            if prosumer.is_banned:
-                continue
+        if self.ban_history_window is not None:  # drop bans too old to matter for the re-ban checks
+            self.banned_prosumers = [ban for ban in self.banned_prosumers
+                                     if ban['timestep'] >= timestep - self.ban_history_window]
+        
+        population = population_of(prosumers)
+        if population is not None:  # screen the whole community with array masks
+            unbanned = ~population.is_banned  # ban duration of banned prosumers is managed by update_ban_status()
+            market_abuse = unbanned & (population.penalties > 2.0) & (population.bonus < 2.0)
+            negative_balance = unbanned & (population.balance < -20.0)
+            flagged = np.flatnonzero(market_abuse | negative_balance)
+            candidates = zip(population.id[flagged].tolist(), market_abuse[flagged].tolist(),
+                             negative_balance[flagged].tolist())
+        else:
+            flagged = {p.id: p for p in prosumers  # skip already banned prosumers
+                       if not p.is_banned and ((p.penalties > 2.0 and p.bonus < 2.0) or p.balance < -20.0)}
+            candidates = [(p.id, p.penalties > 2.0 and p.bonus < 2.0, p.balance < -20.0) for p in flagged.values()]
 
-            if prosumer.penalties > 2.0 and prosumer.bonus < 2.0:  # if prosumer has high penalties and low bonuses
-                # if the prosumer has been recently banned for the same reason, skip re-banning
-                recent_bans = [ban for ban in self.banned_prosumers 
-                               if ban['prosumer_id'] == prosumer.id and 
-                               ban['timestep'] >= timestep - 5 and
-                               ban['reason'] == 'excessive_market_usage']
-                if recent_bans:
-                    continue  # skip re-banning
-                
-                prosumer.apply_ban(duration=2, reason='excessive_market_usage')  # apply a ban for 2 timesteps
-                self.banned_prosumers.append({
-                    'prosumer_id': prosumer.id,
-                    'timestep': timestep,
-                    'reason': 'excessive_market_usage'
-                })  # add the prosumer to the banned list
-            
-            if prosumer.balance < -20.0:  # if prosumer has very negative balance
-                # if the prosumer has been recently banned for the same reason, skip re-banning
-                recent_bans = [ban for ban in self.banned_prosumers 
-                               if ban['prosumer_id'] == prosumer.id and 
-                               ban['timestep'] >= timestep - 5 and
-                               ban['reason'] == 'negative_balance']
-                if recent_bans:
-                    continue  # skip re-banning
+        bans = self._new_bans(candidates, timestep)
+        for reason, duration in self.ban_steps.items():  # later bans override earlier ones
+            banned_ids = [prosumer_id for prosumer_id, ban_reason in bans if ban_reason == reason]
+            if population is not None:
+                population.apply_ban(banned_ids, duration=duration, reason=reason)  # apply a ban for 2 or 3 hours
+            else:
+                for prosumer_id in banned_ids:
+                    flagged[prosumer_id].apply_ban(duration=duration, reason=reason)
+        for prosumer_id, reason in bans:
+            self.banned_prosumers.append({
+                'prosumer_id': prosumer_id,
+                'timestep': timestep,
+                'reason': reason
+            })  # add the prosumer to the banned list
+            self._count_ban(reason)
 
-                prosumer.apply_ban(duration=3, reason='negative_balance')  # apply a ban for 3 timesteps
-                self.banned_prosumers.append({
-                        'prosumer_id': prosumer.id,
-                        'timestep': timestep,
-                        'reason': 'negative_balance'
-                    })  # add the prosumer to the banned list
+    def _new_bans(self, candidates, timestep: int) -> List[tuple]:
+        """
+        Decide the bans of the prosumers breaking a rule
+
+        A prosumer already banned for the same reason in the last 5 hours
+        is not banned again (and, as before, its remaining checks are skipped).
+
+        Args:
+            candidates: Iterable of (prosumer ID, excessive market usage, negative balance) of unbanned prosumers
+            timestep: Current timestep
+
+        Returns:
+            List of (prosumer ID, reason), in prosumer order
+        """
+        recent_bans = {(ban['prosumer_id'], ban['reason']) for ban in self.banned_prosumers
+                       if ban['timestep'] >= timestep - self.reban_window}
+        bans = []
+        for prosumer_id, market_abuse, negative_balance in candidates:
+            for reason, broken in (('excessive_market_usage', market_abuse), ('negative_balance', negative_balance)):
+                if not broken:
+                    continue
+                if (prosumer_id, reason) in recent_bans:
+                    break  # skip re-banning
+                bans.append((prosumer_id, reason))
+        return bans
+    
+    def _count_ban(self, reason: str):
+        """Update the aggregate ban counters"""
+        self.total_bans += 1
+        self.bans_by_reason[reason] = self.bans_by_reason.get(reason, 0) + 1
     
     def update_prosumer_bans(self, prosumers: List[Prosumer]):
         """
@@ -99,6 +161,10 @@ class Regulator:
         Args:
             prosumers: List of prosumers
         """
+        population = population_of(prosumers)
+        if population is not None:
+            population.update_ban_status()  # one array pass, ledger updated for the lifted bans only
+            return
         for prosumer in prosumers:
             prosumer.update_ban_status()
     
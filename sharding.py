@@ -0,0 +1,192 @@
+"""
+Parallel P2P matching across neighbourhood shards
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from typing import List, Optional, Tuple
+from prosumer import Prosumer
+from population import population_of
+from clearing import clear_uniform_price, pair_fills
+from order_book import OrderBook
+from trade_batch import TradeBatch
+import config
+
+
+def assign_shards(num_shards: int, shard_by: str, home_type_index: np.ndarray) -> np.ndarray:
+    """
+    Assign every prosumer to a neighbourhood shard
+
+    Args:
+        num_shards: Number of shards
+        shard_by: 'feeder' (consecutive IDs share a feeder) or 'home_type' (clusters of similar homes)
+        home_type_index: Home configuration index per prosumer (ordered by ID)
+
+    Returns:
+        Shard index per prosumer
+    """
+    size = len(home_type_index)
+    if shard_by == "feeder":
+        return np.arange(size) * num_shards // max(size, 1)
+    if shard_by == "home_type":
+        return np.asarray(home_type_index) * num_shards // len(config.PV_CAPACITY)
+    raise ValueError(f"Unknown shard partition: {shard_by}")
+
+
+def match_offers(engine: str, ids: np.ndarray, is_buyer: np.ndarray, is_seller: np.ndarray,
+                 desired: np.ndarray, bid_price: np.ndarray, ask_price: np.ndarray,
+                 min_quantity: float = 0.001) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Match a set of offers without touching any prosumer state (runs in the workers)
+
+    Args:
+        engine: 'uniform_price' (UniformPriceAuction) or 'order_book' (OrderBookMatcher)
+        ids: Prosumer ID per offer
+        is_buyer: Active buyer flags
+        is_seller: Active seller flags
+        desired: Desired quantities in kWh
+        bid_price: Bid prices in €/kWh
+        ask_price: Ask prices in €/kWh
+        min_quantity: Smallest quantity in kWh worth trading
+
+    Returns:
+        Tuple of fill arrays (buyer_ids, seller_ids, quantity, price)
+    """
+    bids = is_buyer & (desired >= min_quantity)
+    asks = is_seller & (desired >= min_quantity)
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+
+    if engine == "uniform_price":
+        result = clear_uniform_price(bid_price[bids], desired[bids], ask_price[asks], desired[asks])
+        if result.quantity <= 0:
+            return empty
+        buyer_ids, seller_ids, quantity = pair_fills(ids[bids], result.buyer_fill, ids[asks], result.seller_fill)
+        return buyer_ids, seller_ids, quantity, np.full(len(quantity), result.price)
+
+    if engine == "order_book":
+        book = OrderBook(min_quantity)
+        for index in np.flatnonzero(bids | asks).tolist():   # orders arrive in ID order
+            if bids[index]:
+                book.add_bid(int(ids[index]), float(bid_price[index]), float(desired[index]))
+            else:
+                book.add_ask(int(ids[index]), float(ask_price[index]), float(desired[index]))
+        fills = book.match()
+        if not fills:
+            return empty
+        buyer_ids, seller_ids, quantity, price = (np.array(column) for column in zip(*fills))
+        return buyer_ids.astype(np.int64), seller_ids.astype(np.int64), quantity, price
+
+    raise ValueError(f"Unknown shard matching engine: {engine}")
+
+
+def _match_shard(args) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Process pool entry point (unpacks the match_offers arguments)"""
+    return match_offers(*args)
+
+
+class ShardedMatcher:
+    """
+    P2P matching split across neighbourhood shards (drop-in for
+    P2PTradingMechanism.execute_p2p_trading)
+
+    Every shard is matched in its own worker process; the residual offers
+    of all shards are then matched in one cross-shard round in the parent
+    process, before the local market. Workers only compute fills, all
+    prosumer state is settled in the parent, so results do not depend on
+    the number of processes.
+    """
+
+    def __init__(self, num_shards: int = 4, shard_by: str = "feeder", engine: str = "uniform_price",
+                 processes: Optional[int] = None, min_quantity: float = 0.001):
+        """
+        Initialize the matcher
+
+        Args:
+            num_shards: Number of neighbourhood shards
+            shard_by: Shard partition, 'feeder' or 'home_type' (see assign_shards)
+            engine: Matching engine used in every shard and in the cross-shard round
+            processes: Worker processes (None = one per shard up to the CPU count, 0 = match serially)
+            min_quantity: Smallest quantity in kWh worth trading
+        """
+        self.num_shards = num_shards
+        self.shard_by = shard_by
+        self.engine = engine
+        self.processes = min(num_shards, os.cpu_count() or 1) if processes is None else processes
+        self.min_quantity = min_quantity
+        self.shard_of = None  # shard index per prosumer, assigned on first use
+        self.cross_shard_quantity = 0.0  # kWh - energy traded in cross-shard rounds so far
+        self._executor = None  # worker pool, created on first use
+
+    def _map(self, tasks: list) -> list:
+        """Run match_offers for every task, in the worker pool if enabled"""
+        if self.processes <= 1 or len(tasks) <= 1:
+            return [_match_shard(task) for task in tasks]
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        return list(self._executor.map(_match_shard, tasks))
+
+    def execute_p2p_trading(self, prosumers: List[Prosumer], timestep: int) -> TradeBatch:
+        """
+        Match every shard in parallel, then the residual offers across shards
+
+        Args:
+            prosumers: List of prosumers (index = prosumer ID)
+            timestep: Current timestep
+
+        Returns:
+            TradeBatch of executed P2P trades (shard trades first, then cross-shard trades)
+        """
+        population = population_of(prosumers)
+        if population is not None:
+            ids, home_type_index = population.id, population.home_type_index
+            is_buyer, is_seller = population.active_buyers, population.active_sellers
+            desired, bid_price, ask_price = population.desired_quantity, population.bid_price, population.ask_price
+        else:
+            ids = np.array([p.id for p in prosumers], dtype=np.int64)
+            home_type_index = np.array([p.home_type_index for p in prosumers], dtype=np.int64)
+            is_buyer = np.array([p.is_buyer and not p.is_banned for p in prosumers], dtype=bool)
+            is_seller = np.array([p.is_seller and not p.is_banned for p in prosumers], dtype=bool)
+            desired = np.array([p.desired_quantity for p in prosumers], dtype=np.float64)
+            bid_price = np.array([p.bid_price for p in prosumers], dtype=np.float64)
+            ask_price = np.array([p.ask_price for p in prosumers], dtype=np.float64)
+
+        if self.shard_of is None or len(self.shard_of) != len(ids):
+            self.shard_of = assign_shards(self.num_shards, self.shard_by, home_type_index)
+
+        # Round 1: every shard on its own
+        tasks = []
+        for shard in range(self.num_shards):
+            members = np.flatnonzero(self.shard_of == shard)
+            tasks.append((self.engine, ids[members], is_buyer[members], is_seller[members],
+                          desired[members], bid_price[members], ask_price[members], self.min_quantity))
+        rounds = self._map(tasks)
+
+        # Round 2: residual offers across shards
+        filled = np.zeros(len(ids))
+        for buyer_ids, seller_ids, quantity, _ in rounds:
+            filled += np.bincount(buyer_ids, quantity, len(ids)) + np.bincount(seller_ids, quantity, len(ids))
+        cross = match_offers(self.engine, ids, is_buyer, is_seller, desired - filled,
+                             bid_price, ask_price, self.min_quantity)
+        self.cross_shard_quantity += float(cross[2].sum())
+        rounds.append(cross)
+
+        buyer_ids, seller_ids, quantity, price = (np.concatenate(column) for column in zip(*rounds))
+        if population is not None:
+            population.accept_trades(buyer_ids, seller_ids, quantity, price, is_p2p=True)
+        else:
+            for buyer_id, seller_id, amount, fill in zip(buyer_ids.tolist(), seller_ids.tolist(),
+                                                         quantity.tolist(), price.tolist()):
+                prosumers[buyer_id].accept_trade(amount, fill, is_buyer_role=True, is_p2p=True)
+                prosumers[seller_id].accept_trade(amount, fill, is_buyer_role=False, is_p2p=True)
+
+        return TradeBatch.from_arrays(buyer_ids, seller_ids, quantity, price, 'p2p', timestep)
+
+    def close(self):
+        """Shut down the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __repr__(self):
+        return (f"ShardedMatcher(shards={self.num_shards}, by={self.shard_by}, engine={self.engine}, "
+                f"processes={self.processes})")
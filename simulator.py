@@ -4,12 +4,24 @@ Main simulator orchestrating the prosumer community energy trading
 import random
 import csv
 import os
-from typing import List
-from prosumer import Prosumer
-from trading import P2PTradingMechanism, LocalMarketMechanism, Trade
+from collections import deque
+import numpy as np
+from population import ProsumerPopulation
+from trading import P2PTradingMechanism, LocalMarketMechanism
+from order_book import OrderBookMatcher, ContinuousDoubleAuction
+from clearing import UniformPriceAuction, TickBucketAuction
+from trade_batch import TradeBatch
+from local_market import BatchedLocalMarket
+from ledger import CommunityLedger
+from sharding import ShardedMatcher
+from optimal_matching import OptimalAllocator
+from network import RadialFeeder, NetworkMatcher
 from blockchain import Blockchain
 from regulator import Regulator
-from data_generation import generate_pv_generation, generate_consumption, forecast_price
+from data_generation import generate_pv_matrix, generate_consumption_matrix, forecast_price, pv_from_irradiance
+from traces import TraceSource
+from profiles import DEFAULT_PROFILES, ProfileLibrary
+from random_streams import RNGRegistry
 import config
 from plot_results import SimulationVisualizer
 
@@ -20,22 +32,64 @@ class CommunitySimulator:
     
     def __init__(self):
         """Initialize the simulator with all components"""
-        self.prosumers = []
+        self.streams = RNGRegistry(config.RANDOM_SEED)  # independent seeded streams per prosumer and subsystem
+        self.population = None  # struct-of-arrays state of the community
+        self.prosumers = []  # per-prosumer views over the population
         self.p2p_mechanism = P2PTradingMechanism()
-        self.local_market = LocalMarketMechanism(
-            aggregator_id=-1,
-            transaction_fee=config.LOCAL_MARKET_FEE
-        )
+        self.p2p_matcher = self._create_p2p_matcher()  # engine executing the P2P matching phase
+        if config.LOCAL_MARKET_SETTLEMENT == "batched":  # one array operation over all unsatisfied prosumers
+            self.local_market = BatchedLocalMarket(
+                aggregator_id=-1,
+                transaction_fee=config.LOCAL_MARKET_FEE
+            )
+        else:
+            self.local_market = LocalMarketMechanism(
+                aggregator_id=-1,
+                transaction_fee=config.LOCAL_MARKET_FEE
+            )
         self.blockchain = Blockchain(
             difficulty=config.DIFFICULTY_TARGET,
             num_miners=config.NUM_MINERS,
             block_reward=config.BLOCK_REWARD,
-            max_transactions_per_block=config.MAX_TRANSACTIONS_PER_BLOCK
+            max_transactions_per_block=config.MAX_TRANSACTIONS_PER_BLOCK,
+            rng=self.streams.stream('chain'),
+            chain_window=config.CHAIN_WINDOW if config.LONG_HORIZON_MODE else None,
+            max_pending_in_memory=config.MAX_PENDING_IN_MEMORY if config.LONG_HORIZON_MODE else None,
+            spill_dir=config.SPILL_DIR,
+            mining_processes=config.MINING_PROCESSES,
+            mining_mode=config.MINING_MODE,
+            hash_rates=config.MINER_HASH_RATES,
+            pow_sample_rate=config.POW_SAMPLE_RATE,
+            nonce_offsets=config.MINER_NONCE_OFFSETS,
+            seal_key=self.streams.secret('chain')  # reproducible from the printed seed
+        )
+        self.regulator = Regulator(
+            objective=config.REGULATOR_OBJECTIVE,
+            ban_history_window=config.BAN_HISTORY_WINDOW if config.LONG_HORIZON_MODE else None,
+            step_duration=config.TIME_STEP_DURATION
         )
-        self.regulator = Regulator(objective=config.REGULATOR_OBJECTIVE)
         
         self.current_timestep = 0
-        self.simulation_log = []
+        # Timestep summaries (rolling window in long-horizon mode, totals are kept in log_totals)
+        self.simulation_log = deque(maxlen=config.LOG_WINDOW) if config.LONG_HORIZON_MODE else []
+        self.log_totals = {'timesteps': 0, 'p2p_trades': 0, 'market_trades': 0}
+        
+        # Daily consumption, solar and price shapes shared by all prosumers
+        self.profiles = ProfileLibrary.load(config.PROFILE_FILE) if config.PROFILE_FILE else DEFAULT_PROFILES
+        
+        # Timestep resolution (config.TIME_STEP_DURATION hours per step)
+        self.steps_per_day = ProfileLibrary.steps_per_day(config.TIME_STEP_DURATION)
+        self.trade_cap = config.MAX_TRADE_CAP * config.TIME_STEP_DURATION  # kWh per prosumer per timestep
+        self.imbalance_threshold = config.IMBALANCE_THRESHOLD * config.TIME_STEP_DURATION  # kWh per timestep
+        
+        # PV and consumption (steps of one day x prosumers), generated one day at a time
+        self.pv_matrix = None
+        self.consumption_matrix = None
+        self.energy_block_start = None  # first timestep covered by the current matrices
+        
+        # Recorded traces (memory-mapped) replacing generated weather / consumption when configured
+        self.pv_trace = TraceSource(config.PV_TRACE_FILE) if config.PV_TRACE_FILE else None
+        self.load_trace = TraceSource(config.LOAD_TRACE_FILE) if config.LOAD_TRACE_FILE else None
         
         # Create results directory
         os.makedirs("results", exist_ok=True)
@@ -92,94 +146,177 @@ class CommunitySimulator:
                 "Active_Buyers", "Active_Sellers", "Banned_Prosumers"
             ])
     
+    def _create_p2p_matcher(self):
+        """
+        Create the P2P matching engine selected by config.P2P_MATCHING
+
+        Returns:
+            Object providing execute_p2p_trading(prosumers, timestep)
+        """
+        if config.P2P_MATCHING == "bilateral":
+            return self.p2p_mechanism
+        if config.P2P_MATCHING == "order_book":
+            return OrderBookMatcher()
+        if config.P2P_MATCHING == "uniform_price":
+            return UniformPriceAuction()
+        if config.P2P_MATCHING == "tick_bucket":
+            return TickBucketAuction(tick=config.PRICE_TICK)
+        if config.P2P_MATCHING == "continuous":
+            return ContinuousDoubleAuction(price_tolerance=config.CDA_PRICE_TOLERANCE)
+        if config.P2P_MATCHING == "sharded":
+            return ShardedMatcher(num_shards=config.NUM_SHARDS, shard_by=config.SHARD_BY, engine=config.SHARD_ENGINE)
+        if config.P2P_MATCHING == "optimal":
+            return OptimalAllocator(objective=config.P2P_OBJECTIVE, edges_per_buyer=config.LP_EDGES_PER_BUYER)
+        if config.P2P_MATCHING == "network":
+            feeder = RadialFeeder(config.NUM_PROSUMERS, hops=config.NETWORK_HOPS, lateral_length=config.LATERAL_LENGTH,
+                                  line_length=config.LINE_LENGTH,
+                                  line_capacity=config.LINE_CAPACITY * config.TIME_STEP_DURATION,
+                                  loss_per_km=config.LINE_LOSS_PER_KM, rng=self.streams.stream('network'))
+            return NetworkMatcher(feeder)
+        raise ValueError(f"Unknown P2P matching engine: {config.P2P_MATCHING}")
+
     def initialize_prosumers(self):
         """Create prosumers with random characteristics"""
         print(f"Initializing {config.NUM_PROSUMERS} prosumers...")
         
-        for i in range(config.NUM_PROSUMERS):
-            home_index = random.randint(0, len(config.PV_CAPACITY) - 1)
-            pv_capacity = config.PV_CAPACITY[home_index]  # PV capacity determined by home type
-            base_consumption = config.BASE_CONSUMPTION[home_index]  # Consumption determined by home type
-            has_battery = random.random() < config.HAS_BATTERY  # 80% chance of having battery
-            # Battery capacity now consistent per home type (not random)
-            battery_capacity = config.BATTERY_CAPACITY[home_index] if has_battery else 0.0
-            
-            prosumer = Prosumer(i, pv_capacity, base_consumption, battery_capacity, home_index)
-            self.prosumers.append(prosumer)
+        # Home type, battery ownership and capacities are drawn for the whole community at once
+        self.population = ProsumerPopulation.generate(config.NUM_PROSUMERS, self.streams.stream('population'))
+        self.population.streams = self.streams
+        self.population.ledger = CommunityLedger()  # running offer totals, updated on every offer change
+        self.prosumers = self.population.views()
         
         print(f"✓ Created {len(self.prosumers)} prosumers")
     
+    def _get_energy_profiles(self, timestep: int):
+        """
+        Get PV generation and consumption of all prosumers for a timestep.
+        A whole day of steps is generated in one vectorized call when the
+        timestep leaves the current block, so memory does not grow with the horizon.
+        
+        Args:
+            timestep: Current timestep
+        
+        Returns:
+            Tuple (pv_generation, consumption) arrays in kWh per timestep
+        """
+        row = timestep - self.energy_block_start if self.energy_block_start is not None else -1
+        if not 0 <= row < self.steps_per_day:
+            self.energy_block_start = timestep - timestep % self.steps_per_day  # block starts at midnight
+            if self.pv_trace is not None:   # stream the day's slice of the recorded irradiance
+                irradiance = self.pv_trace.block(self.energy_block_start, self.steps_per_day, self.population.id)
+                self.pv_matrix = pv_from_irradiance(irradiance, self.population.pv_capacity)
+            else:
+                self.pv_matrix = generate_pv_matrix(self.steps_per_day, self.population.pv_capacity,
+                                                    streams=self.streams, first_timestep=self.energy_block_start,
+                                                    ids=self.population.id, profiles=self.profiles,
+                                                    resolution=config.TIME_STEP_DURATION)
+            if self.load_trace is not None:   # stream the day's slice of the recorded load
+                self.consumption_matrix = self.load_trace.block(self.energy_block_start, self.steps_per_day,
+                                                                self.population.id)
+            else:
+                self.consumption_matrix = generate_consumption_matrix(self.steps_per_day, self.population.base_consumption,
+                                                                      streams=self.streams,
+                                                                      first_timestep=self.energy_block_start,
+                                                                      ids=self.population.id, profiles=self.profiles,
+                                                                      resolution=config.TIME_STEP_DURATION,
+                                                                      home_type_index=self.population.home_type_index)
+            row = timestep - self.energy_block_start
+        return self.pv_matrix[row], self.consumption_matrix[row]
+    
+    def _hour_of_day(self, timestep: int) -> float:
+        """
+        Get the hour of day at the start of a timestep
+        
+        Args:
+            timestep: Current timestep
+        
+        Returns:
+            Hour of day (int at hourly resolution, fractional for sub-hourly steps)
+        """
+        hour = (timestep % self.steps_per_day) * 24 / self.steps_per_day
+        return int(hour) if hour.is_integer() else round(hour, 4)
+    
     def _log_timestep_to_csv(self, timestep: int, hour: int, price_forecast: float,
-                              p2p_trades: List[Trade], market_trades: List[Trade],
-                              imbalances_before_p2p: dict, imbalances_after_p2p: dict,
-                              original_desired_quantities: dict):
+                              p2p_trades: TradeBatch, market_trades: TradeBatch,
+                              imbalances_before_p2p: np.ndarray, imbalances_after_p2p: np.ndarray,
+                              original_desired_quantities: np.ndarray):
         """
         Log timestep data to CSV files for efficient storage and analysis
         
         Args:
             timestep: Current timestep
-            hour: Hour of day
+            hour: Hour of day (fractional for sub-hourly steps)
             price_forecast: Energy price forecast
-            p2p_trades: List of P2P trades executed
-            market_trades: List of market trades executed
-            imbalances_before_p2p: Dict of prosumer imbalances before P2P
-            imbalances_after_p2p: Dict of prosumer imbalances after P2P
-            original_desired_quantities: Dict of original desired quantities before trading
+            p2p_trades: P2P trades executed
+            market_trades: Market trades executed
+            imbalances_before_p2p: Prosumer imbalances before P2P (indexed by prosumer ID)
+            imbalances_after_p2p: Prosumer imbalances after P2P (indexed by prosumer ID)
+            original_desired_quantities: Original desired quantities before trading (indexed by prosumer ID)
         """
-        # Log prosumer energy states
+        pop = self.population
+        size = len(pop)
+        
+        # Log prosumer energy states (columns are formatted as whole arrays, then written row by row)
         with open("results/prosumer_energy.csv", "a", newline="") as f:
             writer = csv.writer(f)
-            for p in self.prosumers:
-                battery_info = p.get_battery_info()
-                writer.writerow([
-                    timestep, hour, p.id, p.home_type_index, round(p.pv_generation, 4), round(p.consumption, 4),
-                    battery_info['level'], battery_info['capacity'], battery_info['soc'],
-                    round(p.battery_charged_kwh, 4), round(p.battery_discharged_kwh, 4),
-                    round(imbalances_before_p2p.get(p.id, 0), 4),
-                    round(imbalances_after_p2p.get(p.id, 0), 4),
-                    round(p.imbalance, 4), round(p.balance, 4), round(p.renewable_usage, 4)
-                ])
+            writer.writerows(zip(
+                [timestep] * size, [hour] * size, pop.id.tolist(), pop.home_type_index.tolist(),
+                np.round(pop.pv_generation, 4).tolist(), np.round(pop.consumption, 4).tolist(),
+                np.where(pop.has_battery, np.round(pop.battery_level, 2), 0).tolist(),
+                np.where(pop.has_battery, np.round(pop.battery_capacity, 2), 0).tolist(),
+                np.round(pop.get_battery_soc(), 1).tolist(),
+                np.round(pop.battery_charged_kwh, 4).tolist(), np.round(pop.battery_discharged_kwh, 4).tolist(),
+                np.round(imbalances_before_p2p, 4).tolist(),
+                np.round(imbalances_after_p2p, 4).tolist(),
+                np.round(pop.imbalance, 4).tolist(), np.round(pop.balance, 4).tolist(),
+                np.round(pop.renewable_usage, 4).tolist()
+            ))
         
         # Log prosumer trading status
         with open("results/prosumer_trading.csv", "a", newline="") as f:
             writer = csv.writer(f)
-            for p in self.prosumers:
-                role = "Banned" if p.is_banned else ("Buyer" if p.is_buyer else ("Seller" if p.is_seller else "Neutral"))
-                writer.writerow([
-                    timestep, hour, p.id, p.home_type_index, role, p.is_banned,
-                    round(original_desired_quantities.get(p.id, 0), 4) if not p.is_banned else 0,
-                    round(p.bid_price, 4) if p.is_buyer else None,
-                    round(p.ask_price, 4) if p.is_seller else None,
-                    p.p2p_trades, p.market_trades
-                ])
+            role = np.select([pop.is_banned, pop.is_buyer, pop.is_seller], ["Banned", "Buyer", "Seller"], "Neutral")
+            bid_prices = np.round(pop.bid_price, 4).astype(object)
+            bid_prices[~pop.is_buyer] = None
+            ask_prices = np.round(pop.ask_price, 4).astype(object)
+            ask_prices[~pop.is_seller] = None
+            writer.writerows(zip(
+                [timestep] * size, [hour] * size, pop.id.tolist(), pop.home_type_index.tolist(),
+                role.tolist(), pop.is_banned.tolist(),
+                np.where(pop.is_banned, 0, np.round(original_desired_quantities, 4)).tolist(),
+                bid_prices.tolist(), ask_prices.tolist(),
+                pop.p2p_trades.tolist(), pop.market_trades.tolist()
+            ))
         
         # Log all trades
         with open("results/all_trades.csv", "a", newline="") as f:
             writer = csv.writer(f)
-            for trade in p2p_trades + market_trades:
-                writer.writerow([
-                    timestep, hour, trade.trade_type, trade.buyer_id, trade.seller_id,
-                    round(trade.quantity, 4), round(trade.price, 4)])
+            trades = TradeBatch.concatenate([p2p_trades, market_trades])
+            writer.writerows(zip(
+                [timestep] * len(trades), [hour] * len(trades), trades.trade_type.tolist(),
+                trades.buyer_id.tolist(), trades.seller_id.tolist(),
+                np.round(trades.quantity, 4).tolist(), np.round(trades.price, 4).tolist()
+            ))
         
         # Log regulator actions
         with open("results/regulator_actions.csv", "a", newline="") as f:
             writer = csv.writer(f)
-            for p in self.prosumers:
-                writer.writerow([
-                    timestep, hour, p.id, round(p.bonus, 4), round(p.penalties, 4),
-                    p.is_banned, p.ban_duration, p.reason_for_ban
-                ])
+            writer.writerows(zip(
+                [timestep] * size, [hour] * size, pop.id.tolist(),
+                np.round(pop.bonus, 4).tolist(), np.round(pop.penalties, 4).tolist(),
+                pop.is_banned.tolist(), pop.ban_duration.tolist(), pop.reason_for_ban.tolist()
+            ))
         
         # Log community summary
         with open("results/community_summary.csv", "a", newline="") as f:
             writer = csv.writer(f)
-            total_pv = sum(p.pv_generation for p in self.prosumers)
-            total_consumption = sum(p.consumption for p in self.prosumers)
-            total_surplus = sum(p for p in imbalances_before_p2p.values() if p > 0)
-            total_deficit = sum(abs(p) for p in imbalances_before_p2p.values() if p < 0)
-            active_buyers = sum(1 for p in self.prosumers if p.is_buyer and not p.is_banned)
-            active_sellers = sum(1 for p in self.prosumers if p.is_seller and not p.is_banned)
-            banned = sum(1 for p in self.prosumers if p.is_banned)
+            total_pv = pop.pv_generation.sum()
+            total_consumption = pop.consumption.sum()
+            total_surplus = imbalances_before_p2p[imbalances_before_p2p > 0].sum()
+            total_deficit = -imbalances_before_p2p[imbalances_before_p2p < 0].sum()
+            active_buyers = pop.ledger.num_buyers
+            active_sellers = pop.ledger.num_sellers
+            banned = int(pop.is_banned.sum())
             
             writer.writerow([
                 timestep, hour, round(price_forecast, 4),
@@ -194,92 +331,86 @@ class CommunitySimulator:
         Simulate one timestep of the community
         
         Args:
-            timestep: Current timestep (hour of day)
+            timestep: Current timestep (config.TIME_STEP_DURATION hours each)
         """
-        hour = timestep % 24    # hour of the day (0-23)
+        hour = self._hour_of_day(timestep)    # hour of the day (0-23, fractional for sub-hourly steps)
         
         # Verbose output
         if config.VERBOSE:
             print(f"\n{'='*70}")    # splitter line for timestep
-            print(f"TIMESTEP {timestep} (Hour {hour}:00)")  # header for current timestep
+            print(f"TIMESTEP {timestep} (Hour {int(hour)}:{round(hour % 1 * 60):02d})")  # header for current timestep
             print(f"{'='*70}")  # splitter line
         
         # 1. Generate PV and consumption for all prosumers
-        for prosumer in self.prosumers:
-            pv_gen = generate_pv_generation(hour, prosumer.pv_capacity) # generate PV generation based on hour and prosumer's PV capacity
-            consumption = generate_consumption(hour, prosumer.base_consumption) # generate consumption based on hour and prosumer's base consumption
-            prosumer.update_energy_state(pv_gen, consumption)   # update prosumer's energy state with generated PV and consumption
+        pv_gen, consumption = self._get_energy_profiles(timestep)  # rows of the precomputed daily matrices
+        self.population.update_energy_state(pv_gen, consumption)   # batched self-consumption and battery dispatch
         
         # 2. Get price forecast
-        price_forecast = forecast_price(hour, config.BASE_PRICE)
+        price_forecast = forecast_price(int(hour), config.BASE_PRICE, self.profiles, self.streams.stream('forecaster'))
         
         # Store imbalances before P2P for logging
-        imbalances_before_p2p = {p.id: p.imbalance for p in self.prosumers}
+        imbalances_before_p2p = self.population.imbalance.copy()
         
         if config.VERBOSE:
-            total_surplus = sum(p.imbalance for p in self.prosumers if p.imbalance > 0)
-            total_deficit = sum(abs(p.imbalance) for p in self.prosumers if p.imbalance < 0)
+            total_surplus = imbalances_before_p2p[imbalances_before_p2p > 0].sum()
+            total_deficit = -imbalances_before_p2p[imbalances_before_p2p < 0].sum()
             print(f"Price Forecast: €{price_forecast:.3f}/kWh")
             print(f"Total Surplus: {total_surplus:.2f} kWh | Total Deficit: {total_deficit:.2f} kWh")
 
         # 3. Prosumers prepare trading offers
-        for prosumer in self.prosumers:
-            prosumer.prepare_trading_offer(price_forecast, config.LOCAL_MARKET_FEE, config.MAX_TRADE_CAP)
+        self.population.prepare_trading_offers(price_forecast, config.LOCAL_MARKET_FEE, self.trade_cap,
+                                               noise=self.streams.uniform('market', timestep, self.population.id))
         
         # 4. Check the total amount of asked and bid energy - if there is big difference check if some prosumer can help with their battery
-        total_asked_energy = sum(p.desired_quantity for p in self.prosumers if p.is_buyer and not p.is_banned)
-        total_bid_energy = sum(p.desired_quantity for p in self.prosumers if p.is_seller and not p.is_banned)
+        ledger = self.population.ledger
+        total_asked_energy = ledger.buyer_quantity
+        total_bid_energy = ledger.seller_quantity
 
-        self.p2p_mechanism.balance_trading_offers(self.prosumers, config.IMBALANCE_THRESHOLD, price_forecast, config.LOCAL_MARKET_FEE, config.MAX_TRADE_CAP)
+        self.population.balance_trading_offers(self.imbalance_threshold, price_forecast, config.LOCAL_MARKET_FEE,
+                                               self.trade_cap, timestep)  # recruit battery sellers, gap read from the ledger
 
-        buyers_count = sum(1 for p in self.prosumers if p.is_buyer and not p.is_banned)
-        sellers_count = sum(1 for p in self.prosumers if p.is_seller and not p.is_banned)
+        buyers_count = ledger.num_buyers
+        sellers_count = ledger.num_sellers
         
         if config.VERBOSE:
             print(f"Active Buyers: {buyers_count} | Active Sellers: {sellers_count}")
             print(f"Total Asked Energy: {total_asked_energy:.2f} kWh | Total Bid Energy: {total_bid_energy:.2f} kWh")
         
         # Store original desired quantities before trading (for logging purposes)
-        original_desired_quantities = {p.id: p.desired_quantity for p in self.prosumers}
+        original_desired_quantities = self.population.desired_quantity.copy()
 
         # 4. Execute P2P trading
-        p2p_trades = self.p2p_mechanism.execute_p2p_trading(self.prosumers, timestep)
+        p2p_trades = self.p2p_matcher.execute_p2p_trading(self.prosumers, timestep)
+        if not isinstance(p2p_trades, TradeBatch):  # engines returning Trade objects
+            p2p_trades = TradeBatch.from_trades(p2p_trades)
         
         # Store imbalances after P2P for logging
-        imbalances_after_p2p = {p.id: p.imbalance for p in self.prosumers}
+        imbalances_after_p2p = self.population.imbalance.copy()
         
         if config.VERBOSE:
             print(f"\nP2P Trading: {len(p2p_trades)} trades executed")
             if len(p2p_trades) > 0:
-                total_p2p_energy = sum(t.quantity for t in p2p_trades)
-                avg_p2p_price = sum(t.price * t.quantity for t in p2p_trades) / total_p2p_energy if total_p2p_energy > 0 else 0
-                print(f"  Total Energy: {total_p2p_energy:.2f} kWh | Avg Price: €{avg_p2p_price:.3f}/kWh")
-            satisfied_buyers = sum(1 for p in self.prosumers if p.is_buyer and not p.is_banned and p.desired_quantity < 0.01)
-            satisfied_sellers = sum(1 for p in self.prosumers if p.is_seller and not p.is_banned and p.desired_quantity < 0.01)
-            print(f"Satisfied Buyers after P2P: {satisfied_buyers} | Satisfied Sellers after P2P: {satisfied_sellers}")
-            pending_prosumers = [p for p in self.prosumers if (p.is_buyer or p.is_seller) and not p.is_banned and p.desired_quantity > 0]
-            if pending_prosumers:
-                print(f"Pending Prosumers: {len(pending_prosumers)}")
+                print(f"  Total Energy: {p2p_trades.total_quantity():.2f} kWh | Avg Price: €{p2p_trades.average_price():.3f}/kWh")
+            print(f"Satisfied Buyers after P2P: {ledger.satisfied_buyers} | Satisfied Sellers after P2P: {ledger.satisfied_sellers}")
+            if ledger.num_pending:
+                print(f"Pending Prosumers: {ledger.num_pending}")
         
         # Add P2P trades to blockchain
-        for trade in p2p_trades:
-            self.blockchain.add_transaction(trade.to_dict())
+        self.blockchain.add_trade_batch(p2p_trades)
         
         # 5. Execute local market trading for remaining imbalances
         market_trades = self.local_market.execute_local_market(self.prosumers, price_forecast, timestep)
+        if not isinstance(market_trades, TradeBatch):
+            market_trades = TradeBatch.from_trades(market_trades)
         
         if config.VERBOSE:
             print(f"\nLocal Market Trading: {len(market_trades)} trades executed")
             if len(market_trades) > 0:
-                total_market_energy = sum(t.quantity for t in market_trades)
-                print(f"  Total Energy: {total_market_energy:.2f} kWh")
-            satisfied_buyers = sum(1 for p in self.prosumers if p.is_buyer and not p.is_banned and p.desired_quantity < 0.01)
-            satisfied_sellers = sum(1 for p in self.prosumers if p.is_seller and not p.is_banned and p.desired_quantity < 0.01)
-            print(f"Satisfied Buyers after Local Market: {satisfied_buyers} | Satisfied Sellers after Local Market: {satisfied_sellers}")
+                print(f"  Total Energy: {market_trades.total_quantity():.2f} kWh")
+            print(f"Satisfied Buyers after Local Market: {ledger.satisfied_buyers} | Satisfied Sellers after Local Market: {ledger.satisfied_sellers}")
         
         # Add market trades to blockchain
-        for trade in market_trades:
-            self.blockchain.add_transaction(trade.to_dict())
+        self.blockchain.add_trade_batch(market_trades)
         
         # 6. Mine blockchain blocks
         if self.blockchain.pending_transactions:
@@ -302,8 +433,7 @@ class CommunitySimulator:
                                    imbalances_before_p2p, imbalances_after_p2p, original_desired_quantities)
         
         # 11. Reset trading state for next timestep
-        for prosumer in self.prosumers:
-            prosumer.reset_trading_state()
+        self.population.reset_trading_state()
         
         # Log timestep summary
         self.simulation_log.append({
@@ -312,8 +442,11 @@ class CommunitySimulator:
             'p2p_trades': len(p2p_trades),
             'market_trades': len(market_trades),
             'price_forecast': price_forecast,
-            'blockchain_blocks': len(self.blockchain.chain)
+            'blockchain_blocks': self.blockchain.num_blocks
         })  # log summary data for the current timestep
+        self.log_totals['timesteps'] += 1
+        self.log_totals['p2p_trades'] += len(p2p_trades)
+        self.log_totals['market_trades'] += len(market_trades)
     
     def run_simulation(self):
         """Run the complete simulation"""
@@ -322,9 +455,10 @@ class CommunitySimulator:
         print("="*70)   # splitter line for details
         print(f"Number of Prosumers: {config.NUM_PROSUMERS}")
         print(f"Objective: {config.REGULATOR_OBJECTIVE}")
-        print(f"Time Steps: {config.TIME_STEPS}")
+        print(f"Time Steps: {config.TIME_STEPS} ({config.TIME_STEP_DURATION * 60:g} min each)")
         print(f"Blockchain Difficulty: {config.DIFFICULTY_TARGET} leading zeros")
         print(f"Number of Miners: {config.NUM_MINERS}")
+        print(f"Random Seed: {self.streams.seed}")
         print("="*70)   # splitter line
         
         # Initialize prosumers
@@ -333,12 +467,15 @@ class CommunitySimulator:
         # Run simulation for each timestep
         for timestep in range(config.TIME_STEPS):
             self.simulate_timestep(timestep)
+        if isinstance(self.p2p_matcher, ShardedMatcher):
+            self.p2p_matcher.close()  # stop the matching workers
         
         # Mine any remaining pending transactions (at each timestamp just a block can be mined, but at the end we mine all remaining)
         while self.blockchain.pending_transactions:   # while there are still pending transactions in the blockchain
             mined_block = self.blockchain.mine_pending_transactions()   # attempt to mine a new block with pending transactions
             if mined_block and config.VERBOSE:  # if mining was successful and verbose output is enabled
                 print(f"\nFinal block #{mined_block.index} mined")
+        self.blockchain.close()  # stop the mining workers
         
         # Generate final report
         self.generate_final_report()
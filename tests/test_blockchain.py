@@ -0,0 +1,116 @@
+"""
+Tests of the blockchain mining modes
+"""
+import numpy as np
+from blockchain import Block, Blockchain, ChainArchive, Miner, ParallelPoW, merkle_root
+from random_streams import RNGRegistry
+
+
+def _mine(blockchain: Blockchain, num_blocks: int):
+    """Mine num_blocks blocks of one transaction each"""
+    for index in range(num_blocks):
+        blockchain.add_transaction({'buyer_id': index, 'seller_id': index + 1, 'quantity': 1.0,
+                                    'price': 0.15, 'trade_type': 'p2p', 'timestep': index})
+        blockchain.mine_pending_transactions()
+
+
+def _forge(block, nonce: int = -1):
+    """Edit a block's transactions and recompute everything that can be recomputed without a key"""
+    block.transactions[0]['quantity'] = 100.0
+    block.merkle_root = merkle_root(block.transactions)
+    block.nonce = nonce
+    block.hash = block.calculate_hash()
+
+
+def test_statistical_chain_is_valid():
+    blockchain = Blockchain(difficulty=4, num_miners=3, mining_mode="statistical", rng=np.random.default_rng(0))
+    _mine(blockchain, 5)
+    assert blockchain.num_blocks == 6
+    assert blockchain.is_chain_valid()
+
+
+def test_tampered_statistical_block_is_rejected():
+    blockchain = Blockchain(difficulty=4, num_miners=3, mining_mode="statistical", rng=np.random.default_rng(0))
+    _mine(blockchain, 5)
+    _forge(blockchain.chain[-1])
+    assert not blockchain.is_chain_valid()
+
+
+def test_statistical_block_without_seal_needs_pow():
+    blockchain = Blockchain(difficulty=4, num_miners=3, mining_mode="statistical", rng=np.random.default_rng(0))
+    _mine(blockchain, 5)
+    _forge(blockchain.chain[-1])
+    blockchain.chain[-1].seal = None
+    assert not blockchain.is_chain_valid()
+
+
+def test_sealed_block_is_rejected_outside_statistical_mode():
+    sealed = Blockchain(difficulty=4, num_miners=3, mining_mode="statistical", rng=np.random.default_rng(0))
+    _mine(sealed, 1)
+    blockchain = Blockchain(difficulty=1, num_miners=3, seal_key=sealed.seal_key)
+    block = sealed.chain[-1]
+    block.previous_hash = blockchain.get_latest_block().hash
+    block.hash = block.calculate_hash()
+    block.seal = sealed._seal(block)
+    blockchain.chain.append(block)
+    assert not blockchain.is_chain_valid()
+
+
+def test_seal_key_is_reproducible_from_the_seed():
+    sealed = Blockchain(difficulty=4, num_miners=3, mining_mode="statistical", rng=np.random.default_rng(0),
+                        seal_key=RNGRegistry(7).secret('chain'))
+    _mine(sealed, 3)
+    verifier = Blockchain(difficulty=4, num_miners=3, mining_mode="statistical",
+                          seal_key=RNGRegistry(7).secret('chain'))
+    assert verifier.is_chain_valid(sealed.chain)
+    other = Blockchain(difficulty=4, num_miners=3, mining_mode="statistical",
+                       seal_key=RNGRegistry(8).secret('chain'))
+    assert not other.is_chain_valid(sealed.chain)
+
+
+def test_reloaded_archive_is_verifiable(tmp_path):
+    blockchain = Blockchain(difficulty=4, num_miners=3, mining_mode="statistical", rng=np.random.default_rng(0),
+                            chain_window=2, spill_dir=str(tmp_path))
+    _mine(blockchain, 5)
+    assert blockchain.archive.num_blocks == 4
+
+    archive = ChainArchive.load(blockchain.archive.path)  # e.g. in another process
+    assert archive.num_blocks == 4
+    verifier = Blockchain(difficulty=4, num_miners=3, mining_mode="statistical", seal_key=archive.seal_key)
+    assert verifier.is_chain_valid(archive)
+    blocks = list(archive)
+    _forge(blocks[-1])
+    assert not verifier.is_chain_valid(blocks)
+
+
+def test_race_wasted_hashes_add_up_per_miner():
+    blockchain = Blockchain(difficulty=2, num_miners=3, mining_mode="race", mining_processes=1,
+                            hash_rates=[1.0, 2.0, 4.0])
+    try:
+        _mine(blockchain, 2)
+        blockchain.difficulty = 64  # unreachable: the next race ends without a winner
+        blockchain.pow_pool.max_attempts = 500
+        _mine(blockchain, 1)
+    finally:
+        blockchain.close()
+
+    assert blockchain.num_blocks == 3
+    assert blockchain.last_wasted == 1500
+    assert blockchain.total_wasted == sum(miner.wasted_hashes for miner in blockchain.miners)
+    assert blockchain.get_chain_summary()['wasted_hashes'] == blockchain.total_wasted
+
+
+def test_race_losers_stop_at_the_winning_time():
+    miners = [Miner(0, 1.0, 0), Miner(1, 3.0, 1000000), Miner(2, 7.0, 2000000)]
+    pool = ParallelPoW(1)
+    try:
+        block = Block(1, 0.0, [], "0" * 64)
+        winner, attempts = pool.race(block, 3, miners)
+    finally:
+        pool.close()
+
+    assert winner is not None and block.hash.startswith("000")
+    winning_time = attempts[winner] / miners[winner].hash_rate
+    for index, miner in enumerate(miners):
+        assert attempts[index] / miner.hash_rate <= winning_time + 1e-9  # no hash counted past the winning time
+    assert pool.last_attempts == sum(attempts)
@@ -0,0 +1,34 @@
+"""
+Tests of the uniform-price clearing
+"""
+import numpy as np
+import pytest
+from clearing import clear_tick_buckets, clear_uniform_price
+
+
+def _random_book(rng: np.random.Generator, num_orders: int):
+    """Bids and asks scattered around a common price, as the prosumers offer them"""
+    bids, asks = num_orders // 2, num_orders - num_orders // 2
+    return (rng.uniform(0.10, 0.20, bids), rng.uniform(0.1, 5.0, bids),
+            rng.uniform(0.08, 0.18, asks), rng.uniform(0.1, 5.0, asks))
+
+
+@pytest.mark.parametrize("num_orders", [100, 1000])
+@pytest.mark.parametrize("tick", [0.0001, 0.01])
+def test_tick_buckets_within_one_tick_of_exact_matcher(num_orders, tick):
+    rng = np.random.default_rng(num_orders)
+    for _ in range(50):
+        bid_price, bid_quantity, ask_price, ask_quantity = _random_book(rng, num_orders)
+        exact = clear_uniform_price(bid_price, bid_quantity, ask_price, ask_quantity)
+        bucketed = clear_tick_buckets(bid_price, bid_quantity, ask_price, ask_quantity, tick)
+
+        assert abs(bucketed.price - exact.price) <= tick
+        assert bucketed.quantity == pytest.approx(exact.quantity)
+        assert bucketed.buyer_fill.sum() == pytest.approx(exact.buyer_fill.sum())
+        assert bucketed.seller_fill.sum() == pytest.approx(exact.seller_fill.sum())
+
+
+def test_tick_buckets_without_crossing():
+    result = clear_tick_buckets(np.array([0.10, 0.11]), np.ones(2), np.array([0.12, 0.13]), np.ones(2))
+    assert result.quantity == 0.0
+    assert not result.buyer_fill.any() and not result.seller_fill.any()
@@ -0,0 +1,59 @@
+"""
+Tests of the vectorized kernels against the scalar Prosumer methods
+"""
+import numpy as np
+import pytest
+from data_generation import generate_consumption_matrix, generate_pv_matrix
+from population import ProsumerPopulation
+from profiles import ProfileLibrary
+from prosumer import Prosumer
+from random_streams import RNGRegistry
+
+
+class _FixedNoise:
+    """Random source of the scalar methods drawing at a fixed point of each range (matches the kernels' noise)"""
+
+    def __init__(self, unit: float):
+        self.unit = unit
+
+    def uniform(self, low: float, high: float) -> float:
+        return low + (high - low) * self.unit
+
+
+@pytest.mark.parametrize("resolution", [1.0, 0.25])
+def test_dispatch_matches_prosumer_objects_over_a_day(resolution):
+    num_prosumers = 300
+    population = ProsumerPopulation.generate(num_prosumers, np.random.default_rng(42))
+    prosumers = [Prosumer(i, population.pv_capacity[i], population.base_consumption[i],
+                          population.battery_capacity[i], rng=_FixedNoise(0.3)) for i in range(num_prosumers)]
+    population.battery_level[:] = [prosumer.battery_level for prosumer in prosumers]
+
+    streams = RNGRegistry(42)
+    num_steps = ProfileLibrary.steps_per_day(resolution)
+    pv = generate_pv_matrix(num_steps, population.pv_capacity, streams, resolution=resolution)
+    consumption = generate_consumption_matrix(num_steps, population.base_consumption, streams, resolution=resolution)
+
+    charged, discharged = 0.0, 0.0
+    for step in range(num_steps):
+        population.update_energy_state(pv[step], consumption[step])
+        population.prepare_trading_offers(0.15, 0.03, 5.0 * resolution, noise=np.full(num_prosumers, 0.3))
+        for prosumer in prosumers:
+            prosumer.update_energy_state(pv[step, prosumer.id], consumption[step, prosumer.id])
+            prosumer.prepare_trading_offer(0.15, 0.03, 5.0 * resolution)
+
+        def scalar(name):
+            return np.array([getattr(prosumer, name) for prosumer in prosumers])
+
+        assert np.array_equal(population.battery_level, scalar('battery_level'))
+        assert np.array_equal(population.imbalance, scalar('imbalance'))   # grid import (< 0) / export (> 0)
+        assert np.array_equal(population.battery_charged_kwh, scalar('battery_charged_kwh'))
+        assert np.array_equal(population.battery_discharged_kwh, scalar('battery_discharged_kwh'))
+        assert np.array_equal(population.is_buyer, scalar('is_buyer'))
+        assert np.array_equal(population.is_seller, scalar('is_seller'))
+        assert np.array_equal(population.desired_quantity, scalar('desired_quantity'))
+        assert np.array_equal(population.bid_price[population.is_buyer], scalar('bid_price')[population.is_buyer])
+        assert np.array_equal(population.ask_price[population.is_seller], scalar('ask_price')[population.is_seller])
+        charged += population.battery_charged_kwh.sum()
+        discharged += population.battery_discharged_kwh.sum()
+    assert np.array_equal(population.renewable_usage, scalar('renewable_usage'))
+    assert charged > 0 and discharged > 0   # the day exercised both battery branches
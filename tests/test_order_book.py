@@ -0,0 +1,105 @@
+"""
+Tests of the continuous double auction
+"""
+import numpy as np
+from order_book import ContinuousDoubleAuction
+from population import ProsumerPopulation
+from prosumer import Prosumer
+
+
+def _offer(prosumer, side: str, price: float, quantity: float):
+    """Set a prosumer's trading offer for the next call"""
+    prosumer.is_buyer, prosumer.is_seller = side == 'bid', side == 'ask'
+    prosumer.bid_price = price if side == 'bid' else 0.0
+    prosumer.ask_price = price if side == 'ask' else 0.0
+    prosumer.desired_quantity = quantity
+    prosumer.imbalance = quantity if side == 'ask' else -quantity
+
+
+def test_order_settled_by_local_market_does_not_trade_next_timestep():
+    prosumers = [Prosumer(i, 5.0, 1.0, 0.0) for i in range(3)]
+    auction = ContinuousDoubleAuction()
+
+    # t0: prosumer 2's ask rests unmatched, then the local market settles it
+    _offer(prosumers[2], 'ask', 0.15, 1.0)
+    assert len(auction.execute_p2p_trading(prosumers, 0)) == 0
+    prosumers[2].accept_trade(1.0, 0.12, is_buyer_role=False, is_p2p=False)
+
+    # t1: prosumers 1 and 2 both buy, so nothing may trade
+    _offer(prosumers[1], 'bid', 0.18, 1.0)
+    _offer(prosumers[2], 'bid', 0.17, 1.0)
+    trades = auction.execute_p2p_trading(prosumers, 1)
+
+    assert len(trades) == 0
+    assert prosumers[2].imbalance == -1.0
+    assert prosumers[2].desired_quantity == 1.0
+
+
+def test_trades_never_put_a_prosumer_on_the_wrong_side():
+    rng = np.random.default_rng(0)
+    population = ProsumerPopulation.generate(200, rng)
+    prosumers = population.views()
+    auction = ContinuousDoubleAuction()
+
+    for timestep in range(20):
+        population.update_energy_state(rng.uniform(0, 4, 200), rng.uniform(0, 3, 200))
+        population.prepare_trading_offers(0.15, 0.03, 3.0, rng)
+        buyers, sellers = population.active_buyers.copy(), population.active_sellers.copy()
+        desired = population.desired_quantity.copy()
+
+        trades = auction.execute_p2p_trading(prosumers, timestep)
+
+        assert buyers[trades.buyer_id].all() and sellers[trades.seller_id].all()
+        bought = np.bincount(trades.buyer_id, trades.quantity, 200)
+        sold = np.bincount(trades.seller_id, trades.quantity, 200)
+        assert (bought + sold <= desired + 1e-9).all()
+        population.reset_trading_state()
+
+
+def test_resting_order_survives_a_step_with_its_time_priority():
+    prosumers = [Prosumer(i, 5.0, 1.0, 0.0) for i in range(3)]
+    auction = ContinuousDoubleAuction(price_tolerance=0.01)
+
+    # t0: prosumer 0's ask rests unmatched, then the local market settles it
+    _offer(prosumers[0], 'ask', 0.150, 1.0)
+    assert len(auction.execute_p2p_trading(prosumers, 0)) == 0
+    prosumers[0].accept_trade(1.0, 0.12, is_buyer_role=False, is_p2p=False)
+    prosumers[0].reset_trading_state()
+    resting = auction.book.orders[('ask', 0)]
+    updates = auction.book_updates
+
+    # t1: re-noised offer within the tolerance; prosumer 1 asks the same price later, prosumer 2 buys
+    _offer(prosumers[0], 'ask', 0.155, 0.8)
+    _offer(prosumers[1], 'ask', 0.150, 1.0)
+    _offer(prosumers[2], 'bid', 0.160, 0.5)
+    trades = auction.execute_p2p_trading(prosumers, 1)
+
+    assert auction.orders_kept == 1
+    assert auction.book_updates == updates + 2  # only prosumers 1 and 2 were submitted
+    assert trades.seller_id.tolist() == [0]  # the resting order kept its priority and price
+    assert trades.price.tolist() == [0.150]
+    assert auction.book.orders[('ask', 0)][2] == resting[2]
+    assert np.isclose(auction.book.orders[('ask', 0)][1], 0.3)
+
+
+def test_sub_step_insert_modify_and_cancel():
+    prosumers = [Prosumer(i, 5.0, 1.0, 0.0) for i in range(3)]
+    auction = ContinuousDoubleAuction()
+    _offer(prosumers[0], 'ask', 0.15, 1.0)
+    _offer(prosumers[1], 'ask', 0.14, 1.0)
+    auction.execute_p2p_trading(prosumers, 0)
+
+    # Within the timestep: prosumer 1 withdraws, prosumer 0 reprices, prosumer 2 buys
+    assert auction.cancel_order(1)
+    assert not auction.cancel_order(1)
+    assert len(auction.modify_order(prosumers, 0, 0.13, 0.6, 0)) == 0
+    _offer(prosumers[2], 'bid', 0.16, 1.0)
+    trades = auction.insert_order(prosumers, 2, 'bid', 0.16, 1.0, 0)
+
+    assert trades.seller_id.tolist() == [0] and trades.buyer_id.tolist() == [2]
+    assert trades.price.tolist() == [0.13] and np.isclose(trades.quantity.sum(), 0.6)
+    assert ('ask', 0) not in auction.book.orders
+    assert np.isclose(auction.book.orders[('bid', 2)][1], 0.4)
+    assert np.isclose(prosumers[0].balance, 0.6 * 0.13) and np.isclose(prosumers[2].desired_quantity, 0.4)
+    assert auction.posted_side.tolist() == [ContinuousDoubleAuction.NONE, ContinuousDoubleAuction.NONE,
+                                            ContinuousDoubleAuction.BID]
@@ -0,0 +1,117 @@
+"""
+Tests of the batched population methods and the community ledger
+"""
+import numpy as np
+import pytest
+from ledger import CommunityLedger
+from population import ProsumerPopulation
+from prosumer import Prosumer
+from random_streams import RNGRegistry
+from regulator import Regulator
+import config
+
+
+def _population(num_prosumers: int, seed: int = 0) -> ProsumerPopulation:
+    """Population with a tracked ledger"""
+    population = ProsumerPopulation.generate(num_prosumers, np.random.default_rng(seed))
+    population.ledger = CommunityLedger()
+    return population
+
+
+def _assert_ledger_matches_arrays(population: ProsumerPopulation):
+    """The incrementally kept ledger equals one recomputed from scratch"""
+    reference = CommunityLedger()
+    reference.add(*population.offer_state(slice(None)))
+    ledger = population.ledger
+    assert np.isclose(ledger.buyer_quantity, reference.buyer_quantity)
+    assert np.isclose(ledger.seller_quantity, reference.seller_quantity)
+    assert (ledger.num_buyers, ledger.num_sellers, ledger.num_pending) == \
+        (reference.num_buyers, reference.num_sellers, reference.num_pending)
+    assert ledger.unsatisfied_buyers == reference.unsatisfied_buyers
+    assert ledger.unsatisfied_sellers == reference.unsatisfied_sellers
+
+
+def test_battery_recruitment_covers_the_gap():
+    population = _population(500)
+    rng = np.random.default_rng(1)
+    population.update_energy_state(np.zeros(500), rng.uniform(0.5, 2.0, 500))  # night: everybody short
+    population.battery_level[:250] = population.battery_capacity[:250] * 0.9
+    population.prepare_trading_offers(0.15, 0.03, 5.0, rng)
+    population.is_buyer[:250] = False  # first half idle, with full batteries
+    population._rebuild_ledger()
+    gap = population.ledger.imbalance
+    idle = population.has_battery & ~population.is_buyer
+    available = population.battery_level[idle] - population.battery_capacity[idle] * config.BATTERY_MIN_SOC
+
+    recruited = population.balance_trading_offers(0.05, 0.15, 0.03, 5.0, rng=rng)
+    assert 0 < len(recruited) <= idle.sum()
+    assert population.selling_from_battery[recruited].all() and population.has_battery[recruited].all()
+    assert np.isclose(population.desired_quantity[recruited].sum(), min(gap, np.minimum(available, 5.0).sum()))
+    _assert_ledger_matches_arrays(population)
+
+
+def _short_population(streams=None) -> ProsumerPopulation:
+    """Population at night with every battery full and nobody trading yet but the buyers"""
+    population = _population(200)
+    population.streams = streams
+    population.update_energy_state(np.zeros(200), np.full(200, 1.0))
+    population.battery_level[:] = population.battery_capacity * 0.9
+    population.prepare_trading_offers(0.15, 0.03, 5.0, noise=np.full(200, 0.5))
+    population.is_buyer[:100] = False
+    population._rebuild_ledger()
+    return population
+
+
+def test_battery_seller_prices_use_the_battery_market_stream():
+    first, second = _short_population(RNGRegistry(3)), _short_population(RNGRegistry(3))
+    recruited = first.balance_trading_offers(0.05, 0.15, 0.03, 5.0, timestep=4)
+    assert len(recruited) > 0
+    assert np.array_equal(recruited, second.balance_trading_offers(0.05, 0.15, 0.03, 5.0, timestep=4))
+    assert np.array_equal(first.ask_price[recruited], second.ask_price[recruited])
+
+    with pytest.raises(ValueError):  # no registry and no generator: no unseeded fallback
+        _short_population().balance_trading_offers(0.05, 0.15, 0.03, 5.0, timestep=4)
+
+
+def test_regulator_batched_path_matches_prosumer_objects():
+    population = _population(1000)
+    prosumers = [Prosumer(i, population.pv_capacity[i], population.base_consumption[i],
+                          population.battery_capacity[i]) for i in range(1000)]
+    batched, per_object = Regulator(), Regulator()
+    rng = np.random.default_rng(2)
+    for timestep in range(20):
+        population.update_energy_state(rng.uniform(0, 3, 1000), rng.uniform(0, 3, 1000))
+        population.prepare_trading_offers(0.15, 0.03, 5.0, rng)
+        penalties = rng.uniform(0, 0.3, 1000) * (rng.random(1000) < 0.3)
+        balance = rng.uniform(-3.0, 0.5, 1000)
+        population.penalties += penalties
+        population.balance += balance
+        for prosumer, penalty, change in zip(prosumers, penalties, balance):
+            prosumer.penalties += penalty
+            prosumer.balance += change
+
+        batched.update_prosumer_bans(population.views())
+        per_object.update_prosumer_bans(prosumers)
+        batched.enforce_rules(population.views(), timestep)
+        per_object.enforce_rules(prosumers, timestep)
+
+        assert batched.banned_prosumers == per_object.banned_prosumers
+        assert population.is_banned.tolist() == [p.is_banned for p in prosumers]
+        assert population.ban_duration.tolist() == [p.ban_duration for p in prosumers]
+        assert population.reason_for_ban.tolist() == [p.reason_for_ban for p in prosumers]
+        _assert_ledger_matches_arrays(population)
+        population.reset_trading_state()
+    assert batched.total_bans > 0
+
+
+def test_view_methods_keep_the_ledger_in_sync():
+    population = _population(50)
+    rng = np.random.default_rng(3)
+    population.update_energy_state(rng.uniform(0, 3, 50), rng.uniform(0, 3, 50))
+    population.prepare_trading_offers(0.15, 0.03, 5.0, rng)
+    views = population.views()
+    views[0].apply_ban(duration=2, reason='test')
+    views[1].becomes_seller(0.5, 0.15, 0.03, 5.0)
+    views[2].accept_trade(0.2, 0.15, is_buyer_role=views[2].is_buyer)
+    views[3].reset_trading_state()
+    _assert_ledger_matches_arrays(population)
@@ -0,0 +1,41 @@
+"""
+Tests of the per-home-type profiles and the consumption matrix built from them
+"""
+import numpy as np
+import pytest
+from data_generation import generate_consumption_matrix
+from profiles import CONSUMPTION_PATTERNS, ProfileLibrary
+from random_streams import RNGRegistry
+import config
+
+
+def test_default_home_types_share_one_shape():
+    profiles = ProfileLibrary()
+    shapes = profiles.home_consumption_shapes(0.25)
+    assert shapes.shape == (len(config.BASE_CONSUMPTION), 96)
+    assert not profiles.per_home_type
+    assert np.array_equal(shapes[3], profiles.consumption_shape(0.25))
+    assert profiles.consumption_shape()[19] == CONSUMPTION_PATTERNS[19]
+
+
+def test_consumption_matrix_follows_home_type_profiles():
+    num_types = len(config.BASE_CONSUMPTION)
+    hourly = np.ones((num_types, 24))
+    hourly[1, 18:22] = 3.0   # evening-heavy home type
+    profiles = ProfileLibrary(consumption=hourly)
+    home_type_index = np.array([0, 1, 1, 0])
+    base_consumption = np.full(4, 1.0)
+
+    consumption = generate_consumption_matrix(96, base_consumption, RNGRegistry(0), profiles=profiles,
+                                              resolution=0.25, home_type_index=home_type_index)
+    flat = generate_consumption_matrix(96, base_consumption, RNGRegistry(0), profiles=ProfileLibrary(consumption=np.ones(24)),
+                                       resolution=0.25)
+    evening = slice(18 * 4, 22 * 4)
+    assert np.allclose(consumption[evening, 1:3], 3.0 * flat[evening, 1:3])
+    assert np.allclose(consumption[:, [0, 3]], flat[:, [0, 3]])
+    assert np.allclose(consumption[:evening.start], flat[:evening.start])
+
+
+def test_per_home_type_profile_needs_one_row_per_type():
+    with pytest.raises(ValueError):
+        ProfileLibrary(consumption=np.ones((3, 24)))
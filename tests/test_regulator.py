@@ -0,0 +1,63 @@
+"""
+Tests of the regulator at hourly and sub-hourly resolution
+"""
+import numpy as np
+import pytest
+from population import ProsumerPopulation
+from prosumer import Prosumer
+from regulator import Regulator
+
+
+def test_ban_windows_are_defined_in_hours():
+    hourly, quarter_hourly = Regulator(), Regulator(step_duration=0.25)
+    assert hourly.ban_steps == {'excessive_market_usage': 2, 'negative_balance': 3}
+    assert quarter_hourly.ban_steps == {'excessive_market_usage': 8, 'negative_balance': 12}
+    assert (hourly.reban_window, quarter_hourly.reban_window) == (5, 20)
+
+    prosumer = Prosumer(0, 5.0, 1.0, 0.0)
+    prosumer.balance = -25.0
+    quarter_hourly.enforce_rules([prosumer], 0)
+    assert prosumer.ban_duration == 12
+    for _ in range(12):
+        quarter_hourly.update_prosumer_bans([prosumer])
+    assert not prosumer.is_banned
+    quarter_hourly.enforce_rules([prosumer], 20)  # within 5 hours of the last ban
+    assert not prosumer.is_banned
+    quarter_hourly.enforce_rules([prosumer], 21)
+    assert prosumer.is_banned
+
+
+@pytest.mark.parametrize("step_duration", [1.0, 0.25, 1 / 12])
+def test_incentives_per_hour_do_not_depend_on_resolution(step_duration):
+    population = ProsumerPopulation.generate(50, np.random.default_rng(0))
+    population.renewable_usage[:] = np.linspace(0.0, 4.0, 50)
+    population.market_trades[::2] = 1
+    population.market_quantity[::2] = 1.5
+    regulator = Regulator(step_duration=step_duration)
+    for _ in range(round(1 / step_duration)):  # one hour of steps with unchanged usage
+        regulator.incentivize_renewable_usage(population.views())
+
+    assert np.allclose(population.bonus, population.renewable_usage * 0.02)
+    assert np.allclose(population.penalties, population.market_quantity * 0.02)
+    assert regulator.total_incentives_paid == pytest.approx(population.bonus.sum())
+
+
+def test_incentives_batched_path_matches_prosumer_objects():
+    population = ProsumerPopulation.generate(50, np.random.default_rng(1))
+    population.renewable_usage[:] = np.random.default_rng(2).uniform(0, 3, 50)
+    population.market_trades[:25] = 2
+    population.market_quantity[:25] = 0.7
+    population.is_banned[::5] = True
+    prosumers = [Prosumer(i, 5.0, 1.0, 0.0) for i in range(50)]
+    for prosumer, view in zip(prosumers, population.views()):
+        prosumer.renewable_usage, prosumer.market_trades = view.renewable_usage, view.market_trades
+        prosumer.market_quantity, prosumer.is_banned = view.market_quantity, view.is_banned
+
+    batched, per_object = Regulator(step_duration=0.25), Regulator(step_duration=0.25)
+    batched.incentivize_renewable_usage(population.views())
+    per_object.incentivize_renewable_usage(prosumers)
+    assert np.allclose(population.balance, [p.balance for p in prosumers])
+    assert np.allclose(population.bonus, [p.bonus for p in prosumers])
+    assert np.allclose(population.penalties, [p.penalties for p in prosumers])
+    assert batched.total_incentives_paid == pytest.approx(per_object.total_incentives_paid)
+    assert batched.total_penalties_collected == pytest.approx(per_object.total_penalties_collected)
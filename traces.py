@@ -0,0 +1,107 @@
+"""
+Memory-mapped recorded irradiance and load traces
+"""
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+
+def convert_csv_to_trace(csv_path: str, out_path: str, value_column: str,
+                         timestep_column: str = "Timestep", prosumer_column: str = "Prosumer_ID",
+                         num_timesteps: Optional[int] = None, num_prosumers: Optional[int] = None,
+                         dtype=np.float32, chunksize: int = 1_000_000) -> str:
+    """
+    One-time conversion of a long-format CSV trace (one row per timestep and
+    prosumer, like results/prosumer_energy.csv) into a memory-mappable .npy file
+
+    The CSV is streamed in chunks, so traces larger than RAM can be converted.
+    Entries missing from the CSV are stored as 0.
+
+    Args:
+        csv_path: Path of the CSV file
+        out_path: Path of the .npy trace to create
+        value_column: Column holding the trace values
+        timestep_column: Column holding the timestep index
+        prosumer_column: Column holding the prosumer ID
+        num_timesteps: Number of timesteps (scanned from the CSV if None)
+        num_prosumers: Number of prosumers (scanned from the CSV if None)
+        dtype: Storage dtype (float32 halves the size of year-long traces)
+        chunksize: CSV rows per chunk
+
+    Returns:
+        Path of the created trace
+    """
+    columns = [timestep_column, prosumer_column, value_column]
+
+    if num_timesteps is None or num_prosumers is None:   # first pass: find the trace dimensions
+        max_timestep, max_prosumer = -1, -1
+        for chunk in pd.read_csv(csv_path, usecols=[timestep_column, prosumer_column], chunksize=chunksize):
+            max_timestep = max(max_timestep, int(chunk[timestep_column].max()))
+            max_prosumer = max(max_prosumer, int(chunk[prosumer_column].max()))
+        num_timesteps = num_timesteps if num_timesteps is not None else max_timestep + 1
+        num_prosumers = num_prosumers if num_prosumers is not None else max_prosumer + 1
+
+    # Rows are timesteps so that the slice of one timestep is contiguous on disk
+    trace = np.lib.format.open_memmap(out_path, mode="w+", dtype=dtype, shape=(num_timesteps, num_prosumers))
+    for chunk in pd.read_csv(csv_path, usecols=columns, chunksize=chunksize):
+        trace[chunk[timestep_column].to_numpy(), chunk[prosumer_column].to_numpy()] = chunk[value_column].to_numpy()
+    trace.flush()
+    del trace
+    return out_path
+
+
+class TraceSource:
+    """
+    Read-only memory-mapped trace (timesteps x prosumers)
+
+    Only the pages of the requested slices are read from disk, and the same
+    file can be shared by any number of runs without parsing it again.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a trace created by convert_csv_to_trace
+
+        Args:
+            path: Path of the .npy trace
+        """
+        self.path = path
+        self.data = np.load(path, mmap_mode="r")   # nothing is read until sliced
+        if self.data.ndim != 2:
+            raise ValueError(f"Trace {path} must be 2-D (timesteps x prosumers), got shape {self.data.shape}")
+
+    @property
+    def num_timesteps(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def num_prosumers(self) -> int:
+        return self.data.shape[1]
+
+    def block(self, start: int, num_timesteps: int, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Read consecutive timesteps for a set of prosumers; timesteps beyond
+        the end of the trace wrap around to its start
+
+        Args:
+            start: First timestep
+            num_timesteps: Number of timesteps
+            ids: Prosumer IDs (all prosumers if None)
+
+        Returns:
+            Array (timesteps x prosumers) as float64
+        """
+        if ids is not None and len(ids) and int(np.max(ids)) >= self.num_prosumers:
+            raise ValueError(f"Trace {self.path} has {self.num_prosumers} prosumers, ID {int(np.max(ids))} requested")
+
+        rows = (start + np.arange(num_timesteps)) % self.num_timesteps
+        if rows[-1] - rows[0] == num_timesteps - 1:   # contiguous range, read as one slice
+            block = self.data[rows[0]:rows[-1] + 1]
+        else:
+            block = self.data[rows]
+        if ids is not None:
+            block = block[:, ids]
+        return np.asarray(block, dtype=np.float64)
+
+    def __repr__(self):
+        return f"TraceSource(path={self.path}, timesteps={self.num_timesteps}, prosumers={self.num_prosumers})"
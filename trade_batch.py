@@ -0,0 +1,140 @@
+"""
+Columnar batch of trades backed by a NumPy structured array
+"""
+import numpy as np
+from typing import Iterable, List
+
+
+TRADE_TYPES = ('p2p', 'local_market')   # trade type names, indexed by the type code
+
+# One record per trade
+TRADE_DTYPE = np.dtype([
+    ('buyer_id', np.int64),   # buying prosumer ID (-1 for the aggregator)
+    ('seller_id', np.int64),   # selling prosumer ID (-1 for the aggregator)
+    ('quantity', np.float64),   # kWh - traded energy
+    ('price', np.float64),   # €/kWh - trade price
+    ('type', np.int8),   # index into TRADE_TYPES
+    ('timestep', np.int64),   # timestep of the trade
+])
+
+
+class TradeBatch:
+    """
+    Trades of one matching phase stored as one structured array
+
+    Matching engines emit a batch directly; the blockchain, the CSV logger
+    and the statistics read its columns, so no Python object is created per
+    trade until a transaction dictionary is actually needed.
+    """
+
+    def __init__(self, records: np.ndarray = None):
+        """
+        Initialize the batch
+
+        Args:
+            records: Structured array of TRADE_DTYPE (empty batch if None)
+        """
+        self.records = records if records is not None else np.zeros(0, dtype=TRADE_DTYPE)
+
+    @classmethod
+    def from_arrays(cls, buyer_id, seller_id, quantity, price, trade_type: str, timestep) -> 'TradeBatch':
+        """
+        Build a batch from column arrays
+
+        Args:
+            buyer_id: Buyer ID per trade
+            seller_id: Seller ID per trade
+            quantity: Quantity per trade in kWh
+            price: Price per trade (or one price for all) in €/kWh
+            trade_type: 'p2p' or 'local_market'
+            timestep: Timestep of the trades
+
+        Returns:
+            New TradeBatch
+        """
+        records = np.zeros(len(quantity), dtype=TRADE_DTYPE)
+        records['buyer_id'] = buyer_id
+        records['seller_id'] = seller_id
+        records['quantity'] = quantity
+        records['price'] = price
+        records['type'] = TRADE_TYPES.index(trade_type)
+        records['timestep'] = timestep
+        return cls(records)
+
+    @classmethod
+    def from_trades(cls, trades: Iterable) -> 'TradeBatch':
+        """
+        Build a batch from trade objects (anything with the Trade fields)
+
+        Args:
+            trades: Trade objects
+
+        Returns:
+            New TradeBatch
+        """
+        trades = list(trades)
+        records = np.zeros(len(trades), dtype=TRADE_DTYPE)
+        for column in ('buyer_id', 'seller_id', 'quantity', 'price', 'timestep'):
+            records[column] = [getattr(trade, column) for trade in trades]
+        records['type'] = [TRADE_TYPES.index(trade.trade_type) for trade in trades]
+        return cls(records)
+
+    @classmethod
+    def concatenate(cls, batches: Iterable['TradeBatch']) -> 'TradeBatch':
+        """Join several batches into one"""
+        batches = list(batches)
+        if not batches:
+            return cls()
+        return cls(np.concatenate([batch.records for batch in batches]))
+
+    @property
+    def buyer_id(self) -> np.ndarray:
+        return self.records['buyer_id']
+
+    @property
+    def seller_id(self) -> np.ndarray:
+        return self.records['seller_id']
+
+    @property
+    def quantity(self) -> np.ndarray:
+        return self.records['quantity']
+
+    @property
+    def price(self) -> np.ndarray:
+        return self.records['price']
+
+    @property
+    def timestep(self) -> np.ndarray:
+        return self.records['timestep']
+
+    @property
+    def trade_type(self) -> np.ndarray:
+        """Trade type name per trade"""
+        return np.asarray(TRADE_TYPES, dtype=object)[self.records['type']]
+
+    def total_quantity(self) -> float:
+        """Total traded energy in kWh"""
+        return float(self.quantity.sum())
+
+    def average_price(self) -> float:
+        """Quantity-weighted average price in €/kWh (0 if nothing was traded)"""
+        total = self.total_quantity()
+        return float((self.price * self.quantity).sum() / total) if total > 0 else 0.0
+
+    def to_transactions(self) -> List[dict]:
+        """
+        Convert the batch to blockchain transactions (same dictionaries as Trade.to_dict)
+
+        Returns:
+            List of transaction dictionaries
+        """
+        keys = ('buyer_id', 'seller_id', 'quantity', 'price', 'trade_type', 'timestep')
+        columns = (self.buyer_id.tolist(), self.seller_id.tolist(), self.quantity.tolist(),
+                   self.price.tolist(), self.trade_type.tolist(), self.timestep.tolist())
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __repr__(self):
+        return f"TradeBatch(trades={len(self)}, quantity={self.total_quantity():.2f}kWh)"